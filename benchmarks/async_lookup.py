@@ -0,0 +1,92 @@
+"""
+Measures the latency and throughput of AsyncHfst for an increasing number
+of concurrent clients on a synthetic corpus, analysing in a thread or, with
+--workers, in a ParallelHfst.
+
+    python -m benchmarks.async_lookup --concurrency 1 10 100 1000 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import List
+
+import pyhfst
+from .synthetic import generate, random_word
+
+
+async def run_clients(tr: pyhfst.AsyncHfst, corpus: List[str], concurrency: int) -> List[float]:
+    """
+    Looks the corpus up from concurrent clients, each looking up its share one word at a time.
+
+    :param tr: The AsyncHfst object to look the words up with.
+    :param corpus: The words to look up.
+    :param concurrency: The number of clients.
+    :return: The latency of every lookup, in seconds.
+    """
+    latencies: List[float] = []
+
+    async def client(words: List[str]) -> None:
+        for word in words:
+            start = time.perf_counter()
+            await tr.lookup(word)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(client(corpus[i::concurrency]) for i in range(concurrency)))
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=50000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--workers", type=int, default=0, help="analyse in a ParallelHfst with this many workers")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--delay", type=float, default=0.001, help="the batching window in seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.hfstol")
+        words = generate(path, words=args.words)
+        rng = random.Random(0)
+        corpus = [
+            rng.choice(words) if rng.random() < 0.8 else random_word(rng)
+            for _ in range(args.tokens)
+        ]
+
+        tr = pyhfst.HfstInputStream(path, cache=False).read()
+        start = time.perf_counter()
+        for word in corpus:
+            tr.lookup(word)
+        serial = time.perf_counter() - start
+        print(f"{'serial':>11s} {args.tokens / serial:12.0f} tokens/s")
+        print(f"{'concurrency':>11s} {'tokens/s':>12s} {'p50 ms':>8s} {'p99 ms':>8s} {'batches':>8s}")
+
+        source = pyhfst.ParallelHfst(path, workers=args.workers, cache=False) if args.workers else tr
+        try:
+            for concurrency in args.concurrency:
+
+                async def measure():
+                    async with pyhfst.AsyncHfst(source, max_batch_size=args.batch_size, max_delay=args.delay) as atr:
+                        start = time.perf_counter()
+                        latencies = await run_clients(atr, corpus, concurrency)
+                        return time.perf_counter() - start, latencies, atr.stats()["batches"]
+
+                seconds, latencies, batches = asyncio.run(measure())
+                latencies.sort()
+                print(
+                    f"{concurrency:>11d} {args.tokens / seconds:12.0f} "
+                    f"{statistics.median(latencies) * 1000:8.2f} "
+                    f"{latencies[int(len(latencies) * 0.99)] * 1000:8.2f} {batches:8d}"
+                )
+        finally:
+            if args.workers:
+                source.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Compares the time it takes to decode the index and transition tables of a
+large synthetic transducer with the old per-record decoder, the bulk column
+decoder and a memory mapping.
+
+    python -m benchmarks.load_time --words 50000 --weighted
+"""
+import argparse
+import mmap
+import os
+import tempfile
+import time
+from io import BufferedReader
+from typing import Callable, Dict, List
+
+from pyhfst.byte_array import ByteArray
+from pyhfst.transducer_header import TransducerHeader
+from pyhfst.transducer_alphabet import TransducerAlphabet
+from pyhfst import common
+from .synthetic import generate
+
+try:
+    from c_pyhfst import common as c_common
+except ImportError:
+    c_common = None
+
+
+def legacy_decoder(stream, header: TransducerHeader) -> None:
+    """
+    The per-record decoder pyhfst used before the bulk column decoder.
+    """
+    indices_count = header.get_index_table_size()
+    b = ByteArray(indices_count * 6)
+    stream.readinto(b.bytes)
+    inputs: List[int] = [0] * indices_count
+    targets: List[int] = [0] * indices_count
+    for i in range(indices_count):
+        inputs[i] = b.get_ushort()
+        targets[i] = b.get_uint()
+
+    transition_count = header.get_target_table_size()
+    is_weighted = header.is_weighted()
+    b = ByteArray(transition_count * (12 if is_weighted else 8))
+    stream.readinto(b.bytes)
+    t_inputs: List[int] = [0] * transition_count
+    t_outputs: List[int] = [0] * transition_count
+    t_targets: List[int] = [0] * transition_count
+    t_weights: List[float] = [0.0] * transition_count
+    for i in range(transition_count):
+        t_inputs[i] = b.get_ushort()
+        t_outputs[i] = b.get_ushort()
+        t_targets[i] = b.get_uint()
+        if is_weighted:
+            t_weights[i] = b.get_float()
+
+
+def column_decoder(module) -> Callable:
+    def decode(stream, header: TransducerHeader) -> None:
+        module.IndexTable(stream, header.get_index_table_size())
+        module.TransitionTable(
+            stream, header.get_target_table_size(), is_weighted=header.is_weighted()
+        )
+
+    return decode
+
+
+def mapped_decoder(module) -> Callable:
+    def decode(stream, header: TransducerHeader) -> None:
+        module.MappedIndexTable(stream, header.get_index_table_size())
+        module.MappedTransitionTable(
+            stream, header.get_target_table_size(), is_weighted=header.is_weighted()
+        )
+
+    return decode
+
+
+def time_decoder(path: str, decoder: Callable, memory_map: bool, repeat: int) -> float:
+    """
+    Returns the best time out of `repeat` runs of decoding the tables.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        with open(path, "rb") as f:
+            if memory_map:
+                stream = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                stream = BufferedReader(f)
+            header = TransducerHeader(stream)
+            TransducerAlphabet(stream, header.get_symbol_count())
+            start = time.perf_counter()
+            decoder(stream, header)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, default=50000)
+    parser.add_argument("--weighted", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.hfstol")
+        generate(path, words=args.words, weighted=args.weighted)
+        with open(path, "rb") as f:
+            header = TransducerHeader(BufferedReader(f))
+        print(
+            f"{path}: {os.path.getsize(path) / 1e6:.1f} MB, "
+            f"{header.get_index_table_size()} indices, "
+            f"{header.get_target_table_size()} transitions"
+        )
+
+        decoders: Dict[str, tuple] = {
+            "pyhfst legacy per-record": (legacy_decoder, False),
+            "pyhfst column": (column_decoder(common), False),
+            "pyhfst mmap": (mapped_decoder(common), True),
+        }
+        if c_common is not None:
+            decoders["c_pyhfst column"] = (column_decoder(c_common), False)
+            decoders["c_pyhfst mmap"] = (mapped_decoder(c_common), True)
+
+        baseline = None
+        for name, (decoder, memory_map) in decoders.items():
+            seconds = time_decoder(path, decoder, memory_map, args.repeat)
+            baseline = baseline or seconds
+            print(f"{name:28s} {seconds * 1000:10.1f} ms {baseline / seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
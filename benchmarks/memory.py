@@ -0,0 +1,79 @@
+"""
+Compares the memory taken by a cache holding the analyses of a large
+vocabulary of a synthetic transducer, with the formatted analyses and in
+compact mode, and the time it takes to serve the vocabulary from the cache.
+A table of precomputed analyses of the same vocabulary is measured too; it
+is memory-mapped, so its size is reported as the size of the file.
+
+    python -m benchmarks.memory --words 200000 --weighted
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import List
+
+import pyhfst
+from .synthetic import generate
+
+
+def measure(path: str, words: List[str], mode: str) -> None:
+    """
+    Fills the cache of a new Hfst object with the analyses of every word and prints its footprint.
+
+    :param path: The path of the transducer.
+    :param words: The vocabulary to look up.
+    :param mode: "formatted", "compact" or "precomputed".
+    """
+    tr = pyhfst.HfstInputStream(
+        path, cache=mode != "precomputed", compact=mode == "compact", precomputed=mode == "precomputed"
+    ).read()
+    # the Analyzer and its buffers are not part of the cache
+    tr.lookup(words[0])
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for word in words:
+        tr.lookup(word)
+    fill = time.perf_counter() - start
+    gc.collect()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for word in words:
+        tr.lookup(word)
+    hits = time.perf_counter() - start
+    if mode == "precomputed":
+        entries, size = len(tr.precomputed), os.path.getsize(pyhfst.precomputed_path(path))
+    else:
+        entries, size = tr.stats()["entries"], tr.stats()["bytes"]
+    print(
+        f"{mode:>11s} {entries:9d} {allocated / 2 ** 20:10.1f} {size / 2 ** 20:10.1f} "
+        f"{max(allocated, size) / entries:8.0f} {len(words) / fill:10.0f} {len(words) / hits:10.0f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, default=100000)
+    parser.add_argument("--weighted", action="store_true")
+    parser.add_argument("--flags", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.hfstol")
+        words = sorted(set(generate(path, words=args.words, weighted=args.weighted, flags=args.flags)))
+        print(
+            f"{'mode':>11s} {'entries':>9s} {'traced MB':>10s} {'cache MB':>10s} "
+            f"{'B/entry':>8s} {'fill/s':>10s} {'hits/s':>10s}"
+        )
+        pyhfst.precompute(path, words)
+        for mode in ("formatted", "compact", "precomputed"):
+            measure(path, words, mode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Measures lookup throughput of ParallelHfst for an increasing number of
+worker processes on a synthetic corpus.
+
+    python -m benchmarks.parallel --tokens 1000000 --workers 1 2 4 8 16 32
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import pyhfst
+from .synthetic import generate, random_word
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=200000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--cache", action="store_true", help="let the workers cache their results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.hfstol")
+        words = generate(path, words=args.words)
+        rng = random.Random(0)
+        # known words and random letter strings, drawn uniformly so that few
+        # tokens repeat within a chunk
+        corpus = [
+            rng.choice(words) if rng.random() < 0.8 else random_word(rng)
+            for _ in range(args.tokens)
+        ]
+
+        start = time.perf_counter()
+        tr = pyhfst.HfstInputStream(path, cache=args.cache).read()
+        for _ in tr.lookup_many_iter(corpus, batch_size=args.chunk_size):
+            pass
+        serial = time.perf_counter() - start
+        print(f"{'serial':>10s} {args.tokens / serial:12.0f} tokens/s")
+
+        for workers in sorted(set(args.workers)):
+            with pyhfst.ParallelHfst(path, workers=workers, chunk_size=args.chunk_size, cache=args.cache) as tr:
+                start = time.perf_counter()
+                for _ in tr.lookup_many_iter(corpus):
+                    pass
+                seconds = time.perf_counter() - start
+            print(
+                f"{workers:>10d} {args.tokens / seconds:12.0f} tokens/s "
+                f"{serial / seconds:6.2f}x serial"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compares looking up a sorted word list word by word with looking it up in
+batches that walk the transducer once per batch, sharing the work done for
+common prefixes (lookup_many with shared_prefixes). The cache is disabled so
+that every word is analysed.
+
+The word list is made of the surface forms of a synthetic transducer and of
+the forms with one to three random letters appended, sorted, as in a
+lexicon or a frequency list dump where "koira" is followed by "koiran" and
+"koirani":
+
+    python -m benchmarks.shared_prefixes --words 1000000 --epsilon-branches 1
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import pyhfst
+from .synthetic import LETTERS, generate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=1000000, help="the length of the word list")
+    parser.add_argument("--lexicon", type=int, default=100000, help="the number of surface forms of the transducer")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--weighted", action="store_true")
+    parser.add_argument("--flags", action="store_true")
+    parser.add_argument("--epsilon-branches", type=int, default=0)
+    parser.add_argument("--shuffle", action="store_true", help="look the words up in random order instead")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.hfstol")
+        start = time.perf_counter()
+        lexicon = generate(
+            path,
+            words=args.lexicon,
+            weighted=args.weighted,
+            flags=args.flags,
+            epsilon_branches=args.epsilon_branches,
+        )
+        rng = random.Random(0)
+        words = set(lexicon[: args.words])
+        while len(words) < args.words:
+            words.add(rng.choice(lexicon) + "".join(rng.choice(LETTERS) for _ in range(rng.randint(1, 3))))
+        words = sorted(words)
+        if args.shuffle:
+            rng.shuffle(words)
+        tr = pyhfst.HfstInputStream(path, cache=False, compiled=False, precomputed=False).read()
+        print(
+            f"{len(words)} words, {len(lexicon)} in the transducer, generated and loaded in "
+            f"{time.perf_counter() - start:.1f} s, {pyhfst.Analyzer.__module__.split('.')[0]}"
+        )
+
+        seconds = {False: 0.0, True: 0.0}
+        analysed = 0
+        for i in range(0, len(words), args.batch_size):
+            batch = words[i : i + args.batch_size]
+            analyses = {}
+            for shared_prefixes in (False, True):
+                start = time.perf_counter()
+                analyses[shared_prefixes] = tr.lookup_many(batch, shared_prefixes=shared_prefixes)
+                seconds[shared_prefixes] += time.perf_counter() - start
+            if analyses[True] != analyses[False]:
+                raise AssertionError("shared_prefixes changed the analyses")
+            analysed += sum(1 for a in analyses[False] if a)
+
+        print(f"{analysed} words with analyses")
+        print(f"{'mode':>10s} {'seconds':>9s} {'words/s':>12s}")
+        for shared_prefixes in (False, True):
+            print(
+                f"{'shared' if shared_prefixes else 'per word':>10s} {seconds[shared_prefixes]:9.2f} "
+                f"{len(words) / seconds[shared_prefixes]:12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
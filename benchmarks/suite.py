@@ -0,0 +1,220 @@
+"""
+Runs the lookup benchmarks on a set of synthetic transducer profiles with
+both backends and writes the results as JSON, to compare versions:
+
+    python -m benchmarks.suite --output before.json
+    git checkout feature && python -m benchmarks.suite --output after.json --compare before.json
+
+Each profile and backend is measured in a fresh process, so that the peak
+resident set size is its own. The pure Python backend is measured by
+hiding c_pyhfst from the process; the Cython backend is skipped when it is
+not built. Reported per run:
+
+- the time it takes to load the transducer from the .hfstol file,
+- the cold throughput: every token analysed, without a cache,
+- the warm throughput: every token served from a filled cache,
+- the percentiles of the latency of a single cold lookup,
+- the peak resident set size of the process.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from .synthetic import LETTERS, alphabet, generate, random_word
+
+BACKENDS = ("pyhfst", "c_pyhfst")
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "unweighted": {},
+    "weighted": {"weighted": True},
+    "flags": {"flags": True},
+    "epsilons": {"epsilon_branches": 3},
+    "large-alphabet": {"letters": alphabet(5000)},
+}
+METRICS = ("load_seconds", "cold_tokens_per_second", "warm_tokens_per_second", "p50_ms", "p99_ms", "peak_rss_mb")
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Returns the peak resident set size of the process.
+
+    :return: The size in megabytes, or None where it cannot be measured.
+    """
+    # ru_maxrss is inherited from the parent process on Linux, VmHWM is not
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2 ** 10
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+
+
+def measure(backend: str, path: str, corpus: List[str]) -> Dict[str, Any]:
+    """
+    Measures one transducer with one backend in the calling process.
+
+    :param backend: "pyhfst" to hide c_pyhfst before pyhfst is imported, "c_pyhfst" to use it.
+    :param path: The path of the transducer.
+    :param corpus: The tokens to look up.
+    :return: The measurements, or {"skipped": reason} if the backend is not available.
+    """
+    if backend == "pyhfst":
+        sys.modules["c_pyhfst"] = None
+    import pyhfst
+
+    if pyhfst.Analyzer.__module__.split(".")[0] != backend:
+        return {"skipped": f"{backend} is not available"}
+
+    start = time.perf_counter()
+    tr = pyhfst.HfstInputStream(path, cache=False, compiled=False, precomputed=False).read()
+    load = time.perf_counter() - start
+
+    latencies = []
+    for token in corpus:
+        start = time.perf_counter()
+        tr.lookup(token)
+        latencies.append(time.perf_counter() - start)
+    cold = sum(latencies)
+
+    tr = pyhfst.Hfst(tr.tr, cache=True)
+    tr.lookup_many(corpus)
+    start = time.perf_counter()
+    for token in corpus:
+        tr.lookup(token)
+    warm = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "load_seconds": load,
+        "cold_tokens_per_second": len(corpus) / cold,
+        "warm_tokens_per_second": len(corpus) / warm,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p90_ms": latencies[int(len(latencies) * 0.9)] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run(backend: str, path: str, corpus_path: str) -> Dict[str, Any]:
+    """
+    Measures one transducer with one backend in a new process.
+
+    :param backend: The backend, see measure.
+    :param path: The path of the transducer.
+    :param corpus_path: A file with the tokens to look up, one per line.
+    :return: The measurements.
+    """
+    process = subprocess.run(
+        [sys.executable, "-m", "benchmarks.suite", "--measure", backend, path, corpus_path],
+        stdout=subprocess.PIPE,
+        check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    return json.loads(process.stdout)
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]]) -> None:
+    """
+    Prints the change of every metric relative to an earlier run.
+
+    :param results: The results of this run.
+    :param baseline: The results of the earlier run.
+    """
+    before = {(r["profile"], r["backend"]): r for r in baseline}
+    print(f"{'profile':>15s} {'backend':>9s} " + " ".join(f"{m:>22s}" for m in METRICS))
+    for result in results:
+        old = before.get((result["profile"], result["backend"]))
+        if old is None or "skipped" in result or "skipped" in old:
+            continue
+        changes = []
+        for metric in METRICS:
+            if result.get(metric) is None or not old.get(metric):
+                changes.append(f"{'-':>22s}")
+            else:
+                changes.append(f"{(result[metric] / old[metric] - 1) * 100:+21.1f}%")
+        print(f"{result['profile']:>15s} {result['backend']:>9s} " + " ".join(changes))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=10000)
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--output", help="the JSON file to write the results to")
+    parser.add_argument("--compare", help="a JSON file written by an earlier run to compare with")
+    parser.add_argument("--measure", nargs=3, metavar=("BACKEND", "TRANSDUCER", "CORPUS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        backend, path, corpus_path = args.measure
+        with open(corpus_path, encoding="utf-8") as f:
+            corpus = f.read().split("\n")
+        json.dump(measure(backend, path, corpus), sys.stdout)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in args.profiles:
+            path = os.path.join(tmp, f"{profile}.hfstol")
+            words = generate(path, words=args.words, **PROFILES[profile])
+            rng = random.Random(0)
+            letters = PROFILES[profile].get("letters", LETTERS)
+            corpus = [
+                rng.choice(words) if rng.random() < 0.8 else random_word(rng, letters=letters)
+                for _ in range(args.tokens)
+            ]
+            corpus_path = os.path.join(tmp, f"{profile}.txt")
+            with open(corpus_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(corpus))
+            for backend in args.backends:
+                result = {"profile": profile, "backend": backend, "file_bytes": os.path.getsize(path)}
+                result.update(run(backend, path, corpus_path))
+                results.append(result)
+                if "skipped" in result:
+                    print(f"{profile:>15s} {backend:>9s} skipped: {result['skipped']}", file=sys.stderr)
+                else:
+                    print(
+                        f"{profile:>15s} {backend:>9s} load {result['load_seconds']:6.2f} s, "
+                        f"cold {result['cold_tokens_per_second']:8.0f}/s, "
+                        f"warm {result['warm_tokens_per_second']:8.0f}/s, "
+                        f"p50 {result['p50_ms']:6.3f} ms, p99 {result['p99_ms']:6.3f} ms, "
+                        f"peak {result['peak_rss_mb'] or 0:6.1f} MB",
+                        file=sys.stderr,
+                    )
+
+    report = {
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "words": args.words,
+        "tokens": args.tokens,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f)["results"])
+
+
+if __name__ == "__main__":
+    main()
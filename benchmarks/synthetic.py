@@ -0,0 +1,379 @@
+"""
+Writer for synthetic HFST optimized-lookup transducers.
+
+The files produced here follow the same layout as the ones written by
+hfst-fst2fst: states with a single class of input symbols are stored
+directly in the transition table, everything else gets a packed row in the
+index table.
+"""
+import random
+import struct
+from typing import Dict, List, Set, Tuple, Union
+from pathlib import Path
+
+TRANSITION_TARGET_TABLE_START = 2147483648
+NO_SYMBOL_NUMBER = 65535
+NO_TABLE_INDEX = 4294967295
+INFINITE_WEIGHT = float(4294967295)
+
+EPSILON = "@_EPSILON_SYMBOL_@"
+LETTERS = "abcdefghijklmnopqrstuvwxyzäö"
+TAGS = [
+    ["+N", "+V", "+A", "+Adv", "+Pcle"],
+    ["+Sg", "+Pl"],
+    ["+Nom", "+Gen", "+Par", "+Ine", "+Ela", "+Ill", "+Ade", "+Abl", "+All"],
+]
+
+Arc = Tuple[int, int, int, float]
+
+
+def _is_flag(symbol: str) -> bool:
+    return len(symbol) > 5 and symbol[0] == "@" and symbol[-1] == "@" and symbol[2] == "."
+
+
+class SyntheticTransducer:
+    """
+    A transducer under construction: a symbol table and a list of states
+    with their arcs and final weights.
+    """
+
+    def __init__(self, weighted: bool = False) -> None:
+        self.weighted = weighted
+        self.input_symbols: List[str] = [EPSILON]
+        self.output_symbols: List[str] = []
+        self.finals: Dict[int, float] = {}
+        self.arcs: List[List[Arc]] = []
+        self.add_state()
+
+    def add_state(self) -> int:
+        """
+        Adds a new state.
+
+        :return: The number of the new state.
+        """
+        self.arcs.append([])
+        return len(self.arcs) - 1
+
+    def add_input_symbol(self, symbol: str) -> None:
+        """
+        Registers a symbol that may appear on the input side.
+
+        :param symbol: The symbol to register.
+        """
+        if symbol in self.output_symbols:
+            self.output_symbols.remove(symbol)
+        if symbol not in self.input_symbols:
+            self.input_symbols.append(symbol)
+
+    def add_output_symbol(self, symbol: str) -> None:
+        """
+        Registers a symbol that only appears on the output side.
+
+        :param symbol: The symbol to register.
+        """
+        if symbol not in self.input_symbols and symbol not in self.output_symbols:
+            self.output_symbols.append(symbol)
+
+    def add_arc(self, source: int, input: str, output: str, target: int, weight: float = 0.0) -> None:
+        """
+        Adds an arc between two states. Symbols are given as strings and
+        resolved when the transducer is written.
+
+        :param source: The source state.
+        :param input: The input symbol, or "" for epsilon.
+        :param output: The output symbol, or "" for epsilon.
+        :param target: The target state.
+        :param weight: The weight of the arc.
+        """
+        input = input or EPSILON
+        output = output or EPSILON
+        self.add_input_symbol(input)
+        self.add_output_symbol(output)
+        self.arcs[source].append((input, output, target, weight))
+
+    def set_final(self, state: int, weight: float = 0.0) -> None:
+        """
+        Marks a state as final.
+
+        :param state: The state to mark.
+        :param weight: The final weight.
+        """
+        self.finals[state] = weight
+
+    def write(self, path: Union[str, Path]) -> None:
+        """
+        Writes the transducer as an HFST optimized-lookup file.
+
+        :param path: The path of the file to write.
+        """
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the transducer into the HFST optimized-lookup format.
+
+        :return: The bytes of the transducer file.
+        """
+        symbols = self.input_symbols + self.output_symbols
+        symbol_numbers = {s: i for i, s in enumerate(symbols)}
+        flags = {symbol_numbers[s] for s in self.input_symbols if _is_flag(s)}
+        input_count = len(self.input_symbols)
+
+        def input_class(symbol: int) -> int:
+            return 0 if symbol == 0 or symbol in flags else symbol
+
+        arcs: List[List[Tuple[int, int, int, float]]] = []
+        indexed: List[bool] = []
+        for state, state_arcs in enumerate(self.arcs):
+            numbered = [
+                (symbol_numbers[i], symbol_numbers[o], t, w) for i, o, t, w in state_arcs
+            ]
+            numbered.sort(key=lambda arc: input_class(arc[0]))
+            arcs.append(numbered)
+            classes = {input_class(arc[0]) for arc in numbered}
+            indexed.append(state == 0 or len(classes) > 1)
+
+        # transition table layout
+        transitions: List[List] = []
+        transition_positions: Dict[int, int] = {}
+        class_positions: Dict[int, Dict[int, int]] = {}
+        for state in range(len(arcs)):
+            if indexed[state]:
+                # the separator ends the transitions of the state before,
+                # which would otherwise run on into these ones
+                transitions.append([NO_SYMBOL_NUMBER, NO_SYMBOL_NUMBER, NO_TABLE_INDEX, INFINITE_WEIGHT])
+                positions: Dict[int, int] = {}
+                for arc in arcs[state]:
+                    positions.setdefault(input_class(arc[0]), len(transitions))
+                    transitions.append(list(arc))
+                class_positions[state] = positions
+            else:
+                transition_positions[state] = len(transitions)
+                if state in self.finals:
+                    transitions.append([NO_SYMBOL_NUMBER, NO_SYMBOL_NUMBER, 1, self.finals[state]])
+                else:
+                    transitions.append([NO_SYMBOL_NUMBER, NO_SYMBOL_NUMBER, NO_TABLE_INDEX, INFINITE_WEIGHT])
+                transitions.extend(list(arc) for arc in arcs[state])
+        transitions.append([NO_SYMBOL_NUMBER, NO_SYMBOL_NUMBER, NO_TABLE_INDEX, INFINITE_WEIGHT])
+
+        # index table layout, packed first-fit within a window at the end of
+        # the table so that packing stays linear in the number of states
+        used = bytearray()
+        index_positions: Dict[int, int] = {}
+        first_free = 0
+        for state in range(len(arcs)):
+            if not indexed[state]:
+                continue
+            offsets = [0] + [1 + c for c in class_positions[state]]
+            base = max(first_free, len(used) - 2 * input_count)
+            while True:
+                end = base + max(offsets) + 1
+                if len(used) < end:
+                    used.extend(bytes(end - len(used)))
+                if all(not used[base + o] for o in offsets):
+                    break
+                base += 1
+            for o in offsets:
+                used[base + o] = 1
+            index_positions[state] = base
+            while first_free < len(used) and used[first_free]:
+                first_free += 1
+        index: List[List[int]] = [
+            [NO_SYMBOL_NUMBER, NO_TABLE_INDEX] for _ in range(len(used) + input_count + 1)
+        ]
+
+        def target_of(state: int) -> int:
+            if indexed[state]:
+                return index_positions[state]
+            return TRANSITION_TARGET_TABLE_START + transition_positions[state]
+
+        for state, base in index_positions.items():
+            if state in self.finals:
+                if self.weighted:
+                    index[base][1] = struct.unpack("<I", struct.pack("<f", self.finals[state]))[0]
+                else:
+                    index[base][1] = 1
+            for c, position in class_positions[state].items():
+                index[base + 1 + c] = [c, TRANSITION_TARGET_TABLE_START + position]
+        for transition in transitions:
+            if transition[0] != NO_SYMBOL_NUMBER:
+                transition[2] = target_of(transition[2])
+
+        cyclic = any(t <= s for s, state_arcs in enumerate(self.arcs) for _, _, t, _ in state_arcs)
+        epsilon_arcs = [(s, t) for s, state_arcs in enumerate(arcs) for i, _, t, _ in state_arcs if i == 0]
+        header = struct.pack(
+            "<HHIIII9I",
+            input_count,
+            len(symbols),
+            len(index),
+            len(transitions),
+            len(arcs),
+            sum(len(a) for a in arcs),
+            self.weighted,
+            False,
+            False,
+            False,
+            cyclic,
+            any(i == 0 and o == 0 for a in arcs for i, o, _, _ in a),
+            bool(epsilon_arcs),
+            False,
+            False,
+        )
+        properties = b"version\x003.3\x00type\x00" + (b"HFST_OLW" if self.weighted else b"HFST_OL") + b"\x00"
+
+        out = bytearray()
+        out += b"HFST\x00" + struct.pack("<H", len(properties)) + b"\x00" + properties
+        out += header
+        for symbol in symbols:
+            out += symbol.encode("utf-8") + b"\x00"
+        for input_symbol, target in index:
+            out += struct.pack("<HI", input_symbol, target)
+        transition_format = "<HHIf" if self.weighted else "<HHI"
+        for input_symbol, output_symbol, target, weight in transitions:
+            if self.weighted:
+                out += struct.pack(transition_format, input_symbol, output_symbol, target, weight)
+            else:
+                out += struct.pack(transition_format, input_symbol, output_symbol, target)
+        return bytes(out)
+
+
+def random_word(
+    rng: random.Random, min_length: int = 3, max_length: int = 12, letters: str = LETTERS
+) -> str:
+    """
+    Generates a random word.
+
+    :param rng: The random number generator to use.
+    :param min_length: The minimum length of the word.
+    :param max_length: The maximum length of the word.
+    :param letters: The letters to draw from.
+    :return: The generated word.
+    """
+    return "".join(rng.choice(letters) for _ in range(rng.randint(min_length, max_length)))
+
+
+def alphabet(size: int) -> str:
+    """
+    Returns a large alphabet, such as that of a transducer for a logographic script.
+
+    :param size: The number of letters.
+    :return: The letters, starting at the CJK unified ideographs.
+    """
+    return "".join(chr(0x4E00 + i) for i in range(size))
+
+
+def build_lexicon(
+    words: int = 10000,
+    weighted: bool = False,
+    flags: bool = False,
+    max_analyses: int = 3,
+    seed: int = 0,
+    letters: str = LETTERS,
+    epsilon_branches: int = 0,
+) -> Tuple[SyntheticTransducer, List[str]]:
+    """
+    Builds a letter-trie analyser that maps random surface forms to a lemma
+    followed by a sequence of morphological tags.
+
+    :param words: The number of surface forms in the lexicon.
+    :param weighted: Whether to give the arcs random weights.
+    :param flags: Whether to add a flag-diacritic guarded compounding loop.
+    :param max_analyses: The maximum number of analyses per surface form.
+    :param seed: The seed of the random number generator.
+    :param letters: The alphabet of the surface forms.
+    :param epsilon_branches: The number of dead-end chains of epsilon transitions leaving every letter state,
+        which lookup explores at every letter without finding analyses.
+    :return: The transducer and the list of surface forms in it.
+    """
+    rng = random.Random(seed)
+    fst = SyntheticTransducer(weighted=weighted)
+    for c in letters:
+        fst.add_input_symbol(c)
+
+    def weight() -> float:
+        return round(rng.random() * 10, 2) if weighted else 0.0
+
+    nodes: Dict[Tuple[int, str], int] = {}
+    surface_forms: List[str] = []
+    ends: List[int] = []
+    seen: Set[int] = set()
+    while len(surface_forms) < words:
+        word = random_word(rng, letters=letters)
+        state = 0
+        for c in word:
+            key = (state, c)
+            if key not in nodes:
+                nodes[key] = fst.add_state()
+                fst.add_arc(state, c, c, nodes[key], weight())
+                for _ in range(epsilon_branches):
+                    source = nodes[key]
+                    for tags in TAGS:
+                        target = fst.add_state()
+                        fst.add_arc(source, "", rng.choice(tags), target, weight())
+                        source = target
+            state = nodes[key]
+        if state in seen:
+            continue
+        seen.add(state)
+        ends.append(state)
+        surface_forms.append(word)
+        for _ in range(rng.randint(1, max_analyses)):
+            source = state
+            for tags in TAGS:
+                target = fst.add_state()
+                fst.add_arc(source, "", rng.choice(tags), target, weight())
+                source = target
+            fst.set_final(source, weight())
+
+    if flags:
+        # compounds: any word may be followed by "-" and another word, but
+        # only once, and the second part cannot be a compound boundary again
+        boundary = fst.add_state()
+        back = fst.add_state()
+        for state in ends[::2]:
+            fst.add_arc(state, "@D.CMP.ON@", "@D.CMP.ON@", boundary)
+        fst.add_arc(boundary, "@P.CMP.ON@", "@P.CMP.ON@", back)
+        fst.add_arc(back, "-", "#", 0)
+        for state in ends[1::3]:
+            required = fst.add_state()
+            cleared = fst.add_state()
+            final = fst.add_state()
+            fst.add_arc(state, "@R.CMP.ON@", "@R.CMP.ON@", required)
+            fst.add_arc(required, "@C.CMP@", "@C.CMP@", cleared)
+            fst.add_arc(cleared, "", "+Cmp", final)
+            fst.set_final(final)
+    return fst, surface_forms
+
+
+def generate(
+    path: Union[str, Path],
+    words: int = 10000,
+    weighted: bool = False,
+    flags: bool = False,
+    seed: int = 0,
+    letters: str = LETTERS,
+    epsilon_branches: int = 0,
+) -> List[str]:
+    """
+    Writes a synthetic analyser to the given path.
+
+    :param path: The path of the file to write.
+    :param words: The number of surface forms in the lexicon.
+    :param weighted: Whether the transducer is weighted.
+    :param flags: Whether to add flag diacritics.
+    :param seed: The seed of the random number generator.
+    :param letters: The alphabet of the surface forms, see alphabet.
+    :param epsilon_branches: The number of dead-end epsilon chains leaving every letter state.
+    :return: The surface forms accepted by the analyser.
+    """
+    fst, surface_forms = build_lexicon(
+        words=words,
+        weighted=weighted,
+        flags=flags,
+        seed=seed,
+        letters=letters,
+        epsilon_branches=epsilon_branches,
+    )
+    fst.write(path)
+    return surface_forms
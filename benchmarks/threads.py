@@ -0,0 +1,67 @@
+"""
+Measures the throughput of lookup_many with one to several threads. The
+Cython backend walks the transducer without the GIL, so the throughput
+grows with the number of threads up to the number of cores; the pure
+Python backend is measured too, for comparison. The cache is disabled so
+that every token is analysed:
+
+    python -m benchmarks.threads --threads 1 2 4 8 --epsilon-branches 1
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import pyhfst
+from .synthetic import generate, random_word
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=10000, help="the number of surface forms of the transducer")
+    parser.add_argument("--tokens", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--weighted", action="store_true")
+    parser.add_argument("--flags", action="store_true")
+    parser.add_argument("--epsilon-branches", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.hfstol")
+        words = generate(
+            path,
+            words=args.words,
+            weighted=args.weighted,
+            flags=args.flags,
+            epsilon_branches=args.epsilon_branches,
+        )
+        rng = random.Random(0)
+        tokens = [rng.choice(words) if rng.random() < 0.8 else random_word(rng) for _ in range(args.tokens)]
+        tr = pyhfst.HfstInputStream(path, cache=False, compiled=False, precomputed=False).read()
+        print(
+            f"{len(tokens)} tokens, {len(words)} words in the transducer, "
+            f"{pyhfst.Analyzer.__module__.split('.')[0]}, {os.cpu_count()} cores"
+        )
+
+        expected = None
+        print(f"{'threads':>8s} {'seconds':>9s} {'tokens/s':>12s} {'speedup':>8s}")
+        base = None
+        for threads in sorted(set(args.threads)):
+            tr.lookup_many(tokens[: args.batch_size], threads=threads)
+            start = time.perf_counter()
+            analyses = []
+            for i in range(0, len(tokens), args.batch_size):
+                analyses.extend(tr.lookup_many(tokens[i : i + args.batch_size], threads=threads))
+            seconds = time.perf_counter() - start
+            if expected is None:
+                expected = analyses
+            elif analyses != expected:
+                raise AssertionError("the threads changed the analyses")
+            base = base or seconds
+            print(f"{threads:8d} {seconds:9.2f} {len(tokens) / seconds:12.0f} {base / seconds:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,26 @@
 from typing import Union, List
 from pathlib import Path
 from io import BufferedReader
+import mmap
+import sys
 from .transducer_header cimport TransducerHeader
 from .transducer_alphabet cimport TransducerAlphabet
 from .transducer cimport Transducer as Transducer
 from .analyzer import Analyzer
 
-cpdef Transducer get_transducer(transducer_path: Union[str, Path]):
+cpdef Transducer get_transducer(transducer_path: Union[str, Path], bint memory_map=False):
     """
     Creates a Transducer instance from the given transducer file path.
 
     :param transducer_path: The path to the transducer file.
+    :param memory_map: Whether to memory-map the file and read the tables in place instead of decoding them.
     :return: A Transducer instance.
     """
     with open(transducer_path, "rb") as transducer_file:
-        char_stream = BufferedReader(transducer_file)
+        if memory_map and sys.byteorder == "little":
+            char_stream = mmap.mmap(transducer_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            char_stream = BufferedReader(transducer_file)
         transducer_header = TransducerHeader(char_stream)
         transducer_alphabet = TransducerAlphabet(
             char_stream, transducer_header.get_symbol_count()
@@ -1,7 +1,7 @@
 # cython: language_level=3
 from .common cimport *
-from .flag_diacritic_operation cimport FlagDiacriticOperation
 from .transducer import Transducer
+from .kernel cimport Search, KernelTables
 import cython
 
 
@@ -9,22 +9,28 @@ cdef class Analyzer:
     cdef Transducer transducer
     cdef str input_str
     cdef State state
+    cdef public object max_results
+    cdef public object max_steps
+    cdef public object max_epsilon_depth
+    cdef public object deadline
+    cdef public bint truncated
+    cdef list stack
+    cdef cython.longlong steps
+    cdef Search search
 
 
+    cpdef void reset(self, str input_str)
+    cpdef void set_limits(self, object max_results=*, object max_steps=*, object max_epsilon_depth=*, object deadline=*)
+    cpdef cython.longlong next_checkpoint(self, cython.longlong steps)
+    cpdef bint limit_reached(self, cython.longlong steps)
     cpdef cython.longlong pivot(self, cython.longlong i)
-    cpdef void try_epsilon_indices(self, cython.longlong index)
-    cpdef void try_epsilon_transitions(self, cython.longlong index)
-    cpdef void find_index(self, cython.longlong index)
-    cpdef void handle_epsilon_transition(self, cython.longlong index)
-    cpdef void find_transitions(self, cython.longlong index)
-    cpdef void get_analyses(self, cython.longlong idx)
-    cpdef void update_output_string(self, cython.longlong output_symbol)
-    cpdef void handle_end_of_input_string(self, cython.longlong index, bint is_transition)
-    cpdef void reset_output_pointer(self)
-    cpdef tuple get_final_and_weight(self, cython.longlong index, bint is_transition)
-    cpdef void update_and_note_analysis(self, float weight)
-    cpdef list get_symbols(self)
-    cpdef void note_analysis(self)
     cpdef list get_alphabet(self)
-    cpdef public list analyze(self)
-    cpdef bint push_state(self, FlagDiacriticOperation flag)
\ No newline at end of file
+    cpdef bint rejects_input(self)
+    cpdef list analyze(self, object n_best=*, object max_weight=*, object beam=*)
+    cpdef list next_analyses(self, int count=*)
+    cpdef void traverse(self, object stop_after=*)
+    cpdef void traverse_nogil(self)
+    cpdef object epsilon_closure(self, cython.longlong idx, tuple features)
+    cpdef tuple analyze_batch(self, list input_strings)
+    cpdef void traverse_best(self, object n_best=*, object max_weight=*, object beam=*)
+    cpdef object apply_flag(self, tuple flag, tuple features)
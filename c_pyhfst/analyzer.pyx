@@ -1,7 +1,12 @@
 # cython: language_level=3
 from .common cimport *
-from .flag_diacritic_operation cimport FlagDiacriticOperation, FlagDiacriticOperator
+from .flag_diacritic_operation cimport FLAG_SET, FLAG_REQUIRE, FLAG_DISALLOW
+from .kernel cimport reserve, free_search, traverse_tables
+from libc.stdint cimport uint16_t
 from .transducer import Transducer
+from heapq import heappop, heappush
+from libc.limits cimport LLONG_MAX
+from time import monotonic
 
 cdef class Analyzer:
 
@@ -9,292 +14,839 @@ cdef class Analyzer:
         self.transducer = transducer
         self.input_str = input_str
         self.state = State(input_str, self.transducer)
-
-    cpdef cython.longlong pivot(self, cython.longlong i):
+        self.max_results = None
+        self.max_steps = None
+        self.max_epsilon_depth = None
+        self.deadline = None
+        self.truncated = False
+        self.stack = None
+        self.steps = 0
+
+    def __dealloc__(self):
+        free_search(&self.search)
+
+    cpdef void reset(self, str input_str):
         """
-        Computes the pivot for the given index.
+        Prepares the analyzer for a new input string, reusing its state.
 
-        :param i: The index to compute the pivot for.
-        :return: The pivot value.
+        :param input_str: The new input string.
         """
-        if i >= TRANSITION_TARGET_TABLE_START:
-            return (i - TRANSITION_TARGET_TABLE_START) % TRANSITION_TARGET_TABLE_START
-        return i
+        self.input_str = input_str
+        self.state.reset(input_str)
+        self.truncated = False
+        self.stack = None
+        self.steps = 0
 
-    cpdef void try_epsilon_indices(self, cython.longlong index):
+    cpdef void set_limits(self, object max_results=None, object max_steps=None,
+                          object max_epsilon_depth=None, object deadline=None):
         """
-        Tries epsilon indices for the given index and state.
-
-        :param index: The index to try epsilon indices for.
-        :param state: The current state of the transducer.
+        Sets the limits of the traversals, None meaning no limit. A traversal
+        that reaches a limit stops, or for max_epsilon_depth abandons the
+        path, and sets truncated.
+
+        :param max_results: The maximum number of analyses.
+        :param max_steps: The maximum number of states visited.
+        :param max_epsilon_depth: The maximum number of epsilon and flag diacritic transitions in a row on a path.
+        :param deadline: The time.monotonic() time after which the traversal stops.
         """
-        if self.transducer.index_table.get_input(index) == 0:
-            self.try_epsilon_transitions(self.pivot(
-                self.transducer.index_table.get_target(index)))
+        self.max_results = max_results
+        self.max_steps = max_steps
+        self.max_epsilon_depth = max_epsilon_depth
+        self.deadline = deadline
 
-    cpdef void try_epsilon_transitions(self, cython.longlong index):
+    cpdef cython.longlong next_checkpoint(self, cython.longlong steps):
         """
-        Tries epsilon transitions for the given index and state.
+        Computes the step at which a traversal next checks its step limit and its deadline.
 
-        :param index: The index to try epsilon transitions for.
-        :param state: The current state of the transducer.
+        :param steps: The number of steps taken so far.
+        :return: The step of the next check.
         """
-        cdef cython.longlong input_symbol
-
-        while True:
-            input_symbol = self.transducer.transition_table.get_input(index)
-            if self.transducer.operations.get(input_symbol):
-                if not self.push_state(self.transducer.operations[input_symbol]):
-                    index += 1
-                    continue
-                self.handle_epsilon_transition(index)
-                index += 1
-                self.state.state_stack.pop()
-                continue
-            elif input_symbol == 0:
-                self.handle_epsilon_transition(index)
-                index += 1
-                continue
-            else:
-                break
+        cdef cython.longlong checkpoint = steps + LIMIT_CHECK_INTERVAL if self.deadline is not None else LLONG_MAX
+        if self.max_steps is not None and self.max_steps + 1 < checkpoint:
+            checkpoint = self.max_steps + 1
+        return checkpoint
 
-    cpdef void find_index(self, cython.longlong index):
+    cpdef bint limit_reached(self, cython.longlong steps):
         """
-        Finds the index in the transducer for the given index and state.
+        Checks the step limit and the deadline.
 
-        :param index: The index to find in the transducer.
-        :param state: The current state of the transducer.
+        :param steps: The number of steps taken so far.
+        :return: True if the traversal has to stop.
         """
-        if self.transducer.index_table.get_input(index + (self.state.input_string[self.state.input_pointer - 1])) == self.state.input_string[self.state.input_pointer - 1]:
-            self.find_transitions(self.pivot(self.transducer.index_table.get_target(
-                index + self.state.input_string[self.state.input_pointer - 1])))
+        return (self.max_steps is not None and steps > self.max_steps) or (
+            self.deadline is not None and monotonic() > self.deadline
+        )
 
-    cpdef void handle_epsilon_transition(self, cython.longlong index):
+    cpdef cython.longlong pivot(self, cython.longlong i):
         """
-        Handles epsilon transitions for the given index and state.
+        Computes the pivot for the given index.
 
-        :param index: The index to handle epsilon transitions for.
-        :param state: The current state of the transducer.
+        :param i: The index to compute the pivot for.
+        :return: The pivot value.
         """
-        self.update_output_string(self.transducer.transition_table.get_output(index))
-        self.state.output_pointer += 1
-
-        if self.transducer.is_weighted:
-            self.state.current_weight += self.transducer.transition_table.get_weight(index)
-
-        self.get_analyses(self.transducer.transition_table.get_target(index))
-
-        if self.transducer.is_weighted:
-            self.state.current_weight -= self.transducer.transition_table.get_weight(index)
-
-        self.state.output_pointer -= 1
+        if i >= TRANSITION_TARGET_TABLE_START:
+            return (i - TRANSITION_TARGET_TABLE_START) % TRANSITION_TARGET_TABLE_START
+        return i
 
-    cpdef void find_transitions(self, cython.longlong index):
+    cpdef list get_alphabet(self):
         """
-        Finds the transitions in the transducer for the given index and state.
+        Gets the alphabet of the transducer.
 
-        :param index: The index to find transitions for.
-        :param state: The current state of the transducer.
+        :return: A list of alphabet symbols.
         """
-        for idx in range(index, self.transducer.transition_table.size()):
-            input_symbol = self.transducer.transition_table.get_input(idx)
-            if input_symbol == NO_SYMBOL_NUMBER:
-                break
-
-            if input_symbol == self.state.input_string[self.state.input_pointer - 1]:
-                self.update_output_string(self.transducer.transition_table.get_output(idx))
-                self.state.output_pointer += 1
-
-                if self.transducer.is_weighted:
-                    self.state.current_weight += self.transducer.transition_table.get_weight(
-                        idx)
-
-                self.get_analyses(self.transducer.transition_table.get_target(idx))
-
-                if self.transducer.is_weighted:
-                    self.state.current_weight -= self.transducer.transition_table.get_weight(
-                        idx)
-
-                self.state.output_pointer -= 1
-            else:
-                break
+        return self.transducer.alphabet.keyTable
 
-    cpdef void get_analyses(self, cython.longlong idx):
+    cpdef bint rejects_input(self):
         """
-        Gets the analyses for the given index and state.
+        Checks whether the input string is empty or contains a character that
+        starts no input symbol, in which case it cannot have any analyses.
 
-        :param idx: The index to get the analyses for.
-        :param state: The current state of the transducer.
+        :return: True if the input cannot be analysed.
         """
-        cdef cython.longlong index = self.pivot(idx)
-        cdef cython.longlong next_v = index
-        is_transition = idx >= TRANSITION_TARGET_TABLE_START
-        if is_transition:
-            if self.transducer.is_weighted:
-                next_v = self.pivot(index)
-            self.try_epsilon_transitions(next_v + 1)
-        else:
-            self.try_epsilon_indices(index + 1)
-
-        if self.state.input_string[self.state.input_pointer] == NO_SYMBOL_NUMBER:
-            self.handle_end_of_input_string(index, is_transition)
-            return
-
-        self.state.input_pointer += 1
-
-        if is_transition:
-            self.find_transitions(index + 1)
-        else:
-            self.find_index(index + 1)
-
-        self.state.input_pointer -= 1
-        self.reset_output_pointer()
-
-    cpdef void update_output_string(self, cython.longlong output_symbol):
+        cdef list input_string = self.state.input_string
+        cdef Py_ssize_t i
+        for i in range(len(input_string)):
+            if input_string[i] == NO_SYMBOL_NUMBER:
+                return i != len(input_string) - 1 or i == 0
+        return True
+
+    cpdef list analyze(self, object n_best=None, object max_weight=None, object beam=None):
         """
-        Updates the output string in the state based on the output symbol.
+        Analyzes the input string using the transducer.
 
-        :param state: The current state of the transducer.
-        :param output_symbol: The output symbol to append or update in the output string.
+        :param n_best: The maximum number of analyses to return, the lightest ones.
+        :param max_weight: The maximum weight of an analysis.
+        :param beam: The maximum difference in weight between an analysis and the lightest one.
+        :return: A list of Result instances representing the analyses of the input string.
+            When any of n_best, max_weight or beam is given, they are sorted by weight.
         """
-        if self.state.output_pointer == len(self.state.output_string):
-            self.state.output_string.append(output_symbol)
+        if self.rejects_input():
+            return []
         else:
-            self.state.output_string[self.state.output_pointer] = output_symbol
-
-    cpdef void handle_end_of_input_string(self, cython.longlong index, bint is_transition):
-        """
-        Handles the end of the input string.
-
-        :param state: The current state of the transducer.
-        :param index: The index being processed.
-        :param is_transition: A boolean indicating whether it's a transition table or an index table.
-        """
-        self.reset_output_pointer()
-
-        is_final, weight = self.get_final_and_weight(index, is_transition)
-        if is_final:
-            self.update_and_note_analysis(weight)
+            if n_best is None and max_weight is None and beam is None:
+                self.traverse_nogil()
+            else:
+                self.traverse_best(n_best, max_weight, beam)
+            if len(self.state.output_string) > self.transducer.output_buffer_size:
+                self.transducer.output_buffer_size = len(self.state.output_string)
+            return self.state.display_vector
 
-    cpdef void reset_output_pointer(self):
+    cpdef list next_analyses(self, int count=1):
         """
-        Resets the output pointer in the state.
-
-        :param state: The current state of the transducer.
+        Continues the traversal of the input string until count more analyses
+        are found, starting it on the first call after reset. The analyses come
+        in the same order as from analyze, and the limits set with set_limits
+        apply to the traversal as a whole.
+
+        :param count: The number of analyses to find.
+        :return: The analyses found since reset, the new ones at the end. Fewer than count new ones
+            means that the traversal is over.
         """
-        if self.state.output_pointer == len(self.state.output_string):
-            self.state.output_string.append(NO_SYMBOL_NUMBER)
-        else:
-            self.state.output_string[self.state.output_pointer] = NO_SYMBOL_NUMBER
+        if self.rejects_input():
+            return []
+        self.traverse(count)
+        return self.state.display_vector
 
-    cpdef tuple get_final_and_weight(self, cython.longlong index, bint is_transition):
+    cpdef void traverse(self, object stop_after=None):
         """
-        Gets the final state and weight based on the index and transition flag.
-
-        :param index: The index being processed.
-        :param is_transition: A boolean indicating whether it's a transition table or an index table.
-        :return: A tuple containing a boolean for final state and a float for the weight.
+        Walks the transducer from the start state and notes every analysis of
+        the input string, within the limits set with set_limits.
+
+        Paths are visited depth first with an explicit stack instead of
+        recursion, in the order of the recursive traversal of earlier versions,
+        so that there is no depth limit. A stack frame is a tuple of (target
+        index, input pointer, output pointer, weight, flag features, output
+        symbol, epsilon depth), the output symbol being written just before
+        the output pointer and the epsilon depth counting the epsilon
+        transitions since the last input symbol. A target index of -1 marks a
+        final state whose analysis is noted when the frame is popped. An
+        epsilon depth of -1 marks a state taken from the epsilon closure of
+        another (see epsilon_closure), the output symbol being then the tuple
+        of the outputs of the path to it.
+
+        The transitions of a state are found without searching: a state in the
+        index table has an entry per input symbol pointing to the start of its
+        transitions, and a state stored in the transition table only has
+        transitions of one input symbol, epsilon and flag diacritics counting
+        as one. The work done at a state thus depends on its transitions for
+        the next input symbol and its epsilon and flag diacritic transitions,
+        not on how many transitions it has in all.
+
+        The stack is kept in self.stack, so a traversal paused by stop_after
+        continues where it left off when traverse is called again. A limit
+        other than max_epsilon_depth ends it for good.
+
+        :param stop_after: The number of analyses after which to pause, or None to note them all.
         """
-        if is_transition:
-            is_final = self.transducer.transition_table.size(
-            ) > index and self.transducer.transition_table.is_final(index)
-            weight = self.transducer.transition_table.get_weight(
-                index) if self.transducer.is_weighted else 0
-        else:
-            is_final = self.transducer.index_table.is_final(index)
-            weight = self.transducer.index_table.get_final_weight(
-                index) if self.transducer.is_weighted else 0
-
-        return is_final, weight
+        cdef Transducer transducer = self.transducer
+        cdef IndexTable index_table = transducer.index_table
+        cdef TransitionTable transition_table = transducer.transition_table
+        cdef cython.longlong transition_count = transition_table.size()
+        cdef dict flag_opcodes = transducer.flag_opcodes
+        cdef bint weighted = transducer.is_weighted
+        cdef list key_table = transducer.alphabet.keyTable
+        cdef list input_string = self.state.input_string
+        cdef list output_string = self.state.output_string
+        cdef list results = self.state.display_vector
+        cdef list stack = self.stack
+        cdef dict epsilon_closures = transducer.epsilon_closures
+        cdef bint closures = transducer.epsilon_closure_cache_size > 0
+        cdef list epsilons
+        cdef tuple features, closure_states, closure_outputs, closure_weights, closure_features
+        cdef object next_features
+        cdef object flag, frame_output, closure
+        cdef float closure_weight, transition_weight
+        cdef Py_ssize_t position
+        cdef cython.longlong idx, index, i, start, end, target
+        cdef int input_pointer, output_pointer, output_symbol, symbol, input_symbol
+        cdef float weight
+        cdef bint is_transition
+        cdef cython.longlong max_results = self.max_results if self.max_results is not None else LLONG_MAX
+        cdef cython.longlong max_depth = self.max_epsilon_depth if self.max_epsilon_depth is not None else LLONG_MAX
+        cdef cython.longlong pause = len(results) + stop_after if stop_after is not None else LLONG_MAX
+        cdef cython.longlong depth, steps = self.steps
+        cdef cython.longlong checkpoint = self.next_checkpoint(steps)
+
+        if stack is None:
+            stack = self.stack = [(0, 0, 0, 0.0, self.state.state_stack[-1], NO_SYMBOL_NUMBER, 0)]
+        while stack:
+            steps += 1
+            if steps >= checkpoint:
+                if self.limit_reached(steps):
+                    self.truncated = True
+                    stack.clear()
+                    break
+                checkpoint = self.next_checkpoint(steps)
+            idx, input_pointer, output_pointer, weight, features, frame_output, depth = stack.pop()
+            if depth < 0:
+                # a state of an epsilon closure, with the outputs of the path to it
+                closure_outputs = frame_output
+                position = output_pointer - len(closure_outputs)
+                for symbol in closure_outputs:
+                    if position < len(output_string):
+                        output_string[position] = symbol
+                    else:
+                        output_string.append(symbol)
+                    position += 1
+            else:
+                output_symbol = frame_output
+                if output_symbol != NO_SYMBOL_NUMBER:
+                    if output_pointer > len(output_string):
+                        output_string.append(output_symbol)
+                    else:
+                        output_string[output_pointer - 1] = output_symbol
+            if idx < 0:
+                results.append(Result(
+                    [key_table[s] for s in output_string[:output_pointer] if s != NO_SYMBOL_NUMBER],
+                    weight if weighted else 1.0))
+                if len(results) >= max_results:
+                    self.truncated = len(stack) > 0
+                    stack.clear()
+                    break
+                if len(results) >= pause:
+                    break
+                continue
 
-    cpdef void update_and_note_analysis(self, float weight):
+            is_transition = idx >= TRANSITION_TARGET_TABLE_START
+            index = idx - TRANSITION_TARGET_TABLE_START if is_transition else idx
+
+            # consuming transitions, or the final state at the end of input;
+            # pushed first so that they are visited after the epsilon ones
+            symbol = input_string[input_pointer]
+            if symbol == NO_SYMBOL_NUMBER:
+                if is_transition:
+                    if transition_count > index and transition_table.is_final(index):
+                        stack.append((-1, input_pointer, output_pointer,
+                                      weight + transition_table.get_weight(index) if weighted else weight,
+                                      features, NO_SYMBOL_NUMBER, 0))
+                elif index_table.is_final(index):
+                    stack.append((-1, input_pointer, output_pointer,
+                                  weight + index_table.get_final_weight(index) if weighted else weight,
+                                  features, NO_SYMBOL_NUMBER, 0))
+            else:
+                if is_transition:
+                    start = index + 1
+                elif index_table.get_input(index + 1 + symbol) == symbol:
+                    start = self.pivot(index_table.get_target(index + 1 + symbol))
+                else:
+                    start = transition_count
+                end = start
+                while end < transition_count and transition_table.get_input(end) == symbol:
+                    end += 1
+                for i in range(end - 1, start - 1, -1):
+                    stack.append((transition_table.get_target(i), input_pointer + 1, output_pointer + 1,
+                                  weight + transition_table.get_weight(i) if weighted else weight,
+                                  features, transition_table.get_output(i), 0))
+
+            # epsilon and flag diacritic transitions, all at once from the
+            # epsilon closure of the state when it is memoized
+            if depth < 0:
+                continue
+            if is_transition:
+                i = index + 1
+            elif index_table.get_input(index + 1) == 0:
+                i = self.pivot(index_table.get_target(index + 1))
+            else:
+                continue
+            input_symbol = transition_table.get_input(i)
+            if depth == 0 and closures and (input_symbol == 0 or input_symbol in flag_opcodes):
+                closure = epsilon_closures.get((idx, features, self.max_epsilon_depth))
+                if closure is None:
+                    closure = self.epsilon_closure(idx, features)
+                if closure:
+                    closure_states = closure[0]
+                    for target, closure_outputs, closure_weights, closure_features in closure_states:
+                        closure_weight = weight
+                        for transition_weight in closure_weights:
+                            closure_weight += transition_weight
+                        stack.append((target, input_pointer, output_pointer + len(closure_outputs), closure_weight,
+                                      closure_features, closure_outputs, -1))
+                    if closure[1]:
+                        self.truncated = True
+                    continue
+            epsilons = []
+            while True:
+                input_symbol = transition_table.get_input(i)
+                flag = flag_opcodes.get(input_symbol)
+                if flag is not None:
+                    next_features = self.apply_flag(flag, features)
+                    if next_features is None:
+                        i += 1
+                        continue
+                elif input_symbol == 0:
+                    next_features = features
+                else:
+                    break
+                if depth >= max_depth:
+                    self.truncated = True
+                    break
+                epsilons.append((transition_table.get_target(i), input_pointer, output_pointer + 1,
+                                 weight + transition_table.get_weight(i) if weighted else weight,
+                                 next_features, transition_table.get_output(i), depth + 1))
+                i += 1
+            epsilons.reverse()
+            stack.extend(epsilons)
+        self.steps = steps
+
+    cpdef void traverse_nogil(self):
         """
-        Updates the state's current weight and notes the analysis.
-
-        :param state: The current state of the transducer.
-        :param weight: The weight to be
+        Notes every analysis of the input string like traverse, but walks the
+        transducer in C with the GIL released, see kernel.traverse_tables, so
+        that lookups in several threads run in parallel. The GIL is taken
+        back only to check the deadline and to build the Result objects once
+        the walk is over. The walk cannot be paused. Epsilon closures are
+        memoized in the search of the Analyzer rather than in the transducer,
+        so that threads do not share them.
         """
-        if self.transducer.is_weighted:
-            self.state.current_weight += weight
-        self.note_analysis()
-        if self.transducer.is_weighted:
-            self.state.current_weight -= weight
-
-    cpdef list get_symbols(self):
+        cdef Transducer transducer = self.transducer
+        cdef KernelTables tables = transducer.kernel_tables
+        cdef Search* search = &self.search
+        cdef list input_string = self.state.input_string
+        cdef tuple features = self.state.state_stack[-1]
+        cdef list key_table = transducer.alphabet.keyTable
+        cdef list results = self.state.display_vector
+        cdef size_t i, j, start = 0
+        if tables is None:
+            tables = transducer.kernel_tables = KernelTables(transducer)
+
+        reserve(<void**>&search.input, &search.input_capacity, len(input_string), sizeof(uint16_t))
+        for i in range(len(input_string)):
+            search.input[i] = input_string[i]
+        reserve(<void**>&search.features, &search.features_capacity, len(features), sizeof(int))
+        for i in range(len(features)):
+            search.features[i] = features[i]
+        search.max_results = self.max_results if self.max_results is not None else -1
+        search.max_steps = self.max_steps if self.max_steps is not None else -1
+        search.max_depth = self.max_epsilon_depth if self.max_epsilon_depth is not None else -1
+        search.deadline = self.deadline if self.deadline is not None else -1.0
+        search.closures.limit = transducer.epsilon_closure_cache_size
+
+        with nogil:
+            traverse_tables(&tables.tables, search)
+
+        for i in range(search.result_count):
+            results.append(Result([key_table[search.symbols[j]] for j in range(start, search.ends[i])],
+                                  search.weights[i]))
+            start = search.ends[i]
+        self.truncated = search.truncated
+        self.steps = search.steps
+        self.stack = []
+
+    cpdef object epsilon_closure(self, cython.longlong idx, tuple features):
         """
-        Gets the symbols for the given state.
-
-        :param state: The current state of the transducer.
-        :return: A list of symbols.
+        Returns the epsilon closure of a state: the states reached from it by
+        epsilon and flag diacritic transitions, each with the outputs, the
+        weights and the flag features of the path to it.
+
+        States that are neither final nor have transitions of their own for
+        an input symbol are left out, since nothing is done at them but
+        following more epsilons. The states are listed in the order in which
+        traverse pushes them on its stack, so that they are visited in the
+        same order as when their epsilon transitions are followed one by one.
+        max_epsilon_depth applies to the paths as in traverse.
+
+        Closures are memoized in the transducer by state, flag features and
+        max_epsilon_depth, as the same states are reached again and again,
+        within an input and from one input to the next.
+
+        :param idx: The target index of the state.
+        :param features: The flag diacritic features when the state is reached.
+        :return: The states as (target index, outputs, weights, features) tuples, and whether a path was
+            abandoned at max_epsilon_depth, or None if the closure has too many states to be memoized.
         """
-        symbols = [self.transducer.alphabet.keyTable[self.state.output_string[i]] for i in range(
-            len(self.state.output_string)) if self.state.output_string[i] != NO_SYMBOL_NUMBER]
-        return symbols
-
-    cpdef void note_analysis(self):
+        cdef Transducer transducer = self.transducer
+        cdef dict closures = transducer.epsilon_closures
+        cdef tuple key = (idx, features, self.max_epsilon_depth)
+        cdef object closure = closures.get(key)
+        if closure is not None:
+            return closure or None
+
+        cdef IndexTable index_table = transducer.index_table
+        cdef TransitionTable transition_table = transducer.transition_table
+        cdef cython.longlong transition_count = transition_table.size()
+        cdef dict flag_opcodes = transducer.flag_opcodes
+        cdef bint weighted = transducer.is_weighted
+        cdef cython.longlong max_depth = self.max_epsilon_depth if self.max_epsilon_depth is not None else LLONG_MAX
+        cdef list closure_states = []
+        cdef list epsilons, pending
+        cdef tuple state_outputs, state_weights, state_features
+        cdef object next_features, flag
+        cdef cython.longlong state, index, i, depth
+        cdef int input_symbol, visited = 0
+        cdef bint is_transition, listed, cut = False
+
+        # a state is listed once the states reached from it are, which is when
+        # traverse gets to its own transitions
+        pending = [(idx, (), (), features, 0, False)]
+        while pending:
+            state, state_outputs, state_weights, state_features, depth, listed = pending.pop()
+            if listed:
+                closure_states.append((state, state_outputs, state_weights, state_features))
+                continue
+            visited += 1
+            if visited > EPSILON_CLOSURE_MAX_SIZE:
+                closure_states = None
+                break
+            is_transition = state >= TRANSITION_TARGET_TABLE_START
+            index = state - TRANSITION_TARGET_TABLE_START if is_transition else state
+            if depth > 0:
+                if not is_transition or (transition_count > index and transition_table.is_final(index)):
+                    pending.append((state, state_outputs, state_weights, state_features, depth, True))
+                elif index + 1 < transition_count and transition_table.get_input(index + 1) not in (0, NO_SYMBOL_NUMBER):
+                    pending.append((state, state_outputs, state_weights, state_features, depth, True))
+
+            if is_transition:
+                i = index + 1
+            elif index_table.get_input(index + 1) == 0:
+                i = self.pivot(index_table.get_target(index + 1))
+            else:
+                continue
+            epsilons = []
+            while True:
+                input_symbol = transition_table.get_input(i)
+                flag = flag_opcodes.get(input_symbol)
+                if flag is not None:
+                    next_features = self.apply_flag(flag, state_features)
+                    if next_features is None:
+                        i += 1
+                        continue
+                elif input_symbol == 0:
+                    next_features = state_features
+                else:
+                    break
+                if depth >= max_depth:
+                    cut = True
+                    break
+                epsilons.append((transition_table.get_target(i), state_outputs + (transition_table.get_output(i),),
+                                 state_weights + (transition_table.get_weight(i),) if weighted else state_weights,
+                                 next_features, depth + 1, False))
+                i += 1
+            epsilons.reverse()
+            pending.extend(epsilons)
+
+        closure = (tuple(reversed(closure_states)), cut) if closure_states is not None else None
+        if len(closures) >= transducer.epsilon_closure_cache_size:
+            closures.clear()
+        closures[key] = closure if closure is not None else False
+        return closure
+
+    cpdef tuple analyze_batch(self, list input_strings):
         """
-        Notes the analysis for the given state.
-
-        :param state: The current state of the transducer.
+        Analyzes several input strings in a single walk of the transducer.
+
+        The input strings are put in a trie of input symbols that is walked
+        together with the transducer: a frame of the traversal stack holds a
+        trie node instead of an input pointer, and the consuming transitions
+        of a state are followed for every symbol that continues an input at
+        that node. The work done for a prefix, epsilon and flag diacritic
+        transitions included, is thus shared by all the inputs that start
+        with it. Every input gets its analyses in the same order as from
+        analyze.
+
+        max_epsilon_depth applies to every path and max_results to every
+        input, an input being marked as truncated when further analyses of it
+        are dropped. max_steps and the deadline apply to the walk as a whole,
+        and stopping at one of them marks every input as truncated.
+
+        :param input_strings: The input strings.
+        :return: The analyses of every input string and whether they were truncated, in input order.
+            The analyses of input strings that rejects_input would reject are None.
         """
-        self.state.display_vector.append(Result(self.get_symbols(), self.state.current_weight if self.transducer.is_weighted else 1.0))
+        cdef Transducer transducer = self.transducer
+        cdef IndexTable index_table = transducer.index_table
+        cdef TransitionTable transition_table = transducer.transition_table
+        cdef cython.longlong transition_count = transition_table.size()
+        cdef dict flag_opcodes = transducer.flag_opcodes
+        cdef bint weighted = transducer.is_weighted
+        cdef list key_table = transducer.alphabet.keyTable
+        cdef list output_string = self.state.output_string
+        cdef list results = [[] for _ in input_strings]
+        cdef list truncated = [False] * len(input_strings)
+        # the trie: the child of every node by input symbol, the parent of
+        # every node, the input ending at every node and the number of inputs
+        # under every node that still take analyses
+        cdef list children = [{}]
+        cdef list parents = [-1]
+        cdef list endings = [-1]
+        cdef list open_inputs = [0]
+        cdef list duplicates = []
+        # the nodes where a path was abandoned at max_epsilon_depth, which
+        # truncates every input under them
+        cdef set cut = set()
+        cdef list stack, epsilons, pending, node_results
+        cdef dict epsilon_closures = transducer.epsilon_closures
+        cdef bint closures = transducer.epsilon_closure_cache_size > 0
+        cdef tuple symbols, features, closure_states, closure_outputs, closure_weights, closure_features
+        cdef object next_features, flag, child, frame_output, closure
+        cdef float closure_weight, transition_weight
+        cdef Py_ssize_t position
+        cdef str string
+        cdef cython.longlong idx, index, i, start, end, target
+        cdef Py_ssize_t number, original, node
+        cdef int output_pointer, output_symbol, symbol, input_symbol
+        cdef float weight
+        cdef bint is_transition
+        cdef cython.longlong max_results = self.max_results if self.max_results is not None else LLONG_MAX
+        cdef cython.longlong max_depth = self.max_epsilon_depth if self.max_epsilon_depth is not None else LLONG_MAX
+        cdef cython.longlong depth, steps = 0
+        cdef cython.longlong checkpoint = self.next_checkpoint(steps)
+
+        for number, string in enumerate(input_strings):
+            symbols = transducer.tokenize(string)
+            if symbols[0] == NO_SYMBOL_NUMBER or NO_SYMBOL_NUMBER in symbols[:-1]:
+                results[number] = None
+                continue
+            node = 0
+            for symbol in symbols[:-1]:
+                child = (<dict>children[node]).get(symbol)
+                if child is None:
+                    child = children[node][symbol] = len(children)
+                    children.append({})
+                    parents.append(node)
+                    endings.append(-1)
+                    open_inputs.append(0)
+                node = child
+            if endings[node] >= 0:
+                duplicates.append((number, endings[node]))
+                continue
+            endings[node] = number
+            while node >= 0:
+                open_inputs[node] += 1
+                node = parents[node]
+
+        stack = [(0, 0, 0, 0.0, self.state.state_stack[0], NO_SYMBOL_NUMBER, 0)]
+        while stack:
+            steps += 1
+            if steps >= checkpoint:
+                if self.limit_reached(steps):
+                    truncated = [True] * len(input_strings)
+                    break
+                checkpoint = self.next_checkpoint(steps)
+            idx, node, output_pointer, weight, features, frame_output, depth = stack.pop()
+            # paths leading only to inputs that have all their analyses are dropped
+            if not open_inputs[node]:
+                continue
+            if depth < 0:
+                closure_outputs = frame_output
+                position = output_pointer - len(closure_outputs)
+                for symbol in closure_outputs:
+                    if position < len(output_string):
+                        output_string[position] = symbol
+                    else:
+                        output_string.append(symbol)
+                    position += 1
+            else:
+                output_symbol = frame_output
+                if output_symbol != NO_SYMBOL_NUMBER:
+                    if output_pointer > len(output_string):
+                        output_string.append(output_symbol)
+                    else:
+                        output_string[output_pointer - 1] = output_symbol
+            if idx < 0:
+                number = endings[node]
+                node_results = results[number]
+                if len(node_results) >= max_results:
+                    continue
+                node_results.append(Result(
+                    [key_table[s] for s in output_string[:output_pointer] if s != NO_SYMBOL_NUMBER],
+                    weight if weighted else 1.0))
+                if len(node_results) >= max_results:
+                    truncated[number] = len(stack) > 0
+                    while node >= 0:
+                        open_inputs[node] -= 1
+                        node = parents[node]
+                    if not open_inputs[0]:
+                        break
+                continue
 
-    cpdef list get_alphabet(self):
+            is_transition = idx >= TRANSITION_TARGET_TABLE_START
+            index = idx - TRANSITION_TARGET_TABLE_START if is_transition else idx
+
+            # the final state where an input ends, and the consuming
+            # transitions of every input going on from here
+            if endings[node] >= 0:
+                if is_transition:
+                    if transition_count > index and transition_table.is_final(index):
+                        stack.append((-1, node, output_pointer,
+                                      weight + transition_table.get_weight(index) if weighted else weight,
+                                      features, NO_SYMBOL_NUMBER, 0))
+                elif index_table.is_final(index):
+                    stack.append((-1, node, output_pointer,
+                                  weight + index_table.get_final_weight(index) if weighted else weight,
+                                  features, NO_SYMBOL_NUMBER, 0))
+            for symbol, child in (<dict>children[node]).items():
+                if is_transition:
+                    start = index + 1
+                elif index_table.get_input(index + 1 + symbol) == symbol:
+                    start = self.pivot(index_table.get_target(index + 1 + symbol))
+                else:
+                    continue
+                end = start
+                while end < transition_count and transition_table.get_input(end) == symbol:
+                    end += 1
+                for i in range(end - 1, start - 1, -1):
+                    stack.append((transition_table.get_target(i), child, output_pointer + 1,
+                                  weight + transition_table.get_weight(i) if weighted else weight,
+                                  features, transition_table.get_output(i), 0))
+
+            # epsilon and flag diacritic transitions, see traverse
+            if depth < 0:
+                continue
+            if is_transition:
+                i = index + 1
+            elif index_table.get_input(index + 1) == 0:
+                i = self.pivot(index_table.get_target(index + 1))
+            else:
+                continue
+            input_symbol = transition_table.get_input(i)
+            if depth == 0 and closures and (input_symbol == 0 or input_symbol in flag_opcodes):
+                closure = epsilon_closures.get((idx, features, self.max_epsilon_depth))
+                if closure is None:
+                    closure = self.epsilon_closure(idx, features)
+                if closure:
+                    closure_states = closure[0]
+                    for target, closure_outputs, closure_weights, closure_features in closure_states:
+                        closure_weight = weight
+                        for transition_weight in closure_weights:
+                            closure_weight += transition_weight
+                        stack.append((target, node, output_pointer + len(closure_outputs), closure_weight,
+                                      closure_features, closure_outputs, -1))
+                    if closure[1]:
+                        cut.add(node)
+                    continue
+            epsilons = []
+            while True:
+                input_symbol = transition_table.get_input(i)
+                flag = flag_opcodes.get(input_symbol)
+                if flag is not None:
+                    next_features = self.apply_flag(flag, features)
+                    if next_features is None:
+                        i += 1
+                        continue
+                elif input_symbol == 0:
+                    next_features = features
+                else:
+                    break
+                if depth >= max_depth:
+                    cut.add(node)
+                    break
+                epsilons.append((transition_table.get_target(i), node, output_pointer + 1,
+                                 weight + transition_table.get_weight(i) if weighted else weight,
+                                 next_features, transition_table.get_output(i), depth + 1))
+                i += 1
+            epsilons.reverse()
+            stack.extend(epsilons)
+
+        pending = list(cut)
+        while pending:
+            node = pending.pop()
+            if endings[node] >= 0:
+                truncated[endings[node]] = True
+            pending.extend((<dict>children[node]).values())
+        for number, original in duplicates:
+            results[number] = list(results[original])
+            truncated[number] = truncated[original]
+        self.truncated = any(truncated)
+        return results, truncated
+
+    cpdef void traverse_best(self, object n_best=None, object max_weight=None, object beam=None):
         """
-        Gets the alphabet of the transducer.
-
-        :return: A list of alphabet symbols.
+        Walks the transducer lightest path first and notes the analyses of the
+        input string in order of weight, for as long as they are within the
+        limits.
+
+        Partial paths wait in a heap ordered by weight, so the work done grows
+        with the number of analyses wanted rather than with the number of
+        analyses there are. Since paths in the heap do not share an output
+        buffer, a heap entry is a tuple of (weight, push order, target index,
+        input pointer, flag features, output, epsilon depth), the output being
+        a linked list of (symbol, previous output) pairs. A path is dropped as
+        soon as it gets heavier than max_weight, or than the first analysis
+        plus beam. This assumes that weights are not negative: a negative
+        weight further down a path can make the results differ from those of
+        traverse. The limits set with set_limits apply as in traverse.
         """
-        return self.transducer.alphabet.keyTable
-
-    cpdef public list analyze(self):
-        if self.state.input_string[0] == NO_SYMBOL_NUMBER:
-            return []
-        else:
-            self.get_analyses(0)
-            return self.state.display_vector
+        cdef Transducer transducer = self.transducer
+        cdef IndexTable index_table = transducer.index_table
+        cdef TransitionTable transition_table = transducer.transition_table
+        cdef cython.longlong transition_count = transition_table.size()
+        cdef dict flag_opcodes = transducer.flag_opcodes
+        cdef bint weighted = transducer.is_weighted
+        cdef list key_table = transducer.alphabet.keyTable
+        cdef list input_string = self.state.input_string
+        cdef list results = self.state.display_vector
+        cdef double limit = max_weight if max_weight is not None else float("inf")
+        cdef list heap = [(0.0, 0, 0, 0, self.state.state_stack[-1], None, 0)]
+        cdef cython.longlong order = 1
+        cdef list symbols
+        cdef tuple features
+        cdef object output, next_features, flag
+        cdef cython.longlong idx, index, i
+        cdef int input_pointer, symbol, input_symbol
+        cdef float weight, next_weight, final_weight
+        cdef bint is_transition, is_final
+        cdef cython.longlong max_results = self.max_results if self.max_results is not None else LLONG_MAX
+        cdef cython.longlong max_depth = self.max_epsilon_depth if self.max_epsilon_depth is not None else LLONG_MAX
+        cdef cython.longlong depth, steps = 0
+        cdef cython.longlong checkpoint = self.next_checkpoint(steps)
+
+        while heap:
+            steps += 1
+            if steps >= checkpoint:
+                if self.limit_reached(steps):
+                    self.truncated = True
+                    return
+                checkpoint = self.next_checkpoint(steps)
+            weight, _, idx, input_pointer, features, output, depth = heappop(heap)
+            if weight > limit:
+                break
+            if idx < 0:
+                symbols = []
+                while output is not None:
+                    symbol, output = output
+                    if symbol != NO_SYMBOL_NUMBER:
+                        symbols.append(key_table[symbol])
+                symbols.reverse()
+                results.append(Result(symbols, weight if weighted else 1.0))
+                if n_best is not None and len(results) >= n_best:
+                    break
+                if len(results) >= max_results:
+                    self.truncated = len(heap) > 0
+                    return
+                if beam is not None and len(results) == 1:
+                    limit = min(limit, weight + beam)
+                continue
 
-    cpdef bint push_state(self, FlagDiacriticOperation flag):
-        cdef list top = self.state.state_stack[-1].copy()
-        if flag.op == FlagDiacriticOperator.P:  # positive set
-            self.state.state_stack.append(top)
-            self.state.state_stack[-1][flag.feature] = flag.value
-            return True
-        elif flag.op == FlagDiacriticOperator.N:  # negative set
-            self.state.state_stack.append(top)
-            self.state.state_stack[-1][flag.feature] = -1 * flag.value
-            return True
-        elif flag.op == FlagDiacriticOperator.R:  # require
-            if flag.value == 0:  # empty require
-                if self.state.state_stack[-1][flag.feature] == 0:
-                    return False
+            is_transition = idx >= TRANSITION_TARGET_TABLE_START
+            index = idx - TRANSITION_TARGET_TABLE_START if is_transition else idx
+
+            # consuming transitions, or the final state at the end of input
+            symbol = input_string[input_pointer]
+            if symbol == NO_SYMBOL_NUMBER:
+                final_weight = 0.0
+                if is_transition:
+                    is_final = transition_count > index and transition_table.is_final(index)
+                    if is_final and weighted:
+                        final_weight = transition_table.get_weight(index)
                 else:
-                    self.state.state_stack.append(top)
-                    return True
-            elif self.state.state_stack[-1][flag.feature] == flag.value:
-                self.state.state_stack.append(top)
-                return True
-            return False
-        elif flag.op == FlagDiacriticOperator.D:  # disallow
-            if flag.value == 0:  # empty disallow
-                if self.state.state_stack[-1][flag.feature] != 0:
-                    return False
+                    is_final = index_table.is_final(index)
+                    if is_final and weighted:
+                        final_weight = index_table.get_final_weight(index)
+                next_weight = weight + final_weight
+                if is_final and next_weight <= limit:
+                    heappush(heap, (next_weight, order, -1, input_pointer, features, output, depth))
+                    order += 1
+            else:
+                if is_transition:
+                    i = index + 1
+                elif index_table.get_input(index + 1 + symbol) == symbol:
+                    i = self.pivot(index_table.get_target(index + 1 + symbol))
                 else:
-                    self.state.state_stack.append(top)
-                    return True
-            elif self.state.state_stack[-1][flag.feature] == flag.value:
-                return False
+                    i = transition_count
+                while i < transition_count and transition_table.get_input(i) == symbol:
+                    next_weight = weight + transition_table.get_weight(i) if weighted else weight
+                    if next_weight <= limit:
+                        heappush(heap, (next_weight, order, transition_table.get_target(i), input_pointer + 1,
+                                        features, (transition_table.get_output(i), output), 0))
+                        order += 1
+                    i += 1
+
+            # epsilon and flag diacritic transitions
+            if is_transition:
+                i = index + 1
+            elif index_table.get_input(index + 1) == 0:
+                i = self.pivot(index_table.get_target(index + 1))
             else:
-                self.state.state_stack.append(top)
-                return True
-        elif flag.op == FlagDiacriticOperator.C:  # clear
-            self.state.state_stack.append(top)
-            self.state.state_stack[-1][flag.feature] = 0
-            return True
-        elif flag.op == FlagDiacriticOperator.U:  # unification
-            if (self.state.state_stack[-1][flag.feature] == 0) or (self.state.state_stack[-1][flag.feature] == flag.value) or (self.state.state_stack[-1][flag.feature] != flag.value and self.state.state_stack[-1][flag.feature] < 0):
-                self.state.state_stack.append(top)
-                self.state.state_stack[-1][flag.feature] = flag.value
-                return True
-            return False
-        return False  # compiler sanity
+                continue
+            while True:
+                input_symbol = transition_table.get_input(i)
+                flag = flag_opcodes.get(input_symbol)
+                if flag is not None:
+                    next_features = self.apply_flag(flag, features)
+                    if next_features is None:
+                        i += 1
+                        continue
+                elif input_symbol == 0:
+                    next_features = features
+                else:
+                    break
+                if depth >= max_depth:
+                    self.truncated = True
+                    break
+                next_weight = weight + transition_table.get_weight(i) if weighted else weight
+                if next_weight <= limit:
+                    heappush(heap, (next_weight, order, transition_table.get_target(i), input_pointer,
+                                    next_features, (transition_table.get_output(i), output), depth + 1))
+                    order += 1
+                i += 1
+
+    cpdef object apply_flag(self, tuple flag, tuple features):
+        """
+        Applies a pre-decoded flag diacritic operation to a set of flag
+        features. Checks and sets that do not change anything return the
+        features as they are, the others a new tuple.
+
+        :param flag: The (opcode, feature, value) tuple of the operation, see compile_flag.
+        :param features: The current values of the flag features.
+        :return: The features after the operation, or None if the operation fails.
+        """
+        cdef int opcode = flag[0]
+        cdef int feature = flag[1]
+        cdef int value = flag[2]
+        cdef int current = features[feature]
+        if opcode == FLAG_SET:
+            if current == value:
+                return features
+        elif opcode == FLAG_REQUIRE:
+            if value == 0:  # empty require
+                return None if current == 0 else features
+            return features if current == value else None
+        elif opcode == FLAG_DISALLOW:
+            if value == 0:  # empty disallow
+                return None if current != 0 else features
+            return None if current == value else features
+        elif current == value:  # unification
+            return features
+        elif current != 0 and current >= 0:
+            return None
+        return features[:feature] + (value,) + features[feature + 1:]
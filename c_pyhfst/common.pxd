@@ -1,5 +1,6 @@
 # cython: language_level=3
 from libc.stdint cimport uint32_t, uint16_t
+from libc.string cimport memcpy
 from cpython cimport dict, array
 import cython
 from .transducer cimport Transducer
@@ -9,6 +10,26 @@ cdef extern from "constants.h":
     cdef cython.longlong INFINITE_WEIGHT = 4294967295
     cdef cython.longlong NO_SYMBOL_NUMBER = 65535
     cdef cython.longlong NO_TABLE_INDEX = 4294967295
+    cdef int OUTPUT_BUFFER_SIZE = 64
+    cdef int TOKENIZATION_CACHE_SIZE = 10000
+    cdef int LIMIT_CHECK_INTERVAL = 256
+    cdef int EPSILON_CLOSURE_CACHE_SIZE = 100000
+    cdef int EPSILON_CLOSURE_MAX_SIZE = 256
+
+# little-endian readers of the records of a memory-mapped transducer file
+cdef inline uint16_t read_ushort(const unsigned char* p) nogil:
+    return p[0] | (p[1] << 8)
+
+
+cdef inline uint32_t read_uint(const unsigned char* p) nogil:
+    return p[0] | (p[1] << 8) | (p[2] << 16) | (<uint32_t>p[3] << 24)
+
+
+cdef inline float read_float(const unsigned char* p) nogil:
+    cdef uint32_t bits = read_uint(p)
+    cdef float result
+    memcpy(&result, &bits, 4)
+    return result
 
 cdef class IndexTable:
     cdef array.array ti_input_symbols
@@ -20,6 +41,12 @@ cdef class IndexTable:
     cpdef bint is_final(self, int i)
     cpdef float get_final_weight(self, int i)
 
+cdef class MappedIndexTable(IndexTable):
+    cdef const unsigned char[::1] _buffer
+
+cdef class CompiledIndexTable(IndexTable):
+    pass
+
 cdef class TransitionTable:
     cdef array.array ti_input_symbols
     cdef array.array ti_output_symbols
@@ -35,16 +62,21 @@ cdef class TransitionTable:
     cpdef bint is_final(self, int pos)
     cpdef int size(self)
 
+cdef class MappedTransitionTable(TransitionTable):
+    cdef const unsigned char[::1] _buffer
+    cdef int _block_size
+
+cdef class CompiledTransitionTable(TransitionTable):
+    pass
+
 cdef class State:
     cdef public Transducer parent
     cdef public list state_stack
     cdef public list output_string
     cdef public list input_string
-    cdef public int output_pointer
-    cdef public int input_pointer
-    cdef public float current_weight
     cdef public list display_vector
 
+    cpdef void reset(self, str input)
     cdef list find_key(self, str index_string)
     
 cdef class Result:
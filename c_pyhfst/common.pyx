@@ -4,6 +4,21 @@ import io
 from .byte_array cimport ByteArray
 cimport cython
 
+
+def map_table(input_stream, cython.longlong size):
+    """
+    Returns a read-only view of the next table in a memory-mapped transducer
+    file and moves the stream past it. No bytes are copied.
+
+    :param input_stream: The memory-mapped transducer file, positioned at the start of the table.
+    :param size: The size of the table in bytes.
+    :return: A memoryview over the table bytes.
+    """
+    start = input_stream.tell()
+    input_stream.seek(start + size)
+    return memoryview(input_stream)[start : start + size]
+
+
 cdef class IndexTable:
     def __init__(self, input_stream: io.BytesIO, cython.longlong indices_count):
         b = ByteArray(indices_count * 6)
@@ -16,9 +31,13 @@ cdef class IndexTable:
         self.ti_targets = array.array('I', [])
         array.resize(self.ti_targets, self._size)
 
+        cdef const unsigned char[::1] raw = b.bytes
+        cdef uint16_t[::1] inputs = self.ti_input_symbols
+        cdef uint32_t[::1] targets = self.ti_targets
+        cdef cython.longlong i
         for i in range(indices_count):
-            self.ti_input_symbols[i] = b.get_ushort()
-            self.ti_targets[i] = b.get_uint()
+            inputs[i] = read_ushort(&raw[6 * i])
+            targets[i] = read_uint(&raw[6 * i + 2])
 
     cpdef uint16_t get_input(self, int i):
         i = i % self._size
@@ -37,9 +56,47 @@ cdef class IndexTable:
         return float(self.ti_targets[i])
 
 
+cdef class MappedIndexTable(IndexTable):
+    """
+    An index table that reads its entries straight from a memory-mapped
+    transducer file instead of decoding them into arrays.
+    """
+    def __init__(self, input_stream, cython.longlong indices_count):
+        self._buffer = map_table(input_stream, indices_count * 6)
+        self._size = indices_count
+
+    cpdef uint16_t get_input(self, int i):
+        i = i % self._size
+        return read_ushort(&self._buffer[6 * i])
+
+    cpdef uint32_t get_target(self, int i):
+        i = i % self._size
+        return read_uint(&self._buffer[6 * i + 2])
+
+    cpdef bint is_final(self, int i):
+        return (self.get_input(i) == NO_SYMBOL_NUMBER and self.get_target(i) != NO_TABLE_INDEX)
+
+    cpdef float get_final_weight(self, int i):
+        return float(self.get_target(i))
+
+
+cdef class CompiledIndexTable(IndexTable):
+    """
+    An index table over columns that are already decoded, such as the
+    memory-mapped columns of a compiled transducer file. The columns are
+    copied into arrays as they are, without decoding.
+    """
+    def __init__(self, ti_input_symbols, ti_targets):
+        self._size = len(ti_targets)
+        self.ti_input_symbols = array.array('H', [])
+        self.ti_input_symbols.frombytes(memoryview(ti_input_symbols).cast('B'))
+        self.ti_targets = array.array('I', [])
+        self.ti_targets.frombytes(memoryview(ti_targets).cast('B'))
+
+
 cdef class TransitionTable:
     def __init__(self, input_stream: io.BytesIO, cython.longlong transition_count, bint is_weighted=True):
-        block_size = 12 if is_weighted else 8
+        cdef int block_size = 12 if is_weighted else 8
         b = ByteArray(transition_count * block_size)
         input_stream.readinto(b.bytes)
 
@@ -59,12 +116,20 @@ cdef class TransitionTable:
         self.ti_weights = array.array('f', [])
         array.resize(self.ti_weights, self._size)
 
+        cdef const unsigned char[::1] raw = b.bytes
+        cdef uint16_t[::1] inputs = self.ti_input_symbols
+        cdef uint16_t[::1] outputs = self.ti_output_symbols
+        cdef uint32_t[::1] targets = self.ti_targets
+        cdef float[::1] weights = self.ti_weights
+        cdef cython.longlong i
+        cdef const unsigned char* record
         for i in range(transition_count):
-            self.ti_input_symbols[i] = b.get_ushort()
-            self.ti_output_symbols[i] = b.get_ushort()
-            self.ti_targets[i] = b.get_uint()
+            record = &raw[block_size * i]
+            inputs[i] = read_ushort(record)
+            outputs[i] = read_ushort(record + 2)
+            targets[i] = read_uint(record + 4)
             if self.is_weighted:
-                self.ti_weights[i] = b.get_float()
+                weights[i] = read_float(record + 8)
 
     cpdef uint16_t get_input(self, int pos):
         pos = pos % self._size
@@ -93,46 +158,76 @@ cdef class TransitionTable:
     cpdef int size(self):
         return self._size
 
+
+cdef class MappedTransitionTable(TransitionTable):
+    """
+    A transition table that reads its entries straight from a memory-mapped
+    transducer file instead of decoding them into arrays.
+    """
+    def __init__(self, input_stream, cython.longlong transition_count, bint is_weighted=True):
+        self._block_size = 12 if is_weighted else 8
+        self._buffer = map_table(input_stream, transition_count * self._block_size)
+        self._size = transition_count
+        self.is_weighted = is_weighted
+
+    cpdef uint16_t get_input(self, int pos):
+        pos = pos % self._size
+        return read_ushort(&self._buffer[self._block_size * pos])
+
+    cpdef uint16_t get_output(self, int pos):
+        pos = pos % self._size
+        return read_ushort(&self._buffer[self._block_size * pos + 2])
+
+    cpdef uint32_t get_target(self, int pos):
+        pos = pos % self._size
+        return read_uint(&self._buffer[self._block_size * pos + 4])
+
+    cpdef float get_weight(self, int pos):
+        pos = pos % self._size
+        if not self.is_weighted:
+            raise Exception("Getting weights of unweighted FST.")
+        return read_float(&self._buffer[self._block_size * pos + 8])
+
+    cpdef bint is_final(self, int pos):
+        return (self.get_input(pos) == NO_SYMBOL_NUMBER and
+                self.get_output(pos) == NO_SYMBOL_NUMBER and
+                self.get_target(pos) == 1)
+
+cdef class CompiledTransitionTable(TransitionTable):
+    """
+    A transition table over columns that are already decoded, such as the
+    memory-mapped columns of a compiled transducer file. The columns are
+    copied into arrays as they are, without decoding.
+    """
+    def __init__(self, ti_input_symbols, ti_output_symbols, ti_targets, ti_weights, bint is_weighted=True):
+        self._size = len(ti_targets)
+        self.is_weighted = is_weighted
+        self.ti_input_symbols = array.array('H', [])
+        self.ti_input_symbols.frombytes(memoryview(ti_input_symbols).cast('B'))
+        self.ti_output_symbols = array.array('H', [])
+        self.ti_output_symbols.frombytes(memoryview(ti_output_symbols).cast('B'))
+        self.ti_targets = array.array('I', [])
+        self.ti_targets.frombytes(memoryview(ti_targets).cast('B'))
+        self.ti_weights = array.array('f', [])
+        self.ti_weights.frombytes(memoryview(ti_weights).cast('B'))
+
 cdef class State:
     def __init__(self, str input, parent):
         self.parent = parent
         self.state_stack = []
-        neutral = [0] * parent.alphabet.features
+        neutral = (0,) * parent.alphabet.features
         self.state_stack.append(neutral)
-        self.output_string = [NO_SYMBOL_NUMBER] * 1000
+        self.output_string = [NO_SYMBOL_NUMBER] * parent.output_buffer_size
         self.input_string = self.find_key(input)
-        self.output_pointer = 0
-        self.input_pointer = 0
-        self.current_weight = 0.0
         self.display_vector = []
 
+    cpdef void reset(self, str input):
+        del self.state_stack[1:]
+        self.input_string = self.find_key(input)
+        self.display_vector.clear()
+
     cdef list find_key(self, str index_string):
-        output = list()
-        i = 0
-
-        while i < len(index_string):
-            match_found = False
-            for length in range(len(index_string) - i, 0, -1):
-                substr = index_string[i : i + length]
-                map_pointer = self.parent.symbol_map
-                for char in substr:
-                    if char in map_pointer:
-                        map_pointer = map_pointer[char]
-                    else:
-                        break
-                else:
-                    if None in map_pointer:
-                        output.append(map_pointer[None])
-                        i += length - 1
-                        match_found = True
-                    break
-            if not match_found:
-                output.append(NO_SYMBOL_NUMBER)
-            i += 1
-
-        output.append(NO_SYMBOL_NUMBER)
-
-        return output
+        return list(self.parent.tokenize(index_string))
 
 cdef class Result:
     def __init__(self, list symbols, float weight):
@@ -1,4 +1,9 @@
 #define TRANSITION_TARGET_TABLE_START 2147483648
 #define INFINITE_WEIGHT 4294967295
 #define NO_SYMBOL_NUMBER 65535
-#define NO_TABLE_INDEX 4294967295
\ No newline at end of file
+#define NO_TABLE_INDEX 4294967295
+#define OUTPUT_BUFFER_SIZE 64
+#define TOKENIZATION_CACHE_SIZE 10000
+#define LIMIT_CHECK_INTERVAL 256
+#define EPSILON_CLOSURE_CACHE_SIZE 100000
+#define EPSILON_CLOSURE_MAX_SIZE 256
\ No newline at end of file
@@ -2,8 +2,17 @@
 from .common cimport *
 from .flag_diacritic_operator cimport FlagDiacriticOperator
 
+# opcodes of pre-decoded flag diacritics, see compile_flag
+cpdef enum FlagOpcode:
+    FLAG_SET = 0
+    FLAG_REQUIRE = 1
+    FLAG_DISALLOW = 2
+    FLAG_UNIFY = 3
+
 cdef class FlagDiacriticOperation:
     cdef FlagDiacriticOperator op
     cdef int feature
     cdef int value
     cpdef bint is_flag(self)
+
+cpdef tuple compile_flag(FlagDiacriticOperation flag)
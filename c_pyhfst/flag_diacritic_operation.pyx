@@ -26,3 +26,25 @@ cdef class FlagDiacriticOperation:
         :return: True if the operation is a flag diacritic operation, False otherwise.
         """
         return self.feature != NO_SYMBOL_NUMBER
+
+
+cpdef tuple compile_flag(FlagDiacriticOperation flag):
+    """
+    Pre-decodes a flag diacritic operation into an (opcode, feature, value)
+    tuple of ints. Positive set, negative set and clear all become FLAG_SET,
+    with the negated value for a negative set and 0 for a clear.
+
+    :param flag: The flag diacritic operation.
+    :return: The opcode, the feature index and the value of the operation.
+    """
+    if flag.op == FlagDiacriticOperator.P:
+        return FLAG_SET, flag.feature, flag.value
+    elif flag.op == FlagDiacriticOperator.N:
+        return FLAG_SET, flag.feature, -1 * flag.value
+    elif flag.op == FlagDiacriticOperator.R:
+        return FLAG_REQUIRE, flag.feature, flag.value
+    elif flag.op == FlagDiacriticOperator.D:
+        return FLAG_DISALLOW, flag.feature, flag.value
+    elif flag.op == FlagDiacriticOperator.C:
+        return FLAG_SET, flag.feature, 0
+    return FLAG_UNIFY, flag.feature, flag.value
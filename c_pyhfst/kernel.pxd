@@ -0,0 +1,125 @@
+# cython: language_level=3
+from libc.stdint cimport uint16_t, uint32_t
+cimport cython
+from .common cimport *
+
+# the tables of a transducer as seen by traverse_tables: the decoded columns,
+# or the records of a memory-mapped file when the record pointers are set
+ctypedef struct Tables:
+    const uint16_t* index_inputs
+    const uint32_t* index_targets
+    const unsigned char* index_records
+    cython.longlong index_size
+    const uint16_t* transition_inputs
+    const uint16_t* transition_outputs
+    const uint32_t* transition_targets
+    const float* transition_weights
+    const unsigned char* transition_records
+    int record_size
+    cython.longlong transition_size
+    bint weighted
+    # the (opcode, feature, value) of the flag diacritic of every symbol,
+    # opcode -1 for the other symbols
+    const int* flags
+    int symbol_count
+    int feature_count
+
+# a frame of the traversal stack, see Analyzer.traverse; the flag features
+# are an offset in the feature pool, which is cut back to pool_mark when the
+# frame is popped. A frame of a state of an epsilon closure has a depth of
+# -1 and the outputs of the path to it in Closures.outputs instead of an
+# output symbol.
+ctypedef struct Frame:
+    cython.longlong idx
+    int input_pointer
+    int output_pointer
+    float weight
+    size_t features
+    int output_symbol
+    cython.longlong depth
+    size_t pool_mark
+    size_t path
+    int path_length
+
+# an epsilon closure, see Analyzer.epsilon_closure: its start state and flag
+# features, and its states in Closures.states
+ctypedef struct Closure:
+    cython.longlong idx
+    size_t features
+    size_t first
+    size_t end
+    bint cut
+    bint memoized
+
+# a state of an epsilon closure with the path to it: the outputs and the
+# weights of its transitions, at the same offset of Closures.outputs and
+# Closures.weights, and the flag features at its end in Closures.features
+ctypedef struct ClosureState:
+    cython.longlong idx
+    size_t path
+    int path_length
+    size_t features
+    cython.longlong depth
+    bint listed
+
+# the epsilon closures memoized by a search, in a hash table keyed by state
+# and flag features, for one max_epsilon_depth
+ctypedef struct Closures:
+    size_t* slots
+    size_t slot_count
+    Closure* closures
+    size_t count
+    size_t capacity
+    ClosureState* states
+    size_t state_count
+    size_t states_capacity
+    uint16_t* outputs
+    float* weights
+    size_t path_count
+    size_t outputs_capacity
+    size_t weights_capacity
+    int* features
+    size_t feature_count
+    size_t features_capacity
+    # the states still to visit while a closure is worked out
+    ClosureState* pending
+    size_t pending_capacity
+    cython.longlong max_depth
+    size_t limit
+
+# the input, the limits, the buffers and the results of a traversal
+ctypedef struct Search:
+    uint16_t* input
+    size_t input_capacity
+    cython.longlong max_results
+    cython.longlong max_steps
+    cython.longlong max_depth
+    double deadline
+    Frame* frames
+    size_t frames_capacity
+    int* features
+    size_t features_capacity
+    uint16_t* output
+    size_t output_capacity
+    # the output symbols of every analysis one after the other, and the end
+    # of every analysis in them with its weight
+    uint16_t* symbols
+    size_t symbols_length
+    size_t symbols_capacity
+    size_t* ends
+    float* weights
+    size_t result_count
+    size_t results_capacity
+    cython.longlong steps
+    bint truncated
+    Closures closures
+
+cdef class KernelTables:
+    cdef Tables tables
+    cdef IndexTable index_table
+    cdef TransitionTable transition_table
+    cdef int* flags
+
+cdef int reserve(void** buffer, size_t* capacity, size_t size, size_t item_size) nogil except -1
+cdef void free_search(Search* search) nogil
+cdef int traverse_tables(const Tables* tables, Search* search) nogil except -1
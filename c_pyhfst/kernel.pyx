@@ -0,0 +1,661 @@
+# cython: language_level=3
+"""
+The traversal of Analyzer.traverse in C, over the tables of a transducer
+and buffers that are plain C arrays, so that it runs without the GIL and
+lookups in several threads run in parallel.
+"""
+from libc.stdlib cimport malloc, calloc, realloc, free
+from libc.string cimport memcpy, memset, memcmp
+from libc.stdint cimport uint64_t
+from libc.limits cimport LLONG_MAX
+from cpython cimport array
+from .flag_diacritic_operation cimport FLAG_SET, FLAG_REQUIRE, FLAG_DISALLOW
+from time import monotonic
+cimport cython
+
+
+cdef class KernelTables:
+    """
+    The tables of a transducer as C pointers for traverse_tables. It keeps
+    the tables alive for as long as the pointers are used.
+    """
+    def __cinit__(self, transducer):
+        cdef IndexTable index_table = transducer.index_table
+        cdef TransitionTable transition_table = transducer.transition_table
+        cdef const unsigned char[::1] records
+        cdef int symbol, i
+        self.index_table = index_table
+        self.transition_table = transition_table
+
+        self.tables.index_size = index_table._size
+        if isinstance(index_table, MappedIndexTable):
+            records = (<MappedIndexTable>index_table)._buffer
+            self.tables.index_records = &records[0] if records.shape[0] else NULL
+        else:
+            self.tables.index_inputs = index_table.ti_input_symbols.data.as_ushorts
+            self.tables.index_targets = index_table.ti_targets.data.as_uints
+
+        self.tables.transition_size = transition_table._size
+        self.tables.weighted = transition_table.is_weighted
+        if isinstance(transition_table, MappedTransitionTable):
+            records = (<MappedTransitionTable>transition_table)._buffer
+            self.tables.transition_records = &records[0] if records.shape[0] else NULL
+            self.tables.record_size = (<MappedTransitionTable>transition_table)._block_size
+        else:
+            self.tables.transition_inputs = transition_table.ti_input_symbols.data.as_ushorts
+            self.tables.transition_outputs = transition_table.ti_output_symbols.data.as_ushorts
+            self.tables.transition_targets = transition_table.ti_targets.data.as_uints
+            self.tables.transition_weights = transition_table.ti_weights.data.as_floats
+
+        self.tables.symbol_count = len(transducer.alphabet.keyTable)
+        self.tables.feature_count = transducer.alphabet.features
+        self.flags = <int*>malloc(3 * max(self.tables.symbol_count, 1) * sizeof(int))
+        if self.flags == NULL:
+            raise MemoryError()
+        for symbol in range(self.tables.symbol_count):
+            self.flags[3 * symbol] = -1
+        for symbol, flag in transducer.flag_opcodes.items():
+            for i in range(3):
+                self.flags[3 * symbol + i] = flag[i]
+        self.tables.flags = self.flags
+
+    def __dealloc__(self):
+        free(self.flags)
+
+
+cdef int reserve(void** buffer, size_t* capacity, size_t size, size_t item_size) nogil except -1:
+    """
+    Grows a buffer to hold at least size items, doubling its capacity.
+
+    :param buffer: The buffer, NULL before the first call.
+    :param capacity: The number of items the buffer holds, updated.
+    :param size: The number of items it has to hold.
+    :param item_size: The size of an item in bytes.
+    :return: 0, or -1 with MemoryError raised.
+    """
+    cdef size_t new_capacity = capacity[0] if capacity[0] else 16
+    cdef void* new_buffer
+    if size <= capacity[0]:
+        return 0
+    while new_capacity < size:
+        new_capacity *= 2
+    new_buffer = realloc(buffer[0], new_capacity * item_size)
+    if new_buffer == NULL:
+        with gil:
+            raise MemoryError()
+    buffer[0] = new_buffer
+    capacity[0] = new_capacity
+    return 0
+
+
+cdef void free_search(Search* search) nogil:
+    """
+    Frees the buffers of a search and its memoized epsilon closures.
+
+    :param search: The search.
+    """
+    free(search.input)
+    free(search.frames)
+    free(search.features)
+    free(search.output)
+    free(search.symbols)
+    free(search.ends)
+    free(search.weights)
+    free(search.closures.slots)
+    free(search.closures.closures)
+    free(search.closures.states)
+    free(search.closures.outputs)
+    free(search.closures.weights)
+    free(search.closures.features)
+    free(search.closures.pending)
+    memset(search, 0, sizeof(Search))
+
+
+@cython.cdivision(True)
+cdef inline cython.longlong wrap(cython.longlong i, cython.longlong size) nogil:
+    # positions past the end of a table wrap around, as in the table classes
+    return i % size if i >= size and size > 0 else i
+
+
+cdef inline uint16_t index_input(const Tables* tables, cython.longlong i) nogil:
+    i = wrap(i, tables.index_size)
+    if tables.index_records != NULL:
+        return read_ushort(tables.index_records + 6 * i)
+    return tables.index_inputs[i] if i < tables.index_size else NO_SYMBOL_NUMBER
+
+
+cdef inline uint32_t index_target(const Tables* tables, cython.longlong i) nogil:
+    i = wrap(i, tables.index_size)
+    if tables.index_records != NULL:
+        return read_uint(tables.index_records + 6 * i + 2)
+    return tables.index_targets[i] if i < tables.index_size else NO_TABLE_INDEX
+
+
+cdef inline uint16_t transition_input(const Tables* tables, cython.longlong i) nogil:
+    i = wrap(i, tables.transition_size)
+    if tables.transition_records != NULL:
+        return read_ushort(tables.transition_records + tables.record_size * i)
+    return tables.transition_inputs[i] if i < tables.transition_size else NO_SYMBOL_NUMBER
+
+
+cdef inline uint16_t transition_output(const Tables* tables, cython.longlong i) nogil:
+    i = wrap(i, tables.transition_size)
+    if tables.transition_records != NULL:
+        return read_ushort(tables.transition_records + tables.record_size * i + 2)
+    return tables.transition_outputs[i] if i < tables.transition_size else NO_SYMBOL_NUMBER
+
+
+cdef inline uint32_t transition_target(const Tables* tables, cython.longlong i) nogil:
+    i = wrap(i, tables.transition_size)
+    if tables.transition_records != NULL:
+        return read_uint(tables.transition_records + tables.record_size * i + 4)
+    return tables.transition_targets[i] if i < tables.transition_size else NO_TABLE_INDEX
+
+
+cdef inline float transition_weight(const Tables* tables, cython.longlong i) nogil:
+    i = wrap(i, tables.transition_size)
+    if tables.transition_records != NULL:
+        return read_float(tables.transition_records + tables.record_size * i + 8)
+    return tables.transition_weights[i] if i < tables.transition_size else 0.0
+
+
+cdef inline bint transition_is_final(const Tables* tables, cython.longlong i) nogil:
+    return (transition_input(tables, i) == NO_SYMBOL_NUMBER and
+            transition_output(tables, i) == NO_SYMBOL_NUMBER and
+            transition_target(tables, i) == 1)
+
+
+cdef inline bint is_flag(const Tables* tables, int symbol) nogil:
+    return symbol < tables.symbol_count and tables.flags[3 * symbol] >= 0
+
+
+@cython.cdivision(True)
+cdef inline cython.longlong pivot(cython.longlong i) nogil:
+    if i >= TRANSITION_TARGET_TABLE_START:
+        return (i - TRANSITION_TARGET_TABLE_START) % TRANSITION_TARGET_TABLE_START
+    return i
+
+
+cdef inline cython.longlong next_checkpoint(Search* search) nogil:
+    # see Analyzer.next_checkpoint
+    cdef cython.longlong checkpoint = search.steps + LIMIT_CHECK_INTERVAL if search.deadline >= 0 else LLONG_MAX
+    if search.max_steps >= 0 and search.max_steps + 1 < checkpoint:
+        checkpoint = search.max_steps + 1
+    return checkpoint
+
+
+cdef bint limit_reached(Search* search) nogil:
+    # see Analyzer.limit_reached, the clock being that of time.monotonic
+    cdef bint expired = False
+    if search.max_steps >= 0 and search.steps > search.max_steps:
+        return True
+    if search.deadline >= 0:
+        with gil:
+            expired = monotonic() > search.deadline
+    return expired
+
+
+cdef inline int push(Search* search, size_t* top, cython.longlong idx, int input_pointer, int output_pointer,
+                     float weight, size_t features, int output_symbol, cython.longlong depth,
+                     size_t pool_mark) nogil except -1:
+    cdef Frame* frame
+    if top[0] >= search.frames_capacity:
+        reserve(<void**>&search.frames, &search.frames_capacity, top[0] + 1, sizeof(Frame))
+    frame = &search.frames[top[0]]
+    frame.idx = idx
+    frame.input_pointer = input_pointer
+    frame.output_pointer = output_pointer
+    frame.weight = weight
+    frame.features = features
+    frame.output_symbol = output_symbol
+    frame.depth = depth
+    frame.pool_mark = pool_mark
+    top[0] += 1
+    return 0
+
+
+cdef inline void reverse_frames(Frame* frames, size_t low, size_t high) nogil:
+    cdef Frame swap
+    while low + 1 < high:
+        high -= 1
+        swap = frames[low]
+        frames[low] = frames[high]
+        frames[high] = swap
+        low += 1
+
+
+cdef inline void reverse_states(ClosureState* states, size_t low, size_t high) nogil:
+    cdef ClosureState swap
+    while low + 1 < high:
+        high -= 1
+        swap = states[low]
+        states[low] = states[high]
+        states[high] = swap
+        low += 1
+
+
+cdef int reserve_output(Search* search, size_t size) nogil except -1:
+    """
+    Grows the output buffer of a search, filling the new part with NO_SYMBOL_NUMBER.
+    """
+    cdef size_t i = search.output_capacity
+    reserve(<void**>&search.output, &search.output_capacity, size, sizeof(uint16_t))
+    while i < search.output_capacity:
+        search.output[i] = NO_SYMBOL_NUMBER
+        i += 1
+    return 0
+
+
+cdef int note_analysis(Search* search, int output_pointer, float weight) nogil except -1:
+    """
+    Adds the output symbols before the output pointer and the weight to the results of the search.
+    """
+    cdef size_t capacity
+    cdef int i
+    reserve(<void**>&search.symbols, &search.symbols_capacity, search.symbols_length + output_pointer,
+            sizeof(uint16_t))
+    for i in range(output_pointer):
+        if search.output[i] != NO_SYMBOL_NUMBER:
+            search.symbols[search.symbols_length] = search.output[i]
+            search.symbols_length += 1
+    capacity = search.results_capacity
+    reserve(<void**>&search.ends, &capacity, search.result_count + 1, sizeof(size_t))
+    reserve(<void**>&search.weights, &search.results_capacity, search.result_count + 1, sizeof(float))
+    search.ends[search.result_count] = search.symbols_length
+    search.weights[search.result_count] = weight
+    search.result_count += 1
+    return 0
+
+
+cdef cython.longlong apply_flag(const Tables* tables, int** pool, size_t* capacity, size_t* pool_top,
+                                const int* flag, size_t features) nogil except -2:
+    """
+    Applies a flag diacritic to the flag features at an offset of a feature
+    pool, see Analyzer.apply_flag. Changed features are put at the top of
+    the pool.
+
+    :return: The offset of the features after the operation, or -1 if it fails.
+    """
+    cdef int opcode = flag[0]
+    cdef int feature = flag[1]
+    cdef int value = flag[2]
+    cdef int current = pool[0][features + feature]
+    cdef size_t result = pool_top[0]
+    if opcode == FLAG_SET:
+        if current == value:
+            return features
+    elif opcode == FLAG_REQUIRE:
+        if value == 0:
+            return -1 if current == 0 else features
+        return features if current == value else -1
+    elif opcode == FLAG_DISALLOW:
+        if value == 0:
+            return -1 if current != 0 else features
+        return -1 if current == value else features
+    elif current == value:
+        return features
+    elif current != 0 and current >= 0:
+        return -1
+    reserve(<void**>pool, capacity, result + tables.feature_count, sizeof(int))
+    memcpy(&pool[0][result], &pool[0][features], tables.feature_count * sizeof(int))
+    pool[0][result + feature] = value
+    pool_top[0] = result + tables.feature_count
+    return result
+
+
+cdef inline uint64_t hash_closure(const Tables* tables, cython.longlong idx, const int* features) nogil:
+    cdef uint64_t h = 14695981039346656037ULL ^ <uint64_t>idx
+    cdef int i
+    h *= 1099511628211ULL
+    for i in range(tables.feature_count):
+        h = (h ^ <uint32_t>features[i]) * 1099511628211ULL
+    return h ^ (h >> 32)
+
+
+cdef void clear_closures(Closures* closures, cython.longlong max_depth) nogil:
+    """
+    Forgets the memoized epsilon closures, keeping the buffers for the next ones.
+    """
+    if closures.slots != NULL:
+        memset(closures.slots, 0, closures.slot_count * sizeof(size_t))
+    closures.count = 0
+    closures.state_count = 0
+    closures.path_count = 0
+    closures.feature_count = 0
+    closures.max_depth = max_depth
+
+
+cdef int insert_closure(const Tables* tables, Closures* closures, size_t number) nogil except -1:
+    """
+    Puts a closure in the hash table of the memoized closures, an open
+    addressing table of closure numbers plus one, doubled and rebuilt when it
+    gets half full.
+    """
+    cdef size_t mask, slot, i
+    cdef Closure* closure
+    if 2 * (number + 1) > closures.slot_count:
+        free(closures.slots)
+        closures.slot_count = 2 * closures.slot_count if closures.slot_count else 1024
+        closures.slots = <size_t*>calloc(closures.slot_count, sizeof(size_t))
+        if closures.slots == NULL:
+            closures.slot_count = 0
+            with gil:
+                raise MemoryError()
+        for i in range(number):
+            insert_closure(tables, closures, i)
+    mask = closures.slot_count - 1
+    closure = &closures.closures[number]
+    slot = hash_closure(tables, closure.idx, &closures.features[closure.features]) & mask
+    while closures.slots[slot]:
+        slot = (slot + 1) & mask
+    closures.slots[slot] = number + 1
+    return 0
+
+
+cdef int push_state(Closures* closures, size_t* top, cython.longlong idx, size_t path, int path_length,
+                    size_t features, cython.longlong depth, bint listed) nogil except -1:
+    cdef ClosureState* state
+    if top[0] >= closures.pending_capacity:
+        reserve(<void**>&closures.pending, &closures.pending_capacity, top[0] + 1, sizeof(ClosureState))
+    state = &closures.pending[top[0]]
+    state.idx = idx
+    state.path = path
+    state.path_length = path_length
+    state.features = features
+    state.depth = depth
+    state.listed = listed
+    top[0] += 1
+    return 0
+
+
+cdef cython.longlong epsilon_closure(const Tables* tables, Search* search, cython.longlong idx,
+                                     size_t features) nogil except -1:
+    """
+    Returns the epsilon closure of a state, see Analyzer.epsilon_closure,
+    working it out the first time and memoizing it in the search. A closure
+    that has too many states is memoized as such, without its states.
+
+    :param tables: The tables of the transducer.
+    :param search: The search.
+    :param idx: The target index of the state.
+    :param features: The offset of the flag features in the feature pool of the search.
+    :return: The number of the closure in search.closures.
+    """
+    cdef Closures* closures = &search.closures
+    cdef const int* key = &search.features[features]
+    cdef size_t feature_size = tables.feature_count * sizeof(int)
+    cdef size_t mask, slot, number, key_features, state_start, path_start, feature_start, first, path
+    cdef size_t top = 0
+    cdef Closure* closure
+    cdef ClosureState state
+    cdef cython.longlong index, i, next_features
+    cdef int input_symbol, k, visited = 0
+    cdef bint is_transition, cut = False, memoized = True
+
+    if closures.slot_count:
+        mask = closures.slot_count - 1
+        slot = hash_closure(tables, idx, key) & mask
+        while closures.slots[slot]:
+            closure = &closures.closures[closures.slots[slot] - 1]
+            if closure.idx == idx and memcmp(&closures.features[closure.features], key, feature_size) == 0:
+                return closures.slots[slot] - 1
+            slot = (slot + 1) & mask
+
+    key_features = closures.feature_count
+    reserve(<void**>&closures.features, &closures.features_capacity, key_features + tables.feature_count,
+            sizeof(int))
+    memcpy(&closures.features[key_features], key, feature_size)
+    closures.feature_count += tables.feature_count
+    state_start = closures.state_count
+    path_start = closures.path_count
+    feature_start = closures.feature_count
+
+    # a state is listed once the states reached from it are, which is when
+    # traverse_tables gets to its own transitions
+    push_state(closures, &top, idx, path_start, 0, key_features, 0, False)
+    while top:
+        top -= 1
+        state = closures.pending[top]
+        if state.listed:
+            reserve(<void**>&closures.states, &closures.states_capacity, closures.state_count + 1,
+                    sizeof(ClosureState))
+            closures.states[closures.state_count] = state
+            closures.state_count += 1
+            continue
+        visited += 1
+        if visited > EPSILON_CLOSURE_MAX_SIZE:
+            memoized = False
+            break
+        is_transition = state.idx >= TRANSITION_TARGET_TABLE_START
+        index = state.idx - TRANSITION_TARGET_TABLE_START if is_transition else state.idx
+        if state.depth > 0 and (
+                not is_transition
+                or (tables.transition_size > index and transition_is_final(tables, index))
+                or (index + 1 < tables.transition_size
+                    and transition_input(tables, index + 1) != 0
+                    and transition_input(tables, index + 1) != NO_SYMBOL_NUMBER)):
+            state.listed = True
+            push_state(closures, &top, state.idx, state.path, state.path_length, state.features, state.depth, True)
+
+        if is_transition:
+            i = index + 1
+        elif index_input(tables, index + 1) == 0:
+            i = pivot(index_target(tables, index + 1))
+        else:
+            continue
+        first = top
+        while True:
+            input_symbol = transition_input(tables, i)
+            if is_flag(tables, input_symbol):
+                next_features = apply_flag(tables, &closures.features, &closures.features_capacity,
+                                           &closures.feature_count, &tables.flags[3 * input_symbol], state.features)
+                if next_features < 0:
+                    i += 1
+                    continue
+            elif input_symbol == 0:
+                next_features = state.features
+            else:
+                break
+            if state.depth >= closures.max_depth:
+                cut = True
+                break
+            # the path to the target: the path to the state and the transition
+            path = closures.path_count
+            reserve(<void**>&closures.outputs, &closures.outputs_capacity, path + state.path_length + 1,
+                    sizeof(uint16_t))
+            reserve(<void**>&closures.weights, &closures.weights_capacity, path + state.path_length + 1,
+                    sizeof(float))
+            for k in range(state.path_length):
+                closures.outputs[path + k] = closures.outputs[state.path + k]
+                closures.weights[path + k] = closures.weights[state.path + k]
+            closures.outputs[path + state.path_length] = transition_output(tables, i)
+            closures.weights[path + state.path_length] = transition_weight(tables, i) if tables.weighted else 0.0
+            closures.path_count += state.path_length + 1
+            push_state(closures, &top, transition_target(tables, i), path, state.path_length + 1, next_features,
+                       state.depth + 1, False)
+            i += 1
+        reverse_states(closures.pending, first, top)
+
+    if memoized:
+        reverse_states(closures.states, state_start, closures.state_count)
+    else:
+        closures.state_count = state_start
+        closures.path_count = path_start
+        closures.feature_count = feature_start
+    number = closures.count
+    reserve(<void**>&closures.closures, &closures.capacity, number + 1, sizeof(Closure))
+    closure = &closures.closures[number]
+    closure.idx = idx
+    closure.features = key_features
+    closure.first = state_start
+    closure.end = closures.state_count
+    closure.cut = cut
+    closure.memoized = memoized
+    closures.count += 1
+    insert_closure(tables, closures, number)
+    return number
+
+
+cdef int traverse_tables(const Tables* tables, Search* search) nogil except -1:
+    """
+    Notes every analysis of the input of a search, visiting the paths in
+    the order of Analyzer.traverse and stopping at the same limits.
+
+    The caller puts the input, ended by NO_SYMBOL_NUMBER, in search.input,
+    the initial flag features at the start of search.features and sets the
+    limits, -1 standing for no limit, and the number of epsilon closures to
+    memoize in search.closures.limit, 0 for none. The analyses are left in
+    search.symbols, search.ends and search.weights.
+
+    :param tables: The tables of the transducer.
+    :param search: The search.
+    :return: 0, or -1 with MemoryError raised.
+    """
+    cdef Closures* closures = &search.closures
+    cdef size_t top = 0, first, n, pool_top = tables.feature_count
+    cdef Frame frame
+    cdef Closure* closure
+    cdef ClosureState* state
+    cdef cython.longlong idx, index, i, start, end, features, checkpoint
+    cdef cython.longlong max_results = search.max_results if search.max_results >= 0 else LLONG_MAX
+    cdef cython.longlong max_depth = search.max_depth if search.max_depth >= 0 else LLONG_MAX
+    cdef int symbol, input_symbol, k
+    cdef float weight
+    cdef bint is_transition, weighted = tables.weighted
+
+    search.steps = 0
+    search.truncated = False
+    search.result_count = 0
+    search.symbols_length = 0
+    if closures.count >= closures.limit or closures.max_depth != max_depth:
+        clear_closures(closures, max_depth)
+    checkpoint = next_checkpoint(search)
+    push(search, &top, 0, 0, 0, 0.0, 0, NO_SYMBOL_NUMBER, 0, pool_top)
+    while top:
+        search.steps += 1
+        if search.steps >= checkpoint:
+            if limit_reached(search):
+                search.truncated = True
+                break
+            checkpoint = next_checkpoint(search)
+        top -= 1
+        frame = search.frames[top]
+        pool_top = frame.pool_mark
+        if frame.depth < 0:
+            # a state of an epsilon closure, with the outputs of the path to it
+            if <size_t>frame.output_pointer > search.output_capacity:
+                reserve_output(search, frame.output_pointer)
+            for k in range(frame.path_length):
+                search.output[frame.output_pointer - frame.path_length + k] = closures.outputs[frame.path + k]
+        elif frame.output_symbol != NO_SYMBOL_NUMBER:
+            if <size_t>frame.output_pointer > search.output_capacity:
+                reserve_output(search, frame.output_pointer)
+            search.output[frame.output_pointer - 1] = frame.output_symbol
+        if frame.idx < 0:
+            note_analysis(search, frame.output_pointer, frame.weight if weighted else 1.0)
+            if <cython.longlong>search.result_count >= max_results:
+                search.truncated = top > 0
+                break
+            continue
+
+        idx = frame.idx
+        is_transition = idx >= TRANSITION_TARGET_TABLE_START
+        index = idx - TRANSITION_TARGET_TABLE_START if is_transition else idx
+
+        # consuming transitions, or the final state at the end of input;
+        # pushed first so that they are visited after the epsilon ones
+        symbol = search.input[frame.input_pointer]
+        if symbol == NO_SYMBOL_NUMBER:
+            if is_transition:
+                if tables.transition_size > index and transition_is_final(tables, index):
+                    push(search, &top, -1, frame.input_pointer, frame.output_pointer,
+                         frame.weight + transition_weight(tables, index) if weighted else frame.weight,
+                         frame.features, NO_SYMBOL_NUMBER, 0, pool_top)
+            elif index_input(tables, index) == NO_SYMBOL_NUMBER and index_target(tables, index) != NO_TABLE_INDEX:
+                push(search, &top, -1, frame.input_pointer, frame.output_pointer,
+                     frame.weight + <float>index_target(tables, index) if weighted else frame.weight,
+                     frame.features, NO_SYMBOL_NUMBER, 0, pool_top)
+        else:
+            if is_transition:
+                start = index + 1
+            elif index_input(tables, index + 1 + symbol) == symbol:
+                start = pivot(index_target(tables, index + 1 + symbol))
+            else:
+                start = tables.transition_size
+            end = start
+            while end < tables.transition_size and transition_input(tables, end) == symbol:
+                end += 1
+            i = end - 1
+            while i >= start:
+                push(search, &top, transition_target(tables, i), frame.input_pointer + 1, frame.output_pointer + 1,
+                     frame.weight + transition_weight(tables, i) if weighted else frame.weight,
+                     frame.features, transition_output(tables, i), 0, pool_top)
+                i -= 1
+
+        # epsilon and flag diacritic transitions, all at once from the
+        # epsilon closure of the state when it is memoized
+        if frame.depth < 0:
+            continue
+        if is_transition:
+            i = index + 1
+        elif index_input(tables, index + 1) == 0:
+            i = pivot(index_target(tables, index + 1))
+        else:
+            continue
+        first = top
+        input_symbol = transition_input(tables, i)
+        if frame.depth == 0 and closures.limit and (input_symbol == 0 or is_flag(tables, input_symbol)):
+            closure = &closures.closures[epsilon_closure(tables, search, idx, frame.features)]
+            if closure.memoized:
+                for n in range(closure.first, closure.end):
+                    state = &closures.states[n]
+                    weight = frame.weight
+                    if weighted:
+                        for k in range(state.path_length):
+                            weight += closures.weights[state.path + k]
+                    if state.features == closure.features:
+                        features = frame.features
+                    else:
+                        reserve(<void**>&search.features, &search.features_capacity,
+                                pool_top + tables.feature_count, sizeof(int))
+                        memcpy(&search.features[pool_top], &closures.features[state.features],
+                               tables.feature_count * sizeof(int))
+                        features = pool_top
+                        pool_top += tables.feature_count
+                    push(search, &top, state.idx, frame.input_pointer, frame.output_pointer + state.path_length,
+                         weight, features, NO_SYMBOL_NUMBER, -1, pool_top)
+                    search.frames[top - 1].path = state.path
+                    search.frames[top - 1].path_length = state.path_length
+                if closure.cut:
+                    search.truncated = True
+            else:
+                closure = NULL
+        else:
+            closure = NULL
+
+        if closure == NULL:
+            while True:
+                input_symbol = transition_input(tables, i)
+                if is_flag(tables, input_symbol):
+                    features = apply_flag(tables, &search.features, &search.features_capacity, &pool_top,
+                                          &tables.flags[3 * input_symbol], frame.features)
+                    if features < 0:
+                        i += 1
+                        continue
+                elif input_symbol == 0:
+                    features = frame.features
+                else:
+                    break
+                if frame.depth >= max_depth:
+                    search.truncated = True
+                    break
+                push(search, &top, transition_target(tables, i), frame.input_pointer, frame.output_pointer + 1,
+                     frame.weight + transition_weight(tables, i) if weighted else frame.weight,
+                     features, transition_output(tables, i), frame.depth + 1, pool_top)
+                i += 1
+            reverse_frames(search.frames, first, top)
+        # the features of the frames pushed here stay in the pool until the
+        # last of them is popped
+        for n in range(first, top):
+            search.frames[n].pool_mark = pool_top
+    return 0
@@ -9,7 +9,16 @@ cdef class Transducer:
     cdef public TransducerAlphabet alphabet
     cdef public bint is_weighted
     cdef public dict operations
+    cdef public dict flag_opcodes
     cdef public dict symbol_map
+    cdef public dict single_symbols
+    cdef public dict tokenization_cache
+    cdef public int tokenization_cache_size
+    cdef public dict epsilon_closures
+    cdef public int epsilon_closure_cache_size
+    cdef public object kernel_tables
+    cdef public int output_buffer_size
     cdef public IndexTable index_table
     cdef public TransitionTable transition_table
-    cpdef void construct_symbol_map(self)
\ No newline at end of file
+    cpdef void construct_symbol_map(self)
+    cpdef tuple tokenize(self, str string)
\ No newline at end of file
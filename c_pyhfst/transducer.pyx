@@ -2,45 +2,129 @@
 from .common cimport *
 from .transducer_header cimport TransducerHeader
 from .transducer_alphabet cimport TransducerAlphabet
+from .flag_diacritic_operation cimport compile_flag
+import mmap
 
 cdef class Transducer:
     """
     A class representing a finite state transducer for morphological analysis.
     """
 
-    def __init__(self, file, TransducerHeader h, TransducerAlphabet a, bint is_weighted=True):
+    def __init__(self, file, TransducerHeader h, TransducerAlphabet a, bint is_weighted=True,
+                 IndexTable index_table=None, TransitionTable transition_table=None):
         """
         Initializes the Transducer instance.
 
-        :param file: A file containing the transducer data.
+        :param file: A file containing the transducer data. If it is a memory-mapped file, the tables are read in place.
         :param h: A TransducerHeader instance representing the header of the transducer.
         :param a: A TransducerAlphabet instance representing the alphabet of the transducer.
         :param is_weighted: A boolean indicating if the transducer is weighted. Defaults to True.
+        :param index_table: The index table if it is already loaded, it is not read from the file then.
+        :param transition_table: The transition table if it is already loaded, it is not read from the file then.
         """
         self.header = h
         self.alphabet = a
         self.is_weighted = is_weighted
         self.operations = self.alphabet.operations
+        # flag diacritics pre-decoded into (opcode, feature, value) tuples
+        self.flag_opcodes = {
+            symbol: compile_flag(flag) for symbol, flag in self.operations.items()
+        }
+        # initial length of the output buffer of a State, raised by the
+        # Analyzer to the longest output this transducer has produced
+        self.output_buffer_size = OUTPUT_BUFFER_SIZE
         self.symbol_map = {}
+        self.single_symbols = {}
         self.construct_symbol_map()
-        self.index_table = IndexTable(file, h.get_index_table_size())
-        self.transition_table = TransitionTable(
-            file, h.get_target_table_size(), is_weighted=self.is_weighted)
+        # tokenizations of recent inputs, emptied when it reaches its size
+        self.tokenization_cache = {}
+        self.tokenization_cache_size = TOKENIZATION_CACHE_SIZE
+        # epsilon closures of states, see Analyzer.epsilon_closure, emptied
+        # when it reaches its size; not kept for transducers without epsilons
+        self.epsilon_closures = {}
+        self.epsilon_closure_cache_size = (
+            EPSILON_CLOSURE_CACHE_SIZE if h.has_input_epsilon_transitions or self.flag_opcodes else 0
+        )
+        # the tables as C pointers for the traversal without the GIL, made
+        # by the first Analyzer that needs them
+        self.kernel_tables = None
+        if index_table is not None and transition_table is not None:
+            self.index_table = index_table
+            self.transition_table = transition_table
+        elif isinstance(file, mmap.mmap):
+            self.index_table = MappedIndexTable(file, h.get_index_table_size())
+            self.transition_table = MappedTransitionTable(
+                file, h.get_target_table_size(), is_weighted=self.is_weighted)
+        else:
+            self.index_table = IndexTable(file, h.get_index_table_size())
+            self.transition_table = TransitionTable(
+                file, h.get_target_table_size(), is_weighted=self.is_weighted)
 
     cpdef void construct_symbol_map(self):
+        """
+        Builds the trie of input symbols used to tokenize input strings, and
+        the table of single-character symbols that are not the prefix of a
+        longer symbol, which are matched without walking the trie.
+        """
+        cdef dict _o
         for i in range(self.header.get_input_symbol_count()):
             _w = self.alphabet.keyTable[i]
-            if len(_w) <= 1:
-                self.symbol_map[_w] = {None: i}
-            else:
-                if _w[0] not in self.symbol_map:
-                    self.symbol_map[_w[0]] = {}
-                _o = self.symbol_map[_w[0]]
-                for j in range(1, len(_w)):
-                    _c = _w[j]
-                    if _c not in _o:
-                        _o[_c] = {}
-                    _o = _o[_c]
-                if None in _o:
-                    raise ValueError("Duplicate symbol in symbol map")
-                _o[None] = i
\ No newline at end of file
+            if not _w:
+                continue
+            _o = self.symbol_map
+            for _c in _w:
+                if _c not in _o:
+                    _o[_c] = {}
+                _o = _o[_c]
+            if None in _o:
+                raise ValueError("Duplicate symbol in symbol map")
+            _o[None] = i
+        for _c, _o in self.symbol_map.items():
+            if len(_o) == 1 and None in _o:
+                self.single_symbols[_c] = _o[None]
+
+    cpdef tuple tokenize(self, str string):
+        """
+        Splits the input string into input symbols, preferring the longest
+        symbol at every position. A character that does not start any symbol
+        becomes NO_SYMBOL_NUMBER. The result ends with NO_SYMBOL_NUMBER.
+
+        :param string: The input string to tokenize.
+        :return: The symbol numbers of the input string.
+        """
+        cdef object symbols = self.tokenization_cache.get(string)
+        if symbols is not None:
+            return symbols
+        cdef dict single_symbols = self.single_symbols
+        cdef dict symbol_map = self.symbol_map
+        cdef list output = []
+        cdef Py_ssize_t length = len(string)
+        cdef Py_ssize_t i = 0, j, end
+        cdef object symbol
+        cdef dict node
+        while i < length:
+            symbol = single_symbols.get(string[i])
+            if symbol is not None:
+                output.append(symbol)
+                i += 1
+                continue
+            symbol = NO_SYMBOL_NUMBER
+            end = i + 1
+            node = symbol_map.get(string[i])
+            j = i
+            while node is not None:
+                j += 1
+                if None in node:
+                    symbol = node[None]
+                    end = j
+                if j == length:
+                    break
+                node = node.get(string[j])
+            output.append(symbol)
+            i = end
+        output.append(NO_SYMBOL_NUMBER)
+        symbols = tuple(output)
+        if len(self.tokenization_cache) >= self.tokenization_cache_size:
+            self.tokenization_cache.clear()
+        self.tokenization_cache[string] = symbols
+        return symbols
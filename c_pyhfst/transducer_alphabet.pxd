@@ -1,6 +1,7 @@
 # cython: language_level=3
 cdef class TransducerAlphabet:
     cdef public list keyTable
+    cdef public list symbols
     cdef public dict operations
     cdef public dict feature_bucket
     cdef public dict value_bucket
@@ -4,14 +4,17 @@ from .flag_diacritic_operation cimport FlagDiacriticOperation
 import io
 
 cdef class TransducerAlphabet:
-    def __init__(self, charstream: io.BytesIO, int number_of_symbols):
+    def __init__(self, charstream: io.BytesIO, int number_of_symbols, list symbols=None):
         """
         Initializes the TransducerAlphabet instance.
 
         :param filename: The file containing the alphabet data.
         :param number_of_symbols: The number of symbols in the alphabet.
+        :param symbols: The symbol strings if they are already decoded, the stream is not read then.
         """
         self.keyTable = []
+        # the symbol strings as stored in the transducer, flag diacritics included
+        self.symbols = []
         self.operations = {}
         feature_bucket = {}
         value_bucket = {}
@@ -26,19 +29,23 @@ cdef class TransducerAlphabet:
         cdef FlagDiacriticOperator op
         cdef str vals, feats, ops
 
-        for _ in range(number_of_symbols):
-            charindex = 0
-            if len(chars) == charindex:
-                chars.append(charstream.read(1)[0])
+        for index in range(number_of_symbols):
+            if symbols is not None:
+                ustring = symbols[index]
             else:
-                chars[charindex] = charstream.read(1)[0]
-            while chars[charindex] != 0:
-                charindex += 1
+                charindex = 0
                 if len(chars) == charindex:
                     chars.append(charstream.read(1)[0])
                 else:
                     chars[charindex] = charstream.read(1)[0]
-            ustring = chars[:charindex].decode("utf-8")
+                while chars[charindex] != 0:
+                    charindex += 1
+                    if len(chars) == charindex:
+                        chars.append(charstream.read(1)[0])
+                    else:
+                        chars[charindex] = charstream.read(1)[0]
+                ustring = chars[:charindex].decode("utf-8")
+            self.symbols.append(ustring)
 
             if (
                 len(ustring) > 5
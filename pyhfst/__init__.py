@@ -1,6 +1,12 @@
-from typing import Union, List, Tuple
+from typing import Union, List, Tuple, Iterable, Iterator, Dict, Optional
 from pathlib import Path
 from io import BufferedReader
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import mmap
+import sys
+import threading
+import time
 
 
 try:
@@ -14,15 +20,49 @@ except:
     from .transducer_alphabet import TransducerAlphabet
     from .analyzer import Analyzer
 
-def get_transducer(transducer_path: Union[str, Path]) -> Transducer:
+from .cache import FormattedResult, LookupCache
+from .persistent_cache import PersistentCache
+from .compact import CompactAnalyses, symbol_numbers
+from .precomputed import PrecomputedAnalyses, precompute, precomputed_path, read_precomputed
+from .compiled import compile_transducer, read_compiled
+
+class Analyses(list):
+    """
+    The analyses returned by Hfst.lookup: a list of [analysis, weight] pairs
+    that also tells whether the lookup stopped at a limit, in which case
+    some analyses may be missing.
+    """
+
+    truncated = False
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[str, float]], truncated: bool = False) -> "Analyses":
+        """
+        Creates an Analyses list.
+
+        :param pairs: The (analysis, weight) pairs, copied into new lists.
+        :param truncated: Whether the lookup stopped at a limit.
+        :return: The Analyses list.
+        """
+        analyses = cls([analysis, weight] for analysis, weight in pairs)
+        if truncated:
+            analyses.truncated = True
+        return analyses
+
+def get_transducer(transducer_path: Union[str, Path], memory_map: bool = False) -> Transducer:
     """
     Creates a Transducer instance from the given transducer file path.
 
     :param transducer_path: The path to the transducer file.
+    :param memory_map: Whether to memory-map the file and read the tables in place instead of decoding them.
+        The mapping is read-only, so processes forked after loading share a single copy of the tables.
     :return: A Transducer instance.
     """
     with open(transducer_path, "rb") as transducer_file:
-        char_stream = BufferedReader(transducer_file)
+        if memory_map and sys.byteorder == "little":
+            char_stream = mmap.mmap(transducer_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            char_stream = BufferedReader(transducer_file)
         transducer_header = TransducerHeader(char_stream)
         transducer_alphabet = TransducerAlphabet(
             char_stream, transducer_header.get_symbol_count()
@@ -31,15 +71,33 @@ def get_transducer(transducer_path: Union[str, Path]) -> Transducer:
 
 
 class HfstInputStream(object):
-    def __init__(self, path: Union[str, Path], cache=True) -> None:
+    def __init__(
+        self,
+        path: Union[str, Path],
+        cache: Union[bool, LookupCache, PersistentCache] = True,
+        memory_map=False,
+        compiled=True,
+        compact: bool = False,
+        precomputed: Union[bool, str, Path] = True,
+    ) -> None:
         """
         Initialize an HfstInputStream object.
 
         :param path: The path to the transducer file.
-        :param cache: Whether to cache the results.
+        :param cache: Whether to cache the results, or the LookupCache or PersistentCache to cache them in.
+        :param memory_map: Whether to memory-map the transducer file instead of decoding its tables.
+        :param compiled: Whether to load the compiled file of the transducer when there is an up-to-date one,
+            see compile_transducer.
+        :param compact: Whether to keep the cached analyses in the compact representation, see Hfst.
+        :param precomputed: Whether to load the precomputed analyses of the transducer when there are up-to-date ones,
+            see precompute, or the path of a table of precomputed analyses to load.
         """
         self.path = path
         self.cache = cache
+        self.memory_map = memory_map
+        self.compiled = compiled
+        self.compact = compact
+        self.precomputed = precomputed
 
     def read(self) -> 'Hfst':
         """
@@ -47,34 +105,638 @@ class HfstInputStream(object):
 
         :return: An Hfst object initialized with the transducer read from the file.
         """
-        tr = get_transducer(self.path)
-        return Hfst(tr, cache=self.cache)
+        tr = read_compiled(self.path) if self.compiled else None
+        if tr is None:
+            tr = get_transducer(self.path, memory_map=self.memory_map)
+        precomputed = None
+        if self.precomputed:
+            table = precomputed_path(self.path) if self.precomputed is True else self.precomputed
+            precomputed = read_precomputed(table, transducer=self.path)
+        return Hfst(tr, cache=self.cache, compact=self.compact, precomputed=precomputed)
 
 
 class Hfst(object):
-    def __init__(self, tr: Transducer, cache=True) -> None:
+    def __init__(
+        self,
+        tr: Transducer,
+        cache: Union[bool, LookupCache, PersistentCache] = True,
+        max_results: Optional[int] = None,
+        max_steps: Optional[int] = None,
+        max_epsilon_depth: Optional[int] = None,
+        timeout: Optional[float] = None,
+        compact: bool = False,
+        precomputed: Optional[PrecomputedAnalyses] = None,
+    ) -> None:
         """
         Initialize an Hfst object with a given transducer.
 
+        The limits bound the work done for a single input, which matters for
+        transducers with input epsilon cycles, where the number of paths can
+        explode. A lookup that reaches a limit returns the analyses found so
+        far, marked as truncated. They can be changed later through the
+        attributes of the same names, and overridden per call.
+
+        In compact mode the cache keeps the analyses of an input as the
+        symbol numbers and weights of its paths, packed into byte strings,
+        and only builds the strings when the input is looked up again. This
+        takes a fraction of the memory of the formatted analyses, at the
+        cost of decoding them on every cache hit.
+
+        Tokens in the table of precomputed analyses are served from it by
+        lookup and lookup_many, before the cache is consulted, and are never
+        cached.
+
         :param tr: The transducer object.
-        :param cache: Whether to cache the results.
+        :param cache: Whether to cache the results, or the LookupCache or PersistentCache to cache them in.
+            True uses an unbounded cache; pass e.g. LookupCache(max_entries=100000) to bound it.
+        :param max_results: The maximum number of analyses of an input, or None for no limit.
+        :param max_steps: The maximum number of transducer states visited for an input, or None for no limit.
+        :param max_epsilon_depth: The maximum number of epsilon transitions in a row on a path, or None for no limit.
+            Longer paths are abandoned.
+        :param timeout: The maximum time spent on an input in seconds, or None for no limit.
+        :param compact: Whether to keep the cached analyses in the compact representation.
+            A PersistentCache stores formatted analyses and cannot be used in compact mode.
+        :param precomputed: The precomputed analyses of frequent tokens, see precompute.
         """
+        if compact and isinstance(cache, PersistentCache):
+            raise ValueError("A PersistentCache cannot hold compact analyses")
         self.tr = tr
-        self.cache = cache
-        self.mem = {}
+        self.max_results = max_results
+        self.max_steps = max_steps
+        self.max_epsilon_depth = max_epsilon_depth
+        self.timeout = timeout
+        if isinstance(cache, bool):
+            self.cache = cache
+            self.mem = LookupCache()
+        else:
+            self.cache = True
+            self.mem = cache
+        self.compact = compact
+        self.symbol_numbers = symbol_numbers(tr.alphabet.keyTable) if compact else None
+        self.precomputed = precomputed
+        # the Analyzer of each thread, reset between inputs
+        self.context = threading.local()
+        # analyses skipped because the input contained an unknown symbol
+        self.rejected = 0
+        # analyses cut short by a limit
+        self.truncated = 0
+        self.lock = threading.Lock()
+        # the threads of lookup_many, started by the first call that asks for them
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.executor_threads = 0
 
+    def get_analyzer(self, string: str) -> Analyzer:
+        """
+        Return the Analyzer of the calling thread, prepared for the input string.
+
+        The Analyzer and its buffers are created on the first call in each
+        thread and reused afterwards. Its results are only valid until the
+        next call from the same thread.
+
+        :param string: The input string to analyze.
+        :return: An Analyzer ready to analyze the string.
+        """
+        analyzer = getattr(self.context, "analyzer", None)
+        if analyzer is None:
+            analyzer = self.context.analyzer = Analyzer(self.tr, string)
+        else:
+            analyzer.reset(string)
+        return analyzer
+
+    def analyze(
+        self,
+        string: str,
+        n_best: Optional[int] = None,
+        max_weight: Optional[float] = None,
+        beam: Optional[float] = None,
+        max_results: Optional[int] = None,
+        max_steps: Optional[int] = None,
+        max_epsilon_depth: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> FormattedResult:
+        """
+        Analyze the input string without going through the cache.
+
+        Inputs that contain a character that starts no input symbol are
+        rejected up front, they have no analyses.
 
-    def lookup(self, string: str) -> List[Tuple[str, float]]:
+        :param string: The input string to analyze.
+        :param n_best: The maximum number of analyses to return, see lookup.
+        :param max_weight: The maximum weight of an analysis, see lookup.
+        :param beam: The maximum difference in weight from the lightest analysis, see lookup.
+        :param max_results: Overrides the limit of the same name set on this object.
+        :param max_steps: Overrides the limit of the same name set on this object.
+        :param max_epsilon_depth: Overrides the limit of the same name set on this object.
+        :param timeout: Overrides the limit of the same name set on this object.
+        :return: A tuple of (analysis, weight) pairs.
+        """
+        return self.analyze_within_limits(
+            string, n_best, max_weight, beam, max_results, max_steps, max_epsilon_depth, timeout
+        )[0]
+
+    def analyze_within_limits(
+        self,
+        string: str,
+        n_best: Optional[int] = None,
+        max_weight: Optional[float] = None,
+        beam: Optional[float] = None,
+        max_results: Optional[int] = None,
+        max_steps: Optional[int] = None,
+        max_epsilon_depth: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> Tuple[FormattedResult, bool]:
+        """
+        Analyze the input string without going through the cache, and tell whether a limit was reached.
+
+        :param string: The input string to analyze.
+        :return: A tuple of (analysis, weight) pairs, and True if the analysis stopped at a limit.
+            The other parameters are those of analyze.
+        """
+        results, truncated = self.analyze_results(
+            string, n_best, max_weight, beam, max_results, max_steps, max_epsilon_depth, timeout
+        )
+        return self.format_results(results), truncated
+
+    def analyze_results(
+        self,
+        string: str,
+        n_best: Optional[int] = None,
+        max_weight: Optional[float] = None,
+        beam: Optional[float] = None,
+        max_results: Optional[int] = None,
+        max_steps: Optional[int] = None,
+        max_epsilon_depth: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> Tuple[list, bool]:
+        """
+        Analyze the input string and return the Result objects of the analyzer,
+        which are only valid until the next analysis in the calling thread.
+
+        :param string: The input string to analyze.
+        :return: The Result objects, and True if the analysis stopped at a limit.
+            The other parameters are those of analyze.
+        """
+        if n_best is not None and n_best < 1:
+            raise ValueError(f"n_best must be at least 1, got {n_best}")
+        if beam is not None and beam < 0:
+            raise ValueError(f"beam must not be negative, got {beam}")
+        analyzer = self.get_analyzer(string)
+        if analyzer.rejects_input():
+            with self.lock:
+                self.rejected += 1
+            return [], False
+        self.apply_limits(analyzer, max_results, max_steps, max_epsilon_depth, timeout)
+        results = analyzer.analyze(n_best, max_weight, beam)
+        if analyzer.truncated:
+            with self.lock:
+                self.truncated += 1
+        return results, analyzer.truncated
+
+    def apply_limits(
+        self,
+        analyzer: Analyzer,
+        max_results: Optional[int] = None,
+        max_steps: Optional[int] = None,
+        max_epsilon_depth: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """
+        Set the limits of this object on an Analyzer, overridden by those given.
+
+        :param analyzer: The Analyzer to set the limits on.
+        :param max_results: Overrides the limit of the same name set on this object.
+        :param max_steps: Overrides the limit of the same name set on this object.
+        :param max_epsilon_depth: Overrides the limit of the same name set on this object.
+        :param timeout: Overrides the limit of the same name set on this object, counted from now.
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        analyzer.set_limits(
+            max_results if max_results is not None else self.max_results,
+            max_steps if max_steps is not None else self.max_steps,
+            max_epsilon_depth if max_epsilon_depth is not None else self.max_epsilon_depth,
+            time.monotonic() + timeout if timeout is not None else None,
+        )
+
+    def cache_entry(
+        self, string: str, limits: Tuple[Optional[int], Optional[int], Optional[int], Optional[float]]
+    ) -> Tuple[Union[FormattedResult, CompactAnalyses], bool]:
+        """
+        Analyze the input string into the form kept in the cache.
+
+        :param string: The input string to analyze.
+        :param limits: The max_results, max_steps, max_epsilon_depth and timeout of the lookup.
+        :return: The formatted analyses, or the packed ones in compact mode,
+            and True if the analysis stopped at a limit.
+        """
+        results, truncated = self.analyze_results(string, None, None, None, *limits)
+        return self.pack(results), truncated
+
+    def pack(self, results: list) -> Union[FormattedResult, CompactAnalyses]:
+        """
+        Turn the Result objects of an analysis into a cache entry.
+
+        :param results: The Result objects returned by Analyzer.analyze.
+        :return: The formatted analyses, or the packed ones in compact mode.
+        """
+        if self.compact:
+            return CompactAnalyses.from_results(results, self.symbol_numbers, self.tr.is_weighted)
+        return self.format_results(results)
+
+    def from_cache_entry(self, entry: Union[FormattedResult, CompactAnalyses]) -> FormattedResult:
+        """
+        Turn a cache entry back into (analysis, weight) pairs.
+
+        :param entry: The entry, as returned by cache_entry.
+        :return: A tuple of (analysis, weight) pairs.
+        """
+        if self.compact:
+            return tuple(entry.decode(self.tr.alphabet.keyTable))
+        return entry
+
+    def stored_within_limits(
+        self, result: FormattedResult, max_results: Optional[int] = None
+    ) -> Tuple[FormattedResult, bool]:
+        """
+        Apply max_results to analyses from the precomputed table or the cache.
+
+        Stored analyses are always complete, and in the order the traversal
+        finds them, so the first max_results of them are what a limited
+        traversal would return. The other limits bound the work of a
+        traversal and do not apply to them.
+
+        :param result: The stored (analysis, weight) pairs.
+        :param max_results: Overrides the limit of the same name set on this object.
+        :return: The pairs within the limit, and True if some were left out.
+        """
+        max_results = max_results if max_results is not None else self.max_results
+        if max_results is None or len(result) <= max_results:
+            return result, False
+        with self.lock:
+            self.truncated += 1
+        return result[:max_results], True
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the lookup counters.
+
+        Rejected inputs are counted when they are analysed, so a rejected
+        input served from the cache counts as a cache hit only.
+
+        :return: The counters of the cache, the number of inputs rejected without traversing the transducer,
+            and the number of analyses that stopped at a limit.
+        """
+        stats = self.mem.stats()
+        with self.lock:
+            stats["rejected"] = self.rejected
+            stats["truncated"] = self.truncated
+        return stats
+
+    @staticmethod
+    def format_results(results: list) -> Tuple[Tuple[str, float], ...]:
+        """
+        Turn the Result objects of an analysis into (analysis, weight) pairs.
+
+        :param results: The Result objects returned by Analyzer.analyze.
+        :return: A tuple of (analysis, weight) pairs.
+        """
+        return tuple(("".join(_r.get_symbols()), _r.get_weight()) for _r in results)
+
+    def lookup(
+        self,
+        string: str,
+        n_best: Optional[int] = None,
+        max_weight: Optional[float] = None,
+        beam: Optional[float] = None,
+        max_results: Optional[int] = None,
+        max_steps: Optional[int] = None,
+        max_epsilon_depth: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> Analyses:
         """
         Perform lookup on the input string and return the analyses.
 
+        With n_best, max_weight or beam the transducer is searched lightest
+        path first and paths are abandoned as soon as they fall outside the
+        limits, so only part of the analyses of a highly ambiguous input are
+        ever built. The analyses are then sorted by weight, and they are not
+        cached. The search assumes that the transducer has no negative weights.
+
+        Analyses that stopped at one of the limits of this object, or at one
+        given here, are marked as truncated and not cached. Analyses from the
+        precomputed table or the cache are cut to max_results the same way.
+
         :param string: The input string to analyze.
+        :param n_best: The maximum number of analyses to return, the lightest ones.
+        :param max_weight: The maximum weight of an analysis.
+        :param beam: The maximum difference in weight between an analysis and the lightest one.
+        :param max_results: Overrides the limit of the same name set on this object.
+        :param max_steps: Overrides the limit of the same name set on this object.
+        :param max_epsilon_depth: Overrides the limit of the same name set on this object.
+        :param timeout: Overrides the limit of the same name set on this object.
         :return: A list of tuples, where each sublist contains the string representation of the result and its weight.
         """
+        limits = (max_results, max_steps, max_epsilon_depth, timeout)
+        if n_best is not None or max_weight is not None or beam is not None:
+            return Analyses.from_pairs(
+                *self.analyze_within_limits(string, n_best, max_weight, beam, *limits)
+            )
+        result = self.precomputed.get(string) if self.precomputed is not None else None
+        if result is not None:
+            return Analyses.from_pairs(*self.stored_within_limits(result, max_results))
         if self.cache:
-            if string not in self.mem:
-                self.mem[string] = Analyzer(self.tr, string).analyze()
-            result = self.mem[string]
+            entry = self.mem.get(string)
+            if entry is not None:
+                return Analyses.from_pairs(*self.stored_within_limits(self.from_cache_entry(entry), max_results))
+            entry, truncated = self.cache_entry(string, limits)
+            if not truncated:
+                self.mem.put(string, entry)
+            result = self.from_cache_entry(entry)
         else:
-            result = Analyzer(self.tr, string).analyze()
-        return [["".join(_r.get_symbols()), _r.get_weight()] for _r in result]
+            result, truncated = self.analyze_within_limits(string, None, None, None, *limits)
+        return Analyses.from_pairs(result, truncated)
+
+    def is_known(
+        self,
+        string: str,
+        max_steps: Optional[int] = None,
+        max_epsilon_depth: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> bool:
+        """
+        Tell whether the input string has at least one analysis.
+
+        The transducer is only walked up to the first analysis, so this costs
+        the same for highly ambiguous inputs as for unambiguous ones. Answers
+        come from the precomputed analyses and the cache when they hold the
+        input, and are not cached themselves. An input whose search stopped at
+        a limit before an analysis was found counts as unknown.
+
+        :param string: The input string.
+        :param max_steps: Overrides the limit of the same name set on this object.
+        :param max_epsilon_depth: Overrides the limit of the same name set on this object.
+        :param timeout: Overrides the limit of the same name set on this object.
+        :return: True if the input string has an analysis.
+        """
+        if self.precomputed is not None:
+            result = self.precomputed.get(string)
+            if result is not None:
+                return len(result) > 0
+        if self.cache and string in self.mem:
+            entry = self.mem.get(string)
+            if entry is not None:
+                return len(entry) > 0
+        analyzer = self.get_analyzer(string)
+        if analyzer.rejects_input():
+            with self.lock:
+                self.rejected += 1
+            return False
+        self.apply_limits(analyzer, None, max_steps, max_epsilon_depth, timeout)
+        known = len(analyzer.next_analyses(1)) > 0
+        if analyzer.truncated and not known:
+            with self.lock:
+                self.truncated += 1
+        return known
+
+    def lookup_iter(
+        self,
+        string: str,
+        max_results: Optional[int] = None,
+        max_steps: Optional[int] = None,
+        max_epsilon_depth: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> Iterator[Tuple[str, float]]:
+        """
+        Perform lookup on the input string and yield the analyses as the traversal finds them.
+
+        The transducer is walked only as far as the analyses taken from the
+        iterator, in the same order as lookup returns them. Each iterator has
+        an Analyzer of its own, so several can be consumed side by side.
+        Analyses from the precomputed table or the cache are yielded from
+        there; those of an iterator consumed to the end are cached, unless a
+        limit was reached. Truncation is only counted in stats, since an
+        iterator cannot be marked.
+
+        :param string: The input string to analyze.
+        :param max_results: Overrides the limit of the same name set on this object.
+        :param max_steps: Overrides the limit of the same name set on this object.
+        :param max_epsilon_depth: Overrides the limit of the same name set on this object.
+        :param timeout: Overrides the limit of the same name set on this object. It bounds the time spent finding
+            each analysis, not the life of the iterator.
+        :return: An iterator of (analysis, weight) pairs.
+        """
+        result = self.precomputed.get(string) if self.precomputed is not None else None
+        if result is None and self.cache and string in self.mem:
+            entry = self.mem.get(string)
+            result = self.from_cache_entry(entry) if entry is not None else None
+        if result is not None:
+            yield from self.stored_within_limits(result, max_results)[0]
+            return
+        analyzer = Analyzer(self.tr, string)
+        if analyzer.rejects_input():
+            with self.lock:
+                self.rejected += 1
+            if self.cache:
+                self.mem.put(string, self.pack([]))
+            return
+        self.apply_limits(analyzer, max_results, max_steps, max_epsilon_depth, None)
+        timeout = timeout if timeout is not None else self.timeout
+        found = 0
+        while True:
+            if timeout is not None:
+                analyzer.deadline = time.monotonic() + timeout
+            results = analyzer.next_analyses(1)
+            if len(results) == found:
+                break
+            for result in results[found:]:
+                yield "".join(result.get_symbols()), result.get_weight()
+            found = len(results)
+        if analyzer.truncated:
+            with self.lock:
+                self.truncated += 1
+        elif self.cache:
+            self.mem.put(string, self.pack(results))
+
+    def lookup_many(
+        self,
+        tokens: Iterable[str],
+        max_results: Optional[int] = None,
+        max_steps: Optional[int] = None,
+        max_epsilon_depth: Optional[int] = None,
+        timeout: Optional[float] = None,
+        shared_prefixes: bool = False,
+        threads: int = 1,
+    ) -> List[Analyses]:
+        """
+        Perform lookup on a batch of input strings.
+
+        Each distinct token is looked up once: cached tokens are served from
+        the cache and the rest are analysed with the Analyzer of the calling
+        thread. The limits apply to each token, as in lookup.
+
+        With several threads, the tokens that are not cached are split
+        between a pool of threads kept by this object, each with an Analyzer
+        of its own, and cached by the calling thread. The Cython backend
+        walks the transducer without the GIL, so the threads run on as many
+        cores; with the pure Python backend they take turns and gain nothing.
+
+        With shared_prefixes, the tokens that are not cached are analysed
+        together in one walk of the transducer, which follows each common
+        prefix once for all the tokens that start with it, see
+        Analyzer.analyze_batch. This pays off for lexicons and sorted word
+        lists, where neighbouring words share long prefixes. The step and
+        time limits cannot be shared between the tokens of a walk, so when
+        either is set the tokens are analysed one by one.
+
+        :param tokens: The input strings to analyze.
+        :param max_results: Overrides the limit of the same name set on this object.
+        :param max_steps: Overrides the limit of the same name set on this object.
+        :param max_epsilon_depth: Overrides the limit of the same name set on this object.
+        :param timeout: Overrides the limit of the same name set on this object.
+        :param shared_prefixes: Whether to analyse the tokens in one walk of the transducer.
+        :param threads: The number of threads to analyse the tokens in. Ignored with shared_prefixes.
+        :return: The analyses of every token, in the same order as the input.
+        """
+        if threads < 1:
+            raise ValueError(f"threads must be at least 1, got {threads}")
+        limits = (max_results, max_steps, max_epsilon_depth, timeout)
+        shared_prefixes = shared_prefixes and (
+            (max_steps if max_steps is not None else self.max_steps) is None
+            and (timeout if timeout is not None else self.timeout) is None
+        )
+        threaded = threads > 1 and not shared_prefixes
+        tokens = list(tokens)
+        unique: Dict[str, Tuple[FormattedResult, bool]] = {}
+        missing: List[str] = []
+        for token in tokens:
+            if token in unique:
+                continue
+            if self.precomputed is not None:
+                result = self.precomputed.get(token)
+                if result is not None:
+                    unique[token] = self.stored_within_limits(result, max_results)
+                    continue
+            entry = self.mem.get(token) if self.cache else None
+            if entry is not None:
+                unique[token] = self.stored_within_limits(self.from_cache_entry(entry), max_results)
+                continue
+            if shared_prefixes or threaded:
+                unique[token] = None
+                missing.append(token)
+                continue
+            entry, truncated = self.cache_entry(token, limits)
+            if self.cache and not truncated:
+                self.mem.put(token, entry)
+            unique[token] = (self.from_cache_entry(entry), truncated)
+        if missing and threaded:
+            unique.update(zip(missing, self.analyze_threaded(missing, limits, threads)))
+        elif missing:
+            unique.update(zip(missing, self.analyze_batch(missing, max_results, max_epsilon_depth)))
+        return [Analyses.from_pairs(*unique[token]) for token in tokens]
+
+    def get_executor(self, threads: int) -> ThreadPoolExecutor:
+        """
+        Return the thread pool of lookup_many, replaced by a larger one when it has fewer threads than asked for.
+
+        A replaced pool is not shut down, since other threads may still be
+        submitting work to it. Its threads finish that work and exit once
+        the last of those calls drops the pool.
+
+        :param threads: The number of threads needed.
+        :return: A thread pool with at least that many threads.
+        """
+        with self.lock:
+            if self.executor_threads < threads:
+                self.executor = ThreadPoolExecutor(threads, thread_name_prefix="pyhfst")
+                self.executor_threads = threads
+            return self.executor
+
+    def analyze_threaded(
+        self,
+        tokens: List[str],
+        limits: Tuple[Optional[int], Optional[int], Optional[int], Optional[float]],
+        threads: int,
+    ) -> List[Tuple[FormattedResult, bool]]:
+        """
+        Analyze distinct input strings in several threads and cache their analyses.
+
+        The tokens are dealt out to the threads in turn, so that a sorted
+        batch with its expensive tokens side by side is still evenly split.
+
+        :param tokens: The input strings, none of them repeated.
+        :param limits: The max_results, max_steps, max_epsilon_depth and timeout of the lookup.
+        :param threads: The number of threads.
+        :return: The analyses of every token and whether they were truncated, in the same order as the input.
+        """
+        threads = min(threads, len(tokens))
+        chunks = self.get_executor(threads).map(
+            lambda chunk: [self.cache_entry(token, limits) for token in chunk],
+            [tokens[i::threads] for i in range(threads)],
+        )
+        entries: List[Tuple[Union[FormattedResult, CompactAnalyses], bool]] = [None] * len(tokens)
+        for i, chunk in enumerate(chunks):
+            entries[i::threads] = chunk
+        analyses = []
+        for token, (entry, truncated) in zip(tokens, entries):
+            if self.cache and not truncated:
+                self.mem.put(token, entry)
+            analyses.append((self.from_cache_entry(entry), truncated))
+        return analyses
+
+    def analyze_batch(
+        self,
+        tokens: List[str],
+        max_results: Optional[int] = None,
+        max_epsilon_depth: Optional[int] = None,
+    ) -> List[Tuple[FormattedResult, bool]]:
+        """
+        Analyze distinct input strings in one walk of the transducer and cache their analyses.
+
+        :param tokens: The input strings, none of them repeated.
+        :param max_results: Overrides the limit of the same name set on this object, for each token.
+        :param max_epsilon_depth: Overrides the limit of the same name set on this object.
+        :return: The analyses of every token and whether they were truncated, in the same order as the input.
+        """
+        analyzer = self.get_analyzer(tokens[0])
+        analyzer.set_limits(
+            max_results if max_results is not None else self.max_results,
+            None,
+            max_epsilon_depth if max_epsilon_depth is not None else self.max_epsilon_depth,
+        )
+        batch, truncated = analyzer.analyze_batch(tokens)
+        analyses = []
+        rejected = 0
+        for token, results, token_truncated in zip(tokens, batch, truncated):
+            if results is None:
+                rejected += 1
+                results = []
+            entry = self.pack(results)
+            if self.cache and not token_truncated:
+                self.mem.put(token, entry)
+            analyses.append((self.from_cache_entry(entry), token_truncated))
+        with self.lock:
+            self.rejected += rejected
+            self.truncated += sum(truncated)
+        return analyses
+
+    def lookup_many_iter(
+        self, tokens: Iterable[str], batch_size: int = 1000, shared_prefixes: bool = False, threads: int = 1
+    ) -> Iterator[Tuple[str, List[Tuple[str, float]]]]:
+        """
+        Perform lookup on a stream of input strings, batch by batch.
+
+        :param tokens: The input strings to analyze. Any iterable, it is consumed lazily.
+        :param batch_size: The number of tokens to read and analyze at a time.
+        :param shared_prefixes: Whether to analyse each batch in one walk of the transducer, see lookup_many.
+        :param threads: The number of threads to analyse each batch in, see lookup_many.
+        :return: An iterator of (token, analyses) pairs in the same order as the input.
+        """
+        tokens = iter(tokens)
+        while True:
+            batch = list(islice(tokens, batch_size))
+            if not batch:
+                return
+            yield from zip(batch, self.lookup_many(batch, shared_prefixes=shared_prefixes, threads=threads))
+
+
+from .parallel import ParallelHfst
+from .asynchronous import AsyncHfst
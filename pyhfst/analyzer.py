@@ -1,6 +1,11 @@
+import sys
+from heapq import heappop, heappush
+from time import monotonic
+from typing import Dict
+
 from .common import *
 from .transducer import Transducer
-from .flag_diacritic_operation import FlagDiacriticOperation, FlagDiacriticOperator
+from .flag_diacritic_operation import FLAG_SET, FLAG_REQUIRE, FLAG_DISALLOW
 
 
 class Analyzer:
@@ -8,271 +13,83 @@ class Analyzer:
         self.transducer = transducer
         self.input_str = input_str
         self.state = State(input_str, self.transducer)
+        self.max_results: Optional[int] = None
+        self.max_steps: Optional[int] = None
+        self.max_epsilon_depth: Optional[int] = None
+        self.deadline: Optional[float] = None
+        # whether the last traversal stopped at a limit
+        self.truncated = False
+        # the frames left by a paused traversal, None before it starts
+        self.stack: Optional[list] = None
+        self.steps = 0
 
-    def pivot(self, i: int) -> int:
-        """
-        Computes the pivot for the given index.
-
-        :param i: The index to compute the pivot for.
-        :return: The pivot value.
-        """
-        if i >= TRANSITION_TARGET_TABLE_START:
-            return i - TRANSITION_TARGET_TABLE_START
-        return i
-
-    def try_epsilon_indices(self, index: int) -> None:
-        """
-        Tries epsilon indices for the given index and state.
-
-        :param index: The index to try epsilon indices for.
-        :param state: The current state of the transducer.
-        """
-        if self.transducer.index_table.get_input(index) == 0:
-            self.try_epsilon_transitions(
-                self.pivot(self.transducer.index_table.get_target(index))
-            )
-
-    def try_epsilon_transitions(self, index: int) -> None:
-        """
-        Tries epsilon transitions for the given index and state.
-
-        :param index: The index to try epsilon transitions for.
-        :param state: The current state of the transducer.
-        """
-        while True:
-            input_symbol = self.transducer.transition_table.get_input(index)
-
-            if self.transducer.operations.get(input_symbol):
-                if not self.push_state(self.transducer.operations[input_symbol]):
-                    index += 1
-                    continue
-                self.handle_epsilon_transition(index)
-                index += 1
-                self.state.state_stack.pop()
-                continue
-            elif input_symbol == 0:
-                self.handle_epsilon_transition(index)
-                index += 1
-                continue
-            else:
-                break
-
-    def find_index(self, index: int) -> None:
-        """
-        Finds the index in the transducer for the given index and state.
-
-        :param index: The index to find in the transducer.
-        :param state: The current state of the transducer.
-        """
-        if (
-            self.transducer.index_table.get_input(
-                index + (self.state.input_string[self.state.input_pointer - 1])
-            )
-            == self.state.input_string[self.state.input_pointer - 1]
-        ):
-            self.find_transitions(
-                self.pivot(
-                    self.transducer.index_table.get_target(
-                        index + self.state.input_string[self.state.input_pointer - 1]
-                    )
-                )
-            )
-
-    def handle_epsilon_transition(self, index: int) -> None:
-        """
-        Handles epsilon transitions for the given index and state.
-
-        :param index: The index to handle epsilon transitions for.
-        :param state: The current state of the transducer.
-        """
-        self.update_output_string(self.transducer.transition_table.get_output(index))
-        self.state.output_pointer += 1
-
-        if self.transducer.is_weighted:
-            self.state.current_weight += self.transducer.transition_table.get_weight(
-                index
-            )
-
-        self.get_analyses(self.transducer.transition_table.get_target(index))
-
-        if self.transducer.is_weighted:
-            self.state.current_weight -= self.transducer.transition_table.get_weight(
-                index
-            )
-
-        self.state.output_pointer -= 1
-
-    def find_transitions(self, index: int) -> None:
-        """
-        Finds the transitions in the transducer for the given index and state.
-
-        :param index: The index to find transitions for.
-        :param state: The current state of the transducer.
-        """
-        for idx in range(index, self.transducer.transition_table.size()):
-            input_symbol = self.transducer.transition_table.get_input(idx)
-
-            if input_symbol == NO_SYMBOL_NUMBER:
-                break
-
-            if input_symbol == self.state.input_string[self.state.input_pointer - 1]:
-                self.update_output_string(
-                    self.transducer.transition_table.get_output(idx)
-                )
-                self.state.output_pointer += 1
-
-                if self.transducer.is_weighted:
-                    self.state.current_weight += (
-                        self.transducer.transition_table.get_weight(idx)
-                    )
-
-                self.get_analyses(self.transducer.transition_table.get_target(idx))
-
-                if self.transducer.is_weighted:
-                    self.state.current_weight -= (
-                        self.transducer.transition_table.get_weight(idx)
-                    )
-
-                self.state.output_pointer -= 1
-            else:
-                break
-
-    def get_analyses(self, idx: int) -> None:
-        """
-        Gets the analyses for the given index and state.
-
-        :param idx: The index to get the analyses for.
-        :param state: The current state of the transducer.
-        """
-        index = self.pivot(idx)
-        is_transition = idx >= TRANSITION_TARGET_TABLE_START
-
-        if is_transition:
-            next_v = self.pivot(index) if self.transducer.is_weighted else index
-            self.try_epsilon_transitions(next_v + 1)
-        else:
-            self.try_epsilon_indices(index + 1)
-
-        if self.state.input_string[self.state.input_pointer] == NO_SYMBOL_NUMBER:
-            self.handle_end_of_input_string(index, is_transition)
-            return
-
-        self.state.input_pointer += 1
-
-        if is_transition:
-            self.find_transitions(index + 1)
-        else:
-            self.find_index(index + 1)
-
-        self.state.input_pointer -= 1
-        self.reset_output_pointer()
-
-    def update_output_string(self, output_symbol: int) -> None:
-        """
-        Updates the output string in the state based on the output symbol.
-
-        :param state: The current state of the transducer.
-        :param output_symbol: The output symbol to append or update in the output string.
-        """
-        if self.state.output_pointer == len(self.state.output_string):
-            self.state.output_string.append(output_symbol)
-        else:
-            self.state.output_string[self.state.output_pointer] = output_symbol
-
-    def handle_end_of_input_string(self, index: int, is_transition: bool) -> None:
+    def reset(self, input_str: str) -> None:
         """
-        Handles the end of the input string.
+        Prepares the analyzer for a new input string, reusing its state.
 
-        :param state: The current state of the transducer.
-        :param index: The index being processed.
-        :param is_transition: A boolean indicating whether it's a transition table or an index table.
+        :param input_str: The new input string.
         """
-        self.reset_output_pointer()
-
-        is_final, weight = self.get_final_and_weight(index, is_transition)
-        if is_final:
-            self.update_and_note_analysis(weight)
+        self.input_str = input_str
+        self.state.reset(input_str)
+        self.truncated = False
+        self.stack = None
+        self.steps = 0
 
-    def reset_output_pointer(self) -> None:
+    def set_limits(
+        self,
+        max_results: Optional[int] = None,
+        max_steps: Optional[int] = None,
+        max_epsilon_depth: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> None:
         """
-        Resets the output pointer in the state.
+        Sets the limits of the traversals, None meaning no limit. A traversal
+        that reaches a limit stops, or for max_epsilon_depth abandons the
+        path, and sets truncated.
 
-        :param state: The current state of the transducer.
+        :param max_results: The maximum number of analyses.
+        :param max_steps: The maximum number of states visited.
+        :param max_epsilon_depth: The maximum number of epsilon and flag diacritic transitions in a row on a path.
+        :param deadline: The time.monotonic() time after which the traversal stops.
         """
-        if self.state.output_pointer == len(self.state.output_string):
-            self.state.output_string.append(NO_SYMBOL_NUMBER)
-        else:
-            self.state.output_string[self.state.output_pointer] = NO_SYMBOL_NUMBER
+        self.max_results = max_results
+        self.max_steps = max_steps
+        self.max_epsilon_depth = max_epsilon_depth
+        self.deadline = deadline
 
-    def get_final_and_weight(
-        self, index: int, is_transition: bool
-    ) -> Tuple[bool, float]:
+    def next_checkpoint(self, steps: int) -> int:
         """
-        Gets the final state and weight based on the index and transition flag.
+        Computes the step at which a traversal next checks its step limit and its deadline.
 
-        :param index: The index being processed.
-        :param is_transition: A boolean indicating whether it's a transition table or an index table.
-        :return: A tuple containing a boolean for final state and a float for the weight.
+        :param steps: The number of steps taken so far.
+        :return: The step of the next check.
         """
-        if is_transition:
-            is_final = (
-                self.transducer.transition_table.size() > index
-                and self.transducer.transition_table.is_final(index)
-            )
-            weight = (
-                self.transducer.transition_table.get_weight(index)
-                if self.transducer.is_weighted
-                else 0
-            )
-        else:
-            is_final = self.transducer.index_table.is_final(index)
-            weight = (
-                self.transducer.index_table.get_final_weight(index)
-                if self.transducer.is_weighted
-                else 0
-            )
+        checkpoint = steps + LIMIT_CHECK_INTERVAL if self.deadline is not None else sys.maxsize
+        if self.max_steps is not None:
+            checkpoint = min(checkpoint, self.max_steps + 1)
+        return checkpoint
 
-        return is_final, weight
-
-    def update_and_note_analysis(self, weight: float) -> None:
-        """
-        Updates the state's current weight and notes the analysis.
-
-        :param state: The current state of the transducer.
-        :param weight: The weight to be
+    def limit_reached(self, steps: int) -> bool:
         """
-        if self.transducer.is_weighted:
-            self.state.current_weight += weight
-        self.note_analysis()
-        if self.transducer.is_weighted:
-            self.state.current_weight -= weight
+        Checks the step limit and the deadline.
 
-    def get_symbols(self) -> List[str]:
+        :param steps: The number of steps taken so far.
+        :return: True if the traversal has to stop.
         """
-        Gets the symbols for the given state.
+        return (self.max_steps is not None and steps > self.max_steps) or (
+            self.deadline is not None and monotonic() > self.deadline
+        )
 
-        :param state: The current state of the transducer.
-        :return: A list of symbols.
-        """
-        symbols = [
-            self.transducer.alphabet.keyTable[self.state.output_string[i]]
-            for i in range(len(self.state.output_string))
-            if self.state.output_string[i] != NO_SYMBOL_NUMBER
-        ]
-        return symbols
-
-    def note_analysis(self) -> None:
+    def pivot(self, i: int) -> int:
         """
-        Notes the analysis for the given state.
+        Computes the pivot for the given index.
 
-        :param state: The current state of the transducer.
+        :param i: The index to compute the pivot for.
+        :return: The pivot value.
         """
-        self.state.display_vector.append(
-            Result(
-                self.get_symbols(),
-                self.state.current_weight if self.transducer.is_weighted else 1.0,
-            )
-        )
+        if i >= TRANSITION_TARGET_TABLE_START:
+            return i - TRANSITION_TARGET_TABLE_START
+        return i
 
     def get_alphabet(self) -> List[str]:
         """
@@ -282,74 +99,756 @@ class Analyzer:
         """
         return self.transducer.alphabet.keyTable
 
-    def analyze(self) -> List["Result"]:
+    def rejects_input(self) -> bool:
+        """
+        Checks whether the input string is empty or contains a character that
+        starts no input symbol, in which case it cannot have any analyses.
+
+        :return: True if the input cannot be analysed.
+        """
+        input_string = self.state.input_string
+        return input_string[0] == NO_SYMBOL_NUMBER or NO_SYMBOL_NUMBER in input_string[:-1]
+
+    def analyze(
+        self,
+        n_best: Optional[int] = None,
+        max_weight: Optional[float] = None,
+        beam: Optional[float] = None,
+    ) -> List["Result"]:
         """
         Analyzes the input string using the transducer.
 
-        :param input: The input string to analyze.
+        :param n_best: The maximum number of analyses to return, the lightest ones.
+        :param max_weight: The maximum weight of an analysis.
+        :param beam: The maximum difference in weight between an analysis and the lightest one.
         :return: A list of Result instances representing the analyses of the input string.
+            When any of n_best, max_weight or beam is given, they are sorted by weight.
         """
-        if self.state.input_string[0] == NO_SYMBOL_NUMBER:
+        if self.rejects_input():
             return []
         else:
-            self.get_analyses(0)
+            if n_best is None and max_weight is None and beam is None:
+                self.stack = None
+                self.steps = 0
+                self.traverse()
+            else:
+                self.traverse_best(n_best, max_weight, beam)
+            if len(self.state.output_string) > self.transducer.output_buffer_size:
+                self.transducer.output_buffer_size = len(self.state.output_string)
             return self.state.display_vector
 
-    def push_state(self, flag: FlagDiacriticOperation) -> bool:
+    def next_analyses(self, count: int = 1) -> List["Result"]:
         """
-        Pushes the state based on the given flag diacritic operation and the current state.
+        Continues the traversal of the input string until count more analyses
+        are found, starting it on the first call after reset. The analyses come
+        in the same order as from analyze, and the limits set with set_limits
+        apply to the traversal as a whole.
 
-        :param flag: A FlagDiacriticOperation instance representing the flag diacritic operation.
-        :param state: The current state of the transducer.
-        :return: A boolean indicating if the push was successful.
+        :param count: The number of analyses to find.
+        :return: The analyses found since reset, the new ones at the end. Fewer than count new ones
+            means that the traversal is over.
         """
-        top = self.state.state_stack[-1].copy()
-        if flag.op == FlagDiacriticOperator.P:  # positive set
-            self.state.state_stack.append(top)
-            self.state.state_stack[-1][flag.feature] = flag.value
-            return True
-        elif flag.op == FlagDiacriticOperator.N:  # negative set
-            self.state.state_stack.append(top)
-            self.state.state_stack[-1][flag.feature] = -1 * flag.value
-            return True
-        elif flag.op == FlagDiacriticOperator.R:  # require
-            if flag.value == 0:  # empty require
-                if self.state.state_stack[-1][flag.feature] == 0:
-                    return False
+        if self.rejects_input():
+            return []
+        self.traverse(count)
+        return self.state.display_vector
+
+    def traverse(self, stop_after: Optional[int] = None) -> None:
+        """
+        Walks the transducer from the start state and notes every analysis of
+        the input string, within the limits set with set_limits.
+
+        Paths are visited depth first with an explicit stack instead of
+        recursion, in the order of the recursive traversal of earlier versions,
+        so that no Python frame is created per step and there is no depth
+        limit. A stack frame is a tuple of (target index, input pointer, output
+        pointer, weight, flag features, output symbol, epsilon depth), the
+        output symbol being written just before the output pointer and the
+        epsilon depth counting the epsilon transitions since the last input
+        symbol. A target index of -1 marks a final state whose analysis is
+        noted when the frame is popped. An epsilon depth of -1 marks a state
+        taken from the epsilon closure of another (see epsilon_closure), the
+        output symbol being then the tuple of the outputs of the path to it.
+
+        The transitions of a state are found without searching: a state in the
+        index table has an entry per input symbol pointing to the start of its
+        transitions, and a state stored in the transition table only has
+        transitions of one input symbol, epsilon and flag diacritics counting
+        as one. The work done at a state thus depends on its transitions for
+        the next input symbol and its epsilon and flag diacritic transitions,
+        not on how many transitions it has in all.
+
+        The stack is kept in self.stack, so a traversal paused by stop_after
+        continues where it left off when traverse is called again. A limit
+        other than max_epsilon_depth ends it for good.
+
+        :param stop_after: The number of analyses after which to pause, or None to note them all.
+        """
+        transducer = self.transducer
+        index_inputs = transducer.index_table.ti_input_symbols
+        index_target = transducer.index_table.get_target
+        index_is_final = transducer.index_table.is_final
+        index_final_weight = transducer.index_table.get_final_weight
+        transition_table = transducer.transition_table
+        inputs = transition_table.ti_input_symbols
+        outputs = transition_table.ti_output_symbols
+        targets = transition_table.ti_targets
+        weights = transition_table.ti_weights
+        transition_is_final = transition_table.is_final
+        transition_count = transition_table.size()
+        flag_opcodes = transducer.flag_opcodes
+        apply_flag = self.apply_flag
+        weighted = transducer.is_weighted
+        key_table = transducer.alphabet.keyTable
+        input_string = self.state.input_string
+        output_string = self.state.output_string
+        results = self.state.display_vector
+        max_results = self.max_results if self.max_results is not None else sys.maxsize
+        max_depth = self.max_epsilon_depth if self.max_epsilon_depth is not None else sys.maxsize
+        pause = len(results) + stop_after if stop_after is not None else sys.maxsize
+        closures = transducer.epsilon_closure_cache_size > 0
+        epsilon_closures = transducer.epsilon_closures
+        steps = self.steps
+        checkpoint = self.next_checkpoint(steps)
+
+        stack = self.stack
+        if stack is None:
+            stack = self.stack = [(0, 0, 0, 0.0, self.state.state_stack[-1], NO_SYMBOL_NUMBER, 0)]
+        while stack:
+            steps += 1
+            if steps >= checkpoint:
+                if self.limit_reached(steps):
+                    self.truncated = True
+                    stack.clear()
+                    break
+                checkpoint = self.next_checkpoint(steps)
+            idx, input_pointer, output_pointer, weight, features, output_symbol, depth = stack.pop()
+            if depth < 0:
+                # a state of an epsilon closure, with the outputs of the path to it
+                position = output_pointer - len(output_symbol)
+                for symbol in output_symbol:
+                    if position < len(output_string):
+                        output_string[position] = symbol
+                    else:
+                        output_string.append(symbol)
+                    position += 1
+            elif output_symbol != NO_SYMBOL_NUMBER:
+                if output_pointer > len(output_string):
+                    output_string.append(output_symbol)
                 else:
-                    self.state.state_stack.append(top)
-                    return True
-            elif self.state.state_stack[-1][flag.feature] == flag.value:
-                self.state.state_stack.append(top)
-                return True
-            return False
-        elif flag.op == FlagDiacriticOperator.D:  # disallow
-            if flag.value == 0:  # empty disallow
-                if self.state.state_stack[-1][flag.feature] != 0:
-                    return False
+                    output_string[output_pointer - 1] = output_symbol
+            if idx < 0:
+                results.append(
+                    Result(
+                        [
+                            key_table[symbol]
+                            for symbol in output_string[:output_pointer]
+                            if symbol != NO_SYMBOL_NUMBER
+                        ],
+                        weight if weighted else 1.0,
+                    )
+                )
+                if len(results) >= max_results:
+                    self.truncated = bool(stack)
+                    stack.clear()
+                    break
+                if len(results) >= pause:
+                    break
+                continue
+
+            is_transition = idx >= TRANSITION_TARGET_TABLE_START
+            index = idx - TRANSITION_TARGET_TABLE_START if is_transition else idx
+
+            # consuming transitions, or the final state at the end of input;
+            # pushed first so that they are visited after the epsilon ones
+            symbol = input_string[input_pointer]
+            if symbol == NO_SYMBOL_NUMBER:
+                if is_transition:
+                    if transition_count > index and transition_is_final(index):
+                        stack.append(
+                            (-1, input_pointer, output_pointer,
+                             weight + weights[index] if weighted else weight,
+                             features, NO_SYMBOL_NUMBER, 0)
+                        )
+                elif index_is_final(index):
+                    stack.append(
+                        (-1, input_pointer, output_pointer,
+                         weight + index_final_weight(index) if weighted else weight,
+                         features, NO_SYMBOL_NUMBER, 0)
+                    )
+            else:
+                if is_transition:
+                    start = index + 1
+                elif index_inputs[index + 1 + symbol] == symbol:
+                    start = self.pivot(index_target(index + 1 + symbol))
                 else:
-                    self.state.state_stack.append(top)
-                    return True
-            elif self.state.state_stack[-1][flag.feature] == flag.value:
-                return False
+                    start = transition_count
+                end = start
+                while end < transition_count and inputs[end] == symbol:
+                    end += 1
+                for i in range(end - 1, start - 1, -1):
+                    stack.append(
+                        (targets[i], input_pointer + 1, output_pointer + 1,
+                         weight + weights[i] if weighted else weight,
+                         features, outputs[i], 0)
+                    )
+
+            # epsilon and flag diacritic transitions, all at once from the
+            # epsilon closure of the state when it is memoized
+            if depth < 0:
+                continue
+            if is_transition:
+                i = index + 1
+            elif index_inputs[index + 1] == 0:
+                i = self.pivot(index_target(index + 1))
             else:
-                self.state.state_stack.append(top)
-                return True
-        elif flag.op == FlagDiacriticOperator.C:  # clear
-            self.state.state_stack.append(top)
-            self.state.state_stack[-1][flag.feature] = 0
-            return True
-        elif flag.op == FlagDiacriticOperator.U:  # unification
-            if (
-                (self.state.state_stack[-1][flag.feature] == 0)
-                or (self.state.state_stack[-1][flag.feature] == flag.value)
-                or (
-                    self.state.state_stack[-1][flag.feature] != flag.value
-                    and self.state.state_stack[-1][flag.feature] < 0
+                continue
+            if depth == 0 and closures and (inputs[i] == 0 or inputs[i] in flag_opcodes):
+                closure = epsilon_closures.get((idx, features, self.max_epsilon_depth))
+                if closure is None:
+                    closure = self.epsilon_closure(idx, features)
+                if closure:
+                    closure_states, closure_cut = closure
+                    for target, closure_outputs, closure_weights, closure_features in closure_states:
+                        closure_weight = weight
+                        for transition_weight in closure_weights:
+                            closure_weight += transition_weight
+                        stack.append(
+                            (target, input_pointer, output_pointer + len(closure_outputs), closure_weight,
+                             closure_features, closure_outputs, -1)
+                        )
+                    if closure_cut:
+                        self.truncated = True
+                    continue
+            epsilons = []
+            while True:
+                input_symbol = inputs[i]
+                flag = flag_opcodes.get(input_symbol)
+                if flag:
+                    next_features = apply_flag(flag, features)
+                    if next_features is None:
+                        i += 1
+                        continue
+                elif input_symbol == 0:
+                    next_features = features
+                else:
+                    break
+                if depth >= max_depth:
+                    self.truncated = True
+                    break
+                epsilons.append(
+                    (targets[i], input_pointer, output_pointer + 1,
+                     weight + weights[i] if weighted else weight,
+                     next_features, outputs[i], depth + 1)
                 )
-            ):
-                self.state.state_stack.append(top)
-                self.state.state_stack[-1][flag.feature] = flag.value
-                return True
-            return False
-        return False  # compiler sanity
+                i += 1
+            epsilons.reverse()
+            stack.extend(epsilons)
+        self.steps = steps
+
+    def epsilon_closure(
+        self, idx: int, features: Tuple[int, ...]
+    ) -> Optional[Tuple[Tuple[Tuple[int, Tuple[int, ...], Tuple[float, ...], Tuple[int, ...]], ...], bool]]:
+        """
+        Returns the epsilon closure of a state: the states reached from it by
+        epsilon and flag diacritic transitions, each with the outputs, the
+        weights and the flag features of the path to it.
+
+        States that are neither final nor have transitions of their own for
+        an input symbol are left out, since nothing is done at them but
+        following more epsilons. The states are listed in the order in which
+        traverse pushes them on its stack, so that they are visited in the
+        same order as when their epsilon transitions are followed one by one.
+        max_epsilon_depth applies to the paths as in traverse.
+
+        Closures are memoized in the transducer by state, flag features and
+        max_epsilon_depth, as the same states are reached again and again,
+        within an input and from one input to the next.
+
+        :param idx: The target index of the state.
+        :param features: The flag diacritic features when the state is reached.
+        :return: The states as (target index, outputs, weights, features) tuples, and whether a path was
+            abandoned at max_epsilon_depth, or None if the closure has too many states to be memoized.
+        """
+        transducer = self.transducer
+        closures = transducer.epsilon_closures
+        key = (idx, features, self.max_epsilon_depth)
+        closure = closures.get(key)
+        if closure is not None:
+            return closure or None
+
+        index_inputs = transducer.index_table.ti_input_symbols
+        index_target = transducer.index_table.get_target
+        transition_table = transducer.transition_table
+        inputs = transition_table.ti_input_symbols
+        outputs = transition_table.ti_output_symbols
+        targets = transition_table.ti_targets
+        weights = transition_table.ti_weights
+        transition_is_final = transition_table.is_final
+        transition_count = transition_table.size()
+        flag_opcodes = transducer.flag_opcodes
+        weighted = transducer.is_weighted
+        max_depth = self.max_epsilon_depth if self.max_epsilon_depth is not None else sys.maxsize
+
+        closure_states = []
+        cut = False
+        visited = 0
+        # a state is listed once the states reached from it are, which is when
+        # traverse gets to its own transitions
+        pending = [(idx, (), (), features, 0, False)]
+        while pending:
+            state, state_outputs, state_weights, state_features, depth, listed = pending.pop()
+            if listed:
+                closure_states.append((state, state_outputs, state_weights, state_features))
+                continue
+            visited += 1
+            if visited > EPSILON_CLOSURE_MAX_SIZE:
+                closure_states = None
+                break
+            is_transition = state >= TRANSITION_TARGET_TABLE_START
+            index = state - TRANSITION_TARGET_TABLE_START if is_transition else state
+            if depth > 0:
+                if not is_transition or (transition_count > index and transition_is_final(index)):
+                    pending.append((state, state_outputs, state_weights, state_features, depth, True))
+                elif index + 1 < transition_count and inputs[index + 1] not in (0, NO_SYMBOL_NUMBER):
+                    pending.append((state, state_outputs, state_weights, state_features, depth, True))
+
+            if is_transition:
+                i = index + 1
+            elif index_inputs[index + 1] == 0:
+                i = self.pivot(index_target(index + 1))
+            else:
+                continue
+            epsilons = []
+            while True:
+                input_symbol = inputs[i]
+                flag = flag_opcodes.get(input_symbol)
+                if flag:
+                    next_features = self.apply_flag(flag, state_features)
+                    if next_features is None:
+                        i += 1
+                        continue
+                elif input_symbol == 0:
+                    next_features = state_features
+                else:
+                    break
+                if depth >= max_depth:
+                    cut = True
+                    break
+                epsilons.append(
+                    (targets[i], state_outputs + (outputs[i],),
+                     state_weights + (weights[i],) if weighted else state_weights,
+                     next_features, depth + 1, False)
+                )
+                i += 1
+            epsilons.reverse()
+            pending.extend(epsilons)
+
+        closure = (tuple(reversed(closure_states)), cut) if closure_states is not None else None
+        if len(closures) >= transducer.epsilon_closure_cache_size:
+            closures.clear()
+        closures[key] = closure if closure is not None else False
+        return closure
+
+    def analyze_batch(self, input_strings: List[str]) -> Tuple[List[Optional[List["Result"]]], List[bool]]:
+        """
+        Analyzes several input strings in a single walk of the transducer.
+
+        The input strings are put in a trie of input symbols that is walked
+        together with the transducer: a frame of the traversal stack holds a
+        trie node instead of an input pointer, and the consuming transitions
+        of a state are followed for every symbol that continues an input at
+        that node. The work done for a prefix, epsilon and flag diacritic
+        transitions included, is thus shared by all the inputs that start
+        with it. Every input gets its analyses in the same order as from
+        analyze.
+
+        max_epsilon_depth applies to every path and max_results to every
+        input, an input being marked as truncated when further analyses of it
+        are dropped. max_steps and the deadline apply to the walk as a whole,
+        and stopping at one of them marks every input as truncated.
+
+        :param input_strings: The input strings.
+        :return: The analyses of every input string and whether they were truncated, in input order.
+            The analyses of input strings that rejects_input would reject are None.
+        """
+        transducer = self.transducer
+        index_inputs = transducer.index_table.ti_input_symbols
+        index_target = transducer.index_table.get_target
+        index_is_final = transducer.index_table.is_final
+        index_final_weight = transducer.index_table.get_final_weight
+        transition_table = transducer.transition_table
+        inputs = transition_table.ti_input_symbols
+        outputs = transition_table.ti_output_symbols
+        targets = transition_table.ti_targets
+        weights = transition_table.ti_weights
+        transition_is_final = transition_table.is_final
+        transition_count = transition_table.size()
+        flag_opcodes = transducer.flag_opcodes
+        apply_flag = self.apply_flag
+        weighted = transducer.is_weighted
+        key_table = transducer.alphabet.keyTable
+        output_string = self.state.output_string
+        max_results = self.max_results if self.max_results is not None else sys.maxsize
+        max_depth = self.max_epsilon_depth if self.max_epsilon_depth is not None else sys.maxsize
+        closures = transducer.epsilon_closure_cache_size > 0
+        epsilon_closures = transducer.epsilon_closures
+        steps = 0
+        checkpoint = self.next_checkpoint(steps)
+
+        results: List[Optional[List[Result]]] = [[] for _ in input_strings]
+        truncated = [False] * len(input_strings)
+        # the trie: the child of every node by input symbol, the parent of
+        # every node, the input ending at every node and the number of inputs
+        # under every node that still take analyses
+        children: List[Dict[int, int]] = [{}]
+        parents: List[int] = [-1]
+        endings: List[int] = [-1]
+        open_inputs: List[int] = [0]
+        duplicates: List[Tuple[int, int]] = []
+        # the nodes where a path was abandoned at max_epsilon_depth, which
+        # truncates every input under them
+        cut = set()
+        for number, string in enumerate(input_strings):
+            symbols = transducer.tokenize(string)
+            if symbols[0] == NO_SYMBOL_NUMBER or NO_SYMBOL_NUMBER in symbols[:-1]:
+                results[number] = None
+                continue
+            node = 0
+            for symbol in symbols[:-1]:
+                child = children[node].get(symbol)
+                if child is None:
+                    child = children[node][symbol] = len(children)
+                    children.append({})
+                    parents.append(node)
+                    endings.append(-1)
+                    open_inputs.append(0)
+                node = child
+            if endings[node] >= 0:
+                duplicates.append((number, endings[node]))
+                continue
+            endings[node] = number
+            while node >= 0:
+                open_inputs[node] += 1
+                node = parents[node]
+
+        stack = [(0, 0, 0, 0.0, self.state.state_stack[0], NO_SYMBOL_NUMBER, 0)]
+        while stack:
+            steps += 1
+            if steps >= checkpoint:
+                if self.limit_reached(steps):
+                    truncated = [True] * len(input_strings)
+                    break
+                checkpoint = self.next_checkpoint(steps)
+            idx, node, output_pointer, weight, features, output_symbol, depth = stack.pop()
+            # paths leading only to inputs that have all their analyses are dropped
+            if not open_inputs[node]:
+                continue
+            if depth < 0:
+                position = output_pointer - len(output_symbol)
+                for symbol in output_symbol:
+                    if position < len(output_string):
+                        output_string[position] = symbol
+                    else:
+                        output_string.append(symbol)
+                    position += 1
+            elif output_symbol != NO_SYMBOL_NUMBER:
+                if output_pointer > len(output_string):
+                    output_string.append(output_symbol)
+                else:
+                    output_string[output_pointer - 1] = output_symbol
+            if idx < 0:
+                number = endings[node]
+                if len(results[number]) >= max_results:
+                    continue
+                results[number].append(
+                    Result(
+                        [
+                            key_table[symbol]
+                            for symbol in output_string[:output_pointer]
+                            if symbol != NO_SYMBOL_NUMBER
+                        ],
+                        weight if weighted else 1.0,
+                    )
+                )
+                if len(results[number]) >= max_results:
+                    truncated[number] = bool(stack)
+                    while node >= 0:
+                        open_inputs[node] -= 1
+                        node = parents[node]
+                    if not open_inputs[0]:
+                        break
+                continue
+
+            is_transition = idx >= TRANSITION_TARGET_TABLE_START
+            index = idx - TRANSITION_TARGET_TABLE_START if is_transition else idx
+
+            # the final state where an input ends, and the consuming
+            # transitions of every input going on from here
+            if endings[node] >= 0:
+                if is_transition:
+                    if transition_count > index and transition_is_final(index):
+                        stack.append(
+                            (-1, node, output_pointer,
+                             weight + weights[index] if weighted else weight,
+                             features, NO_SYMBOL_NUMBER, 0)
+                        )
+                elif index_is_final(index):
+                    stack.append(
+                        (-1, node, output_pointer,
+                         weight + index_final_weight(index) if weighted else weight,
+                         features, NO_SYMBOL_NUMBER, 0)
+                    )
+            for symbol, child in children[node].items():
+                if is_transition:
+                    start = index + 1
+                elif index_inputs[index + 1 + symbol] == symbol:
+                    start = self.pivot(index_target(index + 1 + symbol))
+                else:
+                    continue
+                end = start
+                while end < transition_count and inputs[end] == symbol:
+                    end += 1
+                for i in range(end - 1, start - 1, -1):
+                    stack.append(
+                        (targets[i], child, output_pointer + 1,
+                         weight + weights[i] if weighted else weight,
+                         features, outputs[i], 0)
+                    )
+
+            # epsilon and flag diacritic transitions, see traverse
+            if depth < 0:
+                continue
+            if is_transition:
+                i = index + 1
+            elif index_inputs[index + 1] == 0:
+                i = self.pivot(index_target(index + 1))
+            else:
+                continue
+            if depth == 0 and closures and (inputs[i] == 0 or inputs[i] in flag_opcodes):
+                closure = epsilon_closures.get((idx, features, self.max_epsilon_depth))
+                if closure is None:
+                    closure = self.epsilon_closure(idx, features)
+                if closure:
+                    closure_states, closure_cut = closure
+                    for target, closure_outputs, closure_weights, closure_features in closure_states:
+                        closure_weight = weight
+                        for transition_weight in closure_weights:
+                            closure_weight += transition_weight
+                        stack.append(
+                            (target, node, output_pointer + len(closure_outputs), closure_weight,
+                             closure_features, closure_outputs, -1)
+                        )
+                    if closure_cut:
+                        cut.add(node)
+                    continue
+            epsilons = []
+            while True:
+                input_symbol = inputs[i]
+                flag = flag_opcodes.get(input_symbol)
+                if flag:
+                    next_features = apply_flag(flag, features)
+                    if next_features is None:
+                        i += 1
+                        continue
+                elif input_symbol == 0:
+                    next_features = features
+                else:
+                    break
+                if depth >= max_depth:
+                    cut.add(node)
+                    break
+                epsilons.append(
+                    (targets[i], node, output_pointer + 1,
+                     weight + weights[i] if weighted else weight,
+                     next_features, outputs[i], depth + 1)
+                )
+                i += 1
+            epsilons.reverse()
+            stack.extend(epsilons)
+
+        pending = list(cut)
+        while pending:
+            node = pending.pop()
+            if endings[node] >= 0:
+                truncated[endings[node]] = True
+            pending.extend(children[node].values())
+        for number, original in duplicates:
+            results[number] = list(results[original])
+            truncated[number] = truncated[original]
+        self.truncated = any(truncated)
+        return results, truncated
+
+    def traverse_best(
+        self,
+        n_best: Optional[int] = None,
+        max_weight: Optional[float] = None,
+        beam: Optional[float] = None,
+    ) -> None:
+        """
+        Walks the transducer lightest path first and notes the analyses of the
+        input string in order of weight, for as long as they are within the
+        limits.
+
+        Partial paths wait in a heap ordered by weight, so the work done grows
+        with the number of analyses wanted rather than with the number of
+        analyses there are. Since paths in the heap do not share an output
+        buffer, a heap entry is a tuple of (weight, push order, target index,
+        input pointer, flag features, output, epsilon depth), the output being
+        a linked list of (symbol, previous output) pairs. A path is dropped as
+        soon as it gets heavier than max_weight, or than the first analysis
+        plus beam. This assumes that weights are not negative: a negative
+        weight further down a path can make the results differ from those of
+        traverse. The limits set with set_limits apply as in traverse.
+
+        :param n_best: The number of analyses to note, or None for no limit.
+        :param max_weight: The maximum weight of an analysis, or None for no limit.
+        :param beam: The maximum difference in weight from the first analysis, or None for no limit.
+        """
+        transducer = self.transducer
+        index_inputs = transducer.index_table.ti_input_symbols
+        index_target = transducer.index_table.get_target
+        index_is_final = transducer.index_table.is_final
+        index_final_weight = transducer.index_table.get_final_weight
+        transition_table = transducer.transition_table
+        inputs = transition_table.ti_input_symbols
+        outputs = transition_table.ti_output_symbols
+        targets = transition_table.ti_targets
+        weights = transition_table.ti_weights
+        transition_is_final = transition_table.is_final
+        transition_count = transition_table.size()
+        flag_opcodes = transducer.flag_opcodes
+        apply_flag = self.apply_flag
+        weighted = transducer.is_weighted
+        key_table = transducer.alphabet.keyTable
+        input_string = self.state.input_string
+        results = self.state.display_vector
+        limit = max_weight if max_weight is not None else float("inf")
+        max_results = self.max_results if self.max_results is not None else sys.maxsize
+        max_depth = self.max_epsilon_depth if self.max_epsilon_depth is not None else sys.maxsize
+        steps = 0
+        checkpoint = self.next_checkpoint(steps)
+
+        heap = [(0.0, 0, 0, 0, self.state.state_stack[-1], None, 0)]
+        order = 1
+        while heap:
+            steps += 1
+            if steps >= checkpoint:
+                if self.limit_reached(steps):
+                    self.truncated = True
+                    return
+                checkpoint = self.next_checkpoint(steps)
+            weight, _, idx, input_pointer, features, output, depth = heappop(heap)
+            if weight > limit:
+                break
+            if idx < 0:
+                symbols = []
+                while output is not None:
+                    symbol, output = output
+                    if symbol != NO_SYMBOL_NUMBER:
+                        symbols.append(key_table[symbol])
+                symbols.reverse()
+                results.append(Result(symbols, weight if weighted else 1.0))
+                if n_best is not None and len(results) >= n_best:
+                    break
+                if len(results) >= max_results:
+                    self.truncated = bool(heap)
+                    return
+                if beam is not None and len(results) == 1:
+                    limit = min(limit, weight + beam)
+                continue
+
+            is_transition = idx >= TRANSITION_TARGET_TABLE_START
+            index = idx - TRANSITION_TARGET_TABLE_START if is_transition else idx
+
+            # consuming transitions, or the final state at the end of input
+            symbol = input_string[input_pointer]
+            if symbol == NO_SYMBOL_NUMBER:
+                final_weight = None
+                if is_transition:
+                    if transition_count > index and transition_is_final(index):
+                        final_weight = weights[index] if weighted else 0.0
+                elif index_is_final(index):
+                    final_weight = index_final_weight(index) if weighted else 0.0
+                if final_weight is not None and weight + final_weight <= limit:
+                    heappush(heap, (weight + final_weight, order, -1, input_pointer, features, output, depth))
+                    order += 1
+            else:
+                if is_transition:
+                    i = index + 1
+                elif index_inputs[index + 1 + symbol] == symbol:
+                    i = self.pivot(index_target(index + 1 + symbol))
+                else:
+                    i = transition_count
+                while i < transition_count and inputs[i] == symbol:
+                    next_weight = weight + weights[i] if weighted else weight
+                    if next_weight <= limit:
+                        heappush(
+                            heap,
+                            (next_weight, order, targets[i], input_pointer + 1, features, (outputs[i], output), 0),
+                        )
+                        order += 1
+                    i += 1
+
+            # epsilon and flag diacritic transitions
+            if is_transition:
+                i = index + 1
+            elif index_inputs[index + 1] == 0:
+                i = self.pivot(index_target(index + 1))
+            else:
+                continue
+            while True:
+                input_symbol = inputs[i]
+                flag = flag_opcodes.get(input_symbol)
+                if flag:
+                    next_features = apply_flag(flag, features)
+                    if next_features is None:
+                        i += 1
+                        continue
+                elif input_symbol == 0:
+                    next_features = features
+                else:
+                    break
+                if depth >= max_depth:
+                    self.truncated = True
+                    break
+                next_weight = weight + weights[i] if weighted else weight
+                if next_weight <= limit:
+                    heappush(
+                        heap,
+                        (next_weight, order, targets[i], input_pointer, next_features,
+                         (outputs[i], output), depth + 1),
+                    )
+                    order += 1
+                i += 1
+
+    def apply_flag(
+        self, flag: Tuple[int, int, int], features: Tuple[int, ...]
+    ) -> Optional[Tuple[int, ...]]:
+        """
+        Applies a pre-decoded flag diacritic operation to a set of flag
+        features. Checks and sets that do not change anything return the
+        features as they are, the others a new tuple.
+
+        :param flag: The (opcode, feature, value) tuple of the operation, see compile_flag.
+        :param features: The current values of the flag features.
+        :return: The features after the operation, or None if the operation fails.
+        """
+        opcode, feature, value = flag
+        current = features[feature]
+        if opcode == FLAG_SET:
+            if current == value:
+                return features
+        elif opcode == FLAG_REQUIRE:
+            if value == 0:  # empty require
+                return None if current == 0 else features
+            return features if current == value else None
+        elif opcode == FLAG_DISALLOW:
+            if value == 0:  # empty disallow
+                return None if current != 0 else features
+            return None if current == value else features
+        elif current == value:  # unification
+            return features
+        elif current != 0 and current >= 0:
+            return None
+        return features[:feature] + (value,) + features[feature + 1 :]
@@ -0,0 +1,196 @@
+"""
+Lookup from asyncio code.
+
+A synchronous lookup blocks the event loop for as long as the analysis
+takes. AsyncHfst queues the words looked up by concurrent coroutines,
+collects them into micro-batches and analyses each batch off the event loop,
+in a thread or in the worker processes of a ParallelHfst:
+
+    tr = pyhfst.AsyncHfst(pyhfst.ParallelHfst("./analyser", workers=4))
+    analyses = await tr.lookup("voi")
+"""
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from . import Analyses, Hfst, HfstInputStream, ParallelHfst
+
+
+class AsyncHfst(object):
+    """
+    Looks up words from coroutines in micro-batches.
+
+    A batch is sent off when it holds max_batch_size distinct words or
+    max_delay seconds after its first word arrived, whichever comes first.
+    A word that is already queued or being analysed is not queued again, its
+    callers share the result. At most max_pending lookups can be waiting for
+    their results, further callers wait for room before their word is queued.
+
+    The Cython backend walks the transducer without the GIL, so the event
+    loop keeps running while a batch is analysed in a thread and only
+    waits while the analyses are built and cached. With the pure Python
+    backend the analysis holds the GIL and the event loop only runs at
+    interpreter switch intervals. Pass a ParallelHfst to move the work out
+    of the process with either backend.
+    """
+
+    def __init__(
+        self,
+        source: Union[Hfst, ParallelHfst, str, Path],
+        max_batch_size: int = 256,
+        max_delay: float = 0.001,
+        max_pending: int = 10000,
+        max_batches: Optional[int] = None,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        """
+        Initialize an AsyncHfst object.
+
+        :param source: The Hfst or ParallelHfst object to look words up with, or the path to a transducer file.
+        :param max_batch_size: The maximum number of distinct words in a batch.
+        :param max_delay: How long a batch waits for more words after its first one, in seconds.
+        :param max_pending: The maximum number of lookups waiting for their results.
+        :param max_batches: The maximum number of batches analysed at the same time.
+            Defaults to the number of worker processes of a ParallelHfst and to 1 otherwise.
+        :param executor: The executor that runs the batches. Defaults to a thread pool with max_batches threads,
+            shut down by close.
+        """
+        if not isinstance(source, (Hfst, ParallelHfst)):
+            source = HfstInputStream(source).read()
+        self.source = source
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_batches = max_batches or (source.workers if isinstance(source, ParallelHfst) else 1)
+        self.own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(self.max_batches, thread_name_prefix="pyhfst")
+        # the batch being collected and its timer
+        self.batch: List[str] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        # the futures of the callers of every queued or running word
+        self.waiters: Dict[str, List[asyncio.Future]] = {}
+        self.tasks = set()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.pending: Optional[asyncio.Semaphore] = None
+        self.running: Optional[asyncio.Semaphore] = None
+        self.batches = 0
+        self.lookups = 0
+        self.deduplicated = 0
+
+    async def __aenter__(self) -> "AsyncHfst":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    def _bind(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+            self.pending = asyncio.Semaphore(self.max_pending)
+            self.running = asyncio.Semaphore(self.max_batches)
+        elif self.loop is not loop:
+            raise RuntimeError("AsyncHfst is bound to another event loop")
+
+    async def submit(self, word: str) -> asyncio.Future:
+        """
+        Queue a word for lookup, waiting first if max_pending lookups are already waiting.
+
+        :param word: The input string to analyze.
+        :return: A future of the analyses of the word, as returned by Hfst.lookup.
+            Cancelling it does not affect other callers looking up the same word.
+        """
+        self._bind()
+        await self.pending.acquire()
+        future = self.loop.create_future()
+        future.add_done_callback(lambda _: self.pending.release())
+        self.lookups += 1
+        waiters = self.waiters.get(word)
+        if waiters is not None:
+            self.deduplicated += 1
+            waiters.append(future)
+            return future
+        self.waiters[word] = [future]
+        self.batch.append(word)
+        if len(self.batch) >= self.max_batch_size:
+            self._flush()
+        elif self.timer is None:
+            self.timer = self.loop.call_later(self.max_delay, self._flush)
+        return future
+
+    async def lookup(self, word: str) -> List[Tuple[str, float]]:
+        """
+        Perform lookup on the input string without blocking the event loop.
+
+        :param word: The input string to analyze.
+        :return: The analyses of the word, as returned by Hfst.lookup.
+        """
+        return await (await self.submit(word))
+
+    async def lookup_many(self, words: List[str]) -> List[List[Tuple[str, float]]]:
+        """
+        Perform lookup on several input strings without blocking the event loop.
+
+        :param words: The input strings to analyze.
+        :return: The analyses of every word, in the same order as the input.
+        """
+        futures = [await self.submit(word) for word in words]
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        self.batches += 1
+        task = self.loop.create_task(self._run(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, batch: List[str]) -> None:
+        try:
+            async with self.running:
+                results = await self.loop.run_in_executor(self.executor, self.source.lookup_many, batch)
+        except asyncio.CancelledError:
+            for word in batch:
+                for future in self.waiters.pop(word):
+                    future.cancel()
+            raise
+        except Exception as e:
+            for word in batch:
+                for future in self.waiters.pop(word):
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for word, result in zip(batch, results):
+            for i, future in enumerate(self.waiters.pop(word)):
+                if not future.done():
+                    future.set_result(result if i == 0 else Analyses.from_pairs(result, result.truncated))
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the batching counters.
+
+        :return: The number of lookups, of lookups that joined a queued or running one, of batches sent off,
+            and of lookups currently waiting for their results.
+        """
+        return {
+            "lookups": self.lookups,
+            "deduplicated": self.deduplicated,
+            "batches": self.batches,
+            "pending": sum(len(waiters) for waiters in self.waiters.values()),
+        }
+
+    async def close(self) -> None:
+        """
+        Send off the batch being collected, wait for every batch to finish and shut down the default executor.
+        """
+        if self.loop is not None:
+            self._flush()
+            while self.tasks:
+                await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.own_executor:
+            self.executor.shutdown(wait=False)
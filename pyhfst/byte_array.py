@@ -1,4 +1,6 @@
 import struct
+import sys
+from array import array
 from typing import Optional
 
 
@@ -88,3 +90,24 @@ class ByteArray:
         result = struct.unpack_from("<f", self.bytes, self.index)[0]
         self.index += 4
         return result
+
+    def get_column(self, typecode: str, offset: int, stride: int) -> array:
+        """
+        Decodes one field of every fixed-size record in the byte array in a
+        single pass, without moving the index.
+
+        :param typecode: The array typecode of the field ("H", "I" or "f").
+        :param offset: The offset of the field within a record.
+        :param stride: The size of a record.
+        :return: An array holding the field of every record.
+        """
+        column = array(typecode)
+        itemsize = column.itemsize
+        count = self.size // stride
+        raw = bytearray(count * itemsize)
+        for k in range(itemsize):
+            raw[k::itemsize] = self.bytes[offset + k :: stride][:count]
+        column.frombytes(raw)
+        if sys.byteorder == "big":
+            column.byteswap()
+        return column
@@ -0,0 +1,197 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterator, Optional, Tuple
+
+FormattedResult = Tuple[Tuple[str, float], ...]
+
+
+def entry_size(key: Hashable, value: FormattedResult) -> int:
+    """
+    Estimates the memory used by a cache entry.
+
+    :param key: The key of the entry.
+    :param value: The formatted analyses of the entry, or an object that reports its own size such as CompactAnalyses.
+    :return: The estimated size of the entry in bytes.
+    """
+    size = sys.getsizeof(key) + sys.getsizeof(value)
+    if not isinstance(value, tuple):
+        return size
+    for analysis, weight in value:
+        size += sys.getsizeof((analysis, weight)) + sys.getsizeof(analysis) + sys.getsizeof(weight)
+    return size
+
+
+class LookupCache:
+    """
+    A thread-safe cache of formatted lookup results that can be bounded by
+    number of entries, by estimated size in bytes, or both.
+    """
+
+    POLICIES = ("lru", "lfu")
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        policy: str = "lru",
+    ) -> None:
+        """
+        Initialize a LookupCache object.
+
+        :param max_entries: The maximum number of cached inputs, or None for no limit.
+        :param max_bytes: The maximum estimated size of the cache in bytes, or None for no limit.
+        :param policy: "lru" to evict the least recently used entry first, "lfu" to evict the least frequently used one.
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown cache policy {policy!r}, expected one of {self.POLICIES}")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[FormattedResult, int]] = {}
+        # lru: a single bucket kept in recency order
+        # lfu: one bucket per use count, each kept in recency order
+        self._frequencies: Dict[Hashable, int] = {}
+        self._buckets: Dict[int, OrderedDict] = {1: OrderedDict()}
+        self._min_frequency = 1
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    # mapping access, as on the dict that Hfst.mem used to be; reads count
+    # as hits and misses like get
+    def __getitem__(self, key: Hashable) -> FormattedResult:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: FormattedResult) -> None:
+        self.put(key, value)
+
+    def __delitem__(self, key: Hashable) -> None:
+        with self._lock:
+            if key not in self._entries:
+                raise KeyError(key)
+            frequency = self._frequencies.pop(key)
+            bucket = self._buckets[frequency]
+            del bucket[key]
+            if not bucket and frequency != 1:
+                del self._buckets[frequency]
+            self.bytes -= self._entries.pop(key)[1]
+
+    def __iter__(self) -> Iterator[Hashable]:
+        with self._lock:
+            return iter(list(self._entries))
+
+    def get(self, key: Hashable) -> Optional[FormattedResult]:
+        """
+        Returns the cached results for the given key and records a hit or a miss.
+
+        :param key: The key to look up.
+        :return: The cached results, or None if the key is not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touch(key)
+            return entry[0]
+
+    def put(self, key: Hashable, value: FormattedResult) -> None:
+        """
+        Caches the results for the given key, evicting other entries if the cache is over its limits.
+
+        :param key: The key to cache the results under.
+        :param value: The formatted results.
+        """
+        size = entry_size(key, value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries[key][1]
+                self._entries[key] = (value, size)
+                self.bytes += size
+                self._touch(key)
+            else:
+                # make room first, or the new entry, used the least, would
+                # be the one evicted from a full LFU cache
+                self.bytes += size
+                self._evict(incoming=1)
+                self._entries[key] = (value, size)
+                self._frequencies[key] = 1
+                self._buckets[1][key] = None
+                self._min_frequency = 1
+            self._evict()
+
+    def clear(self) -> None:
+        """
+        Removes all entries from the cache. The counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._frequencies.clear()
+            self._buckets = {1: OrderedDict()}
+            self._min_frequency = 1
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the cache counters.
+
+        :return: A dictionary with the hits, misses, evictions, number of entries and estimated size in bytes.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+            }
+
+    def _touch(self, key: Hashable) -> None:
+        frequency = self._frequencies[key]
+        if self.policy == "lru":
+            self._buckets[frequency].move_to_end(key)
+            return
+        bucket = self._buckets[frequency]
+        del bucket[key]
+        if not bucket and frequency == self._min_frequency:
+            self._min_frequency = frequency + 1
+        if not bucket and frequency != 1:
+            del self._buckets[frequency]
+        self._frequencies[key] = frequency + 1
+        self._buckets.setdefault(frequency + 1, OrderedDict())[key] = None
+
+    def _evict(self, incoming: int = 0) -> None:
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) + incoming > self.max_entries)
+            or (self.max_bytes is not None and self.bytes > self.max_bytes)
+        ):
+            while not self._buckets.get(self._min_frequency):
+                self._min_frequency += 1
+            key, _ = self._buckets[self._min_frequency].popitem(last=False)
+            del self._frequencies[key]
+            self.bytes -= self._entries.pop(key)[1]
+            self.evictions += 1
@@ -1,5 +1,7 @@
 from typing import List, Generator, Any, Tuple, Union, Optional
 import io
+import mmap
+from array import array
 from collections.abc import ByteString
 from collections import defaultdict
 from .byte_array import ByteArray
@@ -10,6 +12,25 @@ TRANSITION_TARGET_TABLE_START = 2147483648  # 2^31 or UINT_MAX/2 rounded up
 INFINITE_WEIGHT = float(4294967295)
 NO_SYMBOL_NUMBER = 65535  # USHRT_MAX
 NO_TABLE_INDEX = 4294967295
+OUTPUT_BUFFER_SIZE = 64
+TOKENIZATION_CACHE_SIZE = 10000
+LIMIT_CHECK_INTERVAL = 256  # traversal steps between two checks of the step limit and the deadline
+EPSILON_CLOSURE_CACHE_SIZE = 100000  # epsilon closures memoized per transducer
+EPSILON_CLOSURE_MAX_SIZE = 256  # states visited for an epsilon closure beyond which it is not memoized
+
+
+def map_table(input_stream: mmap.mmap, size: int) -> memoryview:
+    """
+    Returns a read-only view of the next table in a memory-mapped transducer
+    file and moves the stream past it. No bytes are copied.
+
+    :param input_stream: The memory-mapped transducer file, positioned at the start of the table.
+    :param size: The size of the table in bytes.
+    :return: A memoryview over the table bytes.
+    """
+    start = input_stream.tell()
+    input_stream.seek(start + size)
+    return memoryview(input_stream)[start : start + size]
 
 
 class IndexTable:
@@ -20,11 +41,8 @@ class IndexTable:
     def __init__(self, input_stream: io.BytesIO, indices_count: int):
         b = ByteArray(indices_count * 6)
         input_stream.readinto(b.bytes)
-        self.ti_input_symbols: List[int] = [0] * indices_count
-        self.ti_targets: List[int] = [0] * indices_count
-        for i in range(indices_count):
-            self.ti_input_symbols[i] = b.get_ushort()
-            self.ti_targets[i] = b.get_uint()
+        self.ti_input_symbols: array = b.get_column("H", 0, 6)
+        self.ti_targets: array = b.get_column("I", 2, 6)
 
     def get_input(self, i: int) -> int:
         """
@@ -66,6 +84,62 @@ class IndexTable:
         return float(self.ti_targets[i])
 
 
+class MappedIndexTable(IndexTable):
+    """
+    An index table that reads its entries straight from a memory-mapped
+    transducer file instead of decoding them into lists.
+    """
+
+    def __init__(self, input_stream: mmap.mmap, indices_count: int):
+        # entries are 6 bytes: an unsigned short followed by an unaligned
+        # unsigned int, which is read as two unsigned shorts
+        shorts = map_table(input_stream, indices_count * 6).cast("H")
+        self.ti_input_symbols = shorts[0::3]
+        self.ti_targets_low = shorts[1::3]
+        self.ti_targets_high = shorts[2::3]
+
+    def get_target(self, i: int) -> int:
+        """
+        Returns the target index at the given index.
+
+        :param i: The index to retrieve the target index from.
+        :return: The target index at the specified index.
+        """
+        return self.ti_targets_low[i] | (self.ti_targets_high[i] << 16)
+
+    def is_final(self, i: int) -> bool:
+        """
+        Checks if the given index is a final state.
+
+        :param i: The index to check.
+        :return: True if the index is a final state, False otherwise.
+        """
+        return (
+            self.ti_input_symbols[i] == NO_SYMBOL_NUMBER
+            and self.get_target(i) != NO_TABLE_INDEX
+        )
+
+    def get_final_weight(self, i: int) -> float:
+        """
+        Returns the final weight for the given index.
+
+        :param i: The index to retrieve the final weight from.
+        :return: The final weight at the specified index.
+        """
+        return float(self.get_target(i))
+
+
+class CompiledIndexTable(IndexTable):
+    """
+    An index table over columns that are already decoded, such as the
+    memory-mapped columns of a compiled transducer file.
+    """
+
+    def __init__(self, ti_input_symbols: Union[array, memoryview], ti_targets: Union[array, memoryview]):
+        self.ti_input_symbols = ti_input_symbols
+        self.ti_targets = ti_targets
+
+
 class TransitionTable:
     """
     A table to store transitions between states.
@@ -78,17 +152,12 @@ class TransitionTable:
         b = ByteArray(transition_count * block_size)
         input_stream.readinto(b.bytes)
         self.is_weighted: bool = is_weighted
-        self.ti_input_symbols: List[int] = [0] * transition_count
-        self.ti_output_symbols: List[int] = [0] * transition_count
-        self.ti_targets: List[int] = [0] * transition_count
-        self.ti_weights: List[float] = [0.0] * transition_count
-
-        for i in range(transition_count):
-            self.ti_input_symbols[i] = b.get_ushort()
-            self.ti_output_symbols[i] = b.get_ushort()
-            self.ti_targets[i] = b.get_uint()
-            if self.is_weighted:
-                self.ti_weights[i] = b.get_float()
+        self.ti_input_symbols: array = b.get_column("H", 0, block_size)
+        self.ti_output_symbols: array = b.get_column("H", 2, block_size)
+        self.ti_targets: array = b.get_column("I", 4, block_size)
+        self.ti_weights: array = (
+            b.get_column("f", 8, block_size) if is_weighted else array("f")
+        )
 
     def get_input(self, pos: int) -> int:
         """
@@ -150,53 +219,90 @@ class TransitionTable:
         return len(self.ti_targets)
 
 
+class MappedTransitionTable(TransitionTable):
+    """
+    A transition table whose columns are strided views over a memory-mapped
+    transducer file.
+    """
+
+    def __init__(
+        self, input_stream: mmap.mmap, transition_count: int, is_weighted: bool = True
+    ):
+        block_size = 12 if is_weighted else 8
+        view = map_table(input_stream, transition_count * block_size)
+        shorts = view.cast("H")
+        ints = view.cast("I")
+        self.is_weighted = is_weighted
+        self.ti_input_symbols = shorts[0 :: block_size // 2]
+        self.ti_output_symbols = shorts[1 :: block_size // 2]
+        self.ti_targets = ints[1 :: block_size // 4]
+        self.ti_weights = view.cast("f")[2::3] if is_weighted else array("f")
+
+
+class CompiledTransitionTable(TransitionTable):
+    """
+    A transition table over columns that are already decoded, such as the
+    memory-mapped columns of a compiled transducer file.
+    """
+
+    def __init__(
+        self,
+        ti_input_symbols: Union[array, memoryview],
+        ti_output_symbols: Union[array, memoryview],
+        ti_targets: Union[array, memoryview],
+        ti_weights: Union[array, memoryview],
+        is_weighted: bool = True,
+    ):
+        self.is_weighted = is_weighted
+        self.ti_input_symbols = ti_input_symbols
+        self.ti_output_symbols = ti_output_symbols
+        self.ti_targets = ti_targets
+        self.ti_weights = ti_weights
+
+
 class State:
     """
     A class representing the state of the FST.
     """
 
+    __slots__ = (
+        "parent",
+        "state_stack",
+        "output_string",
+        "input_string",
+        "display_vector",
+    )
+
     def __init__(self, input: str, parent: Any):
         self.parent: Any = parent
-        self.state_stack: List[List[int]] = []
-        neutral: List[int] = [0] * parent.alphabet.features
+        self.state_stack: List[Tuple[int, ...]] = []
+        neutral: Tuple[int, ...] = (0,) * parent.alphabet.features
         self.state_stack.append(neutral)
-        self.output_string: List[int] = [NO_SYMBOL_NUMBER] * 1000
+        self.output_string: List[int] = [NO_SYMBOL_NUMBER] * parent.output_buffer_size
         self.input_string: List[int] = list(self.find_key(input))
-        self.output_pointer: int = 0
-        self.input_pointer: int = 0
-        self.current_weight: float = 0.0
         self.display_vector: List[int] = []
 
-    def find_key(self, index_string: str) -> Generator[int, None, None]:
-        """
-        Finds the key associated with the given index string.
-        :param index_string: The index string to search for.
-        :return: The symbol number if found, otherwise NO_SYMBOL_NUMBER.
+    def reset(self, input: str) -> None:
         """
+        Prepares the state for a new input, reusing its buffers.
 
-        i = 0
+        The output buffer is not cleared, the traversals only read the part
+        they have written. The result list is emptied in place, so the
+        results of the previous input must be consumed before calling this.
 
-        while i < len(index_string):
-            match_found = False
-            for length in range(len(index_string) - i, 0, -1):
-                substr = index_string[i : i + length]
-                map_pointer = self.parent.symbol_map
-                for char in substr:
-                    if char in map_pointer:
-                        map_pointer = map_pointer[char]
-                    else:
-                        break
-                else:
-                    if None in map_pointer:
-                        yield map_pointer[None]
-                        i += length - 1
-                        match_found = True
-                    break
-            if not match_found:
-                yield NO_SYMBOL_NUMBER
-            i += 1
+        :param input: The new input string.
+        """
+        del self.state_stack[1:]
+        self.input_string = list(self.find_key(input))
+        self.display_vector.clear()
 
-        yield NO_SYMBOL_NUMBER
+    def find_key(self, index_string: str) -> Generator[int, None, None]:
+        """
+        Finds the keys of the input symbols in the given index string.
+        :param index_string: The index string to tokenize.
+        :return: The symbol numbers, NO_SYMBOL_NUMBER for characters that start no symbol and at the end.
+        """
+        yield from self.parent.tokenize(index_string)
 
 
 class Result:
@@ -204,6 +310,8 @@ class Result:
     A class representing a result with symbols and a weight.
     """
 
+    __slots__ = ("symbols", "weight")
+
     def __init__(self, symbols: List[str], weight: float):
         self.symbols: List[str] = symbols
         self.weight: float = weight
@@ -0,0 +1,110 @@
+"""
+A compact representation of the analyses of an input, for large caches.
+
+The analyses of an input are kept as two byte strings: the output symbol
+numbers of all analyses as unsigned 16-bit integers, each analysis ended by
+NO_SYMBOL_NUMBER, and their weights as doubles. No string is built until the
+analyses are looked up again, when they are decoded with the symbol table of
+the transducer.
+"""
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .common import NO_SYMBOL_NUMBER
+
+
+def symbol_numbers(key_table: List[str]) -> Dict[str, int]:
+    """
+    Maps the symbol strings of a transducer to symbol numbers, for encoding
+    analyses. Symbols that print as nothing, such as epsilon and flag
+    diacritics, are left out since they do not change an analysis.
+
+    :param key_table: The symbol strings of the transducer, indexed by symbol number.
+    :return: A dictionary from symbol string to the first symbol number with that string.
+    """
+    numbers: Dict[str, int] = {}
+    for number, symbol in enumerate(key_table):
+        if symbol:
+            numbers.setdefault(symbol, number)
+    return numbers
+
+
+class CompactAnalyses(object):
+    """
+    The analyses of an input, packed into byte strings.
+    """
+
+    __slots__ = ("symbols", "weights")
+
+    def __init__(self, symbols: bytes, weights: Optional[bytes]) -> None:
+        """
+        Initialize a CompactAnalyses object.
+
+        :param symbols: The symbol numbers of all analyses as native unsigned 16-bit integers,
+            each analysis followed by NO_SYMBOL_NUMBER.
+        :param weights: The weights of the analyses as native doubles, or None if they all weigh 1.0,
+            as the analyses of unweighted transducers do.
+        """
+        self.symbols = symbols
+        self.weights = weights
+
+    @classmethod
+    def from_results(
+        cls, results: Iterable, numbers: Dict[str, int], weighted: bool = True
+    ) -> "CompactAnalyses":
+        """
+        Packs the Result objects of an analysis.
+
+        :param results: The Result objects returned by Analyzer.analyze.
+        :param numbers: The symbol numbers of the transducer, see symbol_numbers.
+        :param weighted: Whether the transducer is weighted.
+        :return: The packed analyses.
+        """
+        symbols = array("H")
+        weights = array("d")
+        for result in results:
+            symbols.extend([numbers[symbol] for symbol in result.get_symbols() if symbol])
+            symbols.append(NO_SYMBOL_NUMBER)
+            weights.append(result.get_weight())
+        if not weights:
+            return EMPTY
+        return cls(symbols.tobytes(), weights.tobytes() if weighted else None)
+
+    def __len__(self) -> int:
+        symbols = array("H")
+        symbols.frombytes(self.symbols)
+        return symbols.count(NO_SYMBOL_NUMBER)
+
+    def __sizeof__(self) -> int:
+        return (
+            object.__sizeof__(self)
+            + sys.getsizeof(self.symbols)
+            + (sys.getsizeof(self.weights) if self.weights is not None else 0)
+        )
+
+    def decode(self, key_table: List[str]) -> Iterator[Tuple[str, float]]:
+        """
+        Unpacks the analyses.
+
+        :param key_table: The symbol strings of the transducer that produced them.
+        :return: An iterator of (analysis, weight) pairs.
+        """
+        if not self.symbols:
+            return
+        symbols = array("H")
+        symbols.frombytes(self.symbols)
+        weights = array("d")
+        if self.weights is not None:
+            weights.frombytes(self.weights)
+        start = 0
+        for i, end in enumerate(j for j, symbol in enumerate(symbols) if symbol == NO_SYMBOL_NUMBER):
+            yield (
+                "".join([key_table[symbol] for symbol in symbols[start:end]]),
+                weights[i] if self.weights is not None else 1.0,
+            )
+            start = end + 1
+
+
+# the analyses of every input without any, shared
+EMPTY = CompactAnalyses(b"", None)
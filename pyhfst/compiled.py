@@ -0,0 +1,265 @@
+"""
+Compiled transducer files.
+
+Loading an .hfstol file means parsing its header, decoding the alphabet
+byte by byte and decoding both tables record by record. A compiled file
+stores the result of all that, written once next to the transducer:
+
+    pyhfst-compile analyser.hfstol
+
+and loaded with a memory mapping by HfstInputStream whenever it is present
+and up to date. The layout is a fixed preamble, a JSON metadata block with
+the header and the symbol strings, and then the columns of both tables as
+native arrays, each aligned to ALIGNMENT bytes.
+"""
+import argparse
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from . import common, transducer_alphabet, transducer_header
+
+try:
+    from c_pyhfst.transducer import Transducer
+    from c_pyhfst.transducer_header import TransducerHeader
+    from c_pyhfst.transducer_alphabet import TransducerAlphabet
+    from c_pyhfst.common import CompiledIndexTable, CompiledTransitionTable
+except:
+    from .transducer import Transducer
+    from .transducer_header import TransducerHeader
+    from .transducer_alphabet import TransducerAlphabet
+    from .common import CompiledIndexTable, CompiledTransitionTable
+
+FORMAT_VERSION = 2
+MAGIC = b"PYHFSTC\x00"
+SUFFIX = ".pyhfstc"
+ALIGNMENT = 64
+HEADER_SIZE = 56  # the optimized-lookup header, without the hfst3 header
+# magic, format version, byte order (0 little, 1 big), source size, source
+# modification time in nanoseconds, source crc32, payload crc32, metadata size,
+# and the crc32 of all the fields before it and of the metadata
+PREAMBLE = struct.Struct("<8sIB3xQQIIQI4x")
+CHECKED_PREAMBLE_SIZE = PREAMBLE.size - 8
+COLUMNS: List[Tuple[str, str]] = [
+    ("index_input_symbols", "H"),
+    ("index_targets", "I"),
+    ("transition_input_symbols", "H"),
+    ("transition_output_symbols", "H"),
+    ("transition_targets", "I"),
+    ("transition_weights", "f"),
+]
+
+
+def compiled_path(path: Union[str, Path]) -> Path:
+    """
+    Returns the path of the compiled file of a transducer.
+
+    :param path: The path to the transducer file.
+    :return: The path of its compiled file.
+    """
+    return Path(str(path) + SUFFIX)
+
+
+def _byte_order() -> int:
+    return 0 if sys.byteorder == "little" else 1
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _file_crc32(path: Union[str, Path]) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def compile_transducer(path: Union[str, Path], output: Optional[Union[str, Path]] = None) -> Path:
+    """
+    Writes the compiled file of a transducer.
+
+    The file is written under a temporary name and renamed into place, so
+    processes loading it concurrently never see a partial file.
+
+    :param path: The path to the transducer file.
+    :param output: The path of the compiled file. Defaults to the transducer path with SUFFIX appended.
+    :return: The path of the compiled file.
+    """
+    output = Path(output) if output is not None else compiled_path(path)
+    with open(path, "rb") as f:
+        data = f.read()
+        stat = os.fstat(f.fileno())
+    stream = io.BytesIO(data)
+    header = transducer_header.TransducerHeader(stream)
+    header_bytes = data[stream.tell() - HEADER_SIZE : stream.tell()]
+    alphabet = transducer_alphabet.TransducerAlphabet(stream, header.get_symbol_count())
+    index_table = common.IndexTable(stream, header.get_index_table_size())
+    transition_table = common.TransitionTable(
+        stream, header.get_target_table_size(), is_weighted=header.is_weighted()
+    )
+    arrays = [
+        index_table.ti_input_symbols,
+        index_table.ti_targets,
+        transition_table.ti_input_symbols,
+        transition_table.ti_output_symbols,
+        transition_table.ti_targets,
+        transition_table.ti_weights,
+    ]
+
+    columns: Dict[str, Tuple[int, int]] = {}
+    offset = 0
+    for (name, _), column in zip(COLUMNS, arrays):
+        offset = _align(offset)
+        columns[name] = (offset, len(column))
+        offset += len(column) * column.itemsize
+    metadata = json.dumps(
+        {"header": header_bytes.hex(), "symbols": alphabet.symbols, "columns": columns}
+    ).encode("utf-8")
+
+    payload = bytearray(metadata)
+    payload += bytes(_align(PREAMBLE.size + len(payload)) - PREAMBLE.size - len(payload))
+    data_start = len(payload)
+    for (name, _), column in zip(COLUMNS, arrays):
+        payload += bytes(data_start + columns[name][0] - len(payload))
+        payload += column.tobytes()
+
+    fields = (
+        MAGIC,
+        FORMAT_VERSION,
+        _byte_order(),
+        stat.st_size,
+        stat.st_mtime_ns,
+        zlib.crc32(data),
+        zlib.crc32(payload),
+        len(metadata),
+    )
+    checked = PREAMBLE.pack(*fields, 0)[:CHECKED_PREAMBLE_SIZE]
+    preamble = PREAMBLE.pack(*fields, zlib.crc32(metadata, zlib.crc32(checked)))
+    temporary = output.with_name(f"{output.name}.{os.getpid()}.tmp")
+    with open(temporary, "wb") as f:
+        f.write(preamble)
+        f.write(payload)
+    os.replace(temporary, output)
+    return output
+
+
+def is_fresh(path: Union[str, Path], source_size: int, source_mtime: int, source_crc: int) -> bool:
+    """
+    Checks whether a transducer file is the one a compiled file was made from.
+
+    The size and modification time are compared first. When only the time
+    differs, as it does after copying the files, the checksum decides.
+
+    :param path: The path to the transducer file.
+    :param source_size: The size recorded in the compiled file.
+    :param source_mtime: The modification time recorded in the compiled file, in nanoseconds.
+    :param source_crc: The checksum recorded in the compiled file.
+    :return: True if the compiled file is up to date.
+    """
+    stat = os.stat(path)
+    if stat.st_size != source_size:
+        return False
+    return stat.st_mtime_ns == source_mtime or _file_crc32(path) == source_crc
+
+
+def read_compiled(path: Union[str, Path], verify: bool = False) -> Optional[Transducer]:
+    """
+    Loads a transducer from its compiled file.
+
+    A compiled file is only used next to the transducer it was made from:
+    without the transducer file there is nothing to tell whether it is up to
+    date, so it is treated as stale. The preamble and the metadata are always
+    checked against their checksum and the columns against the length of the
+    file, which costs little. The checksum of the columns is not checked by
+    default, since that reads every page of the file and takes away the lazy
+    loading of the memory mapping.
+
+    :param path: The path to the transducer file, not the compiled file.
+    :param verify: Whether to also check the checksum of the columns.
+    :return: The transducer, or None if there is no usable compiled file: it is missing, stale,
+        truncated, corrupt, or was written by another format version or on a machine of another
+        byte order.
+    """
+    cache_path = compiled_path(path)
+    if not cache_path.exists():
+        return None
+    with open(cache_path, "rb") as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return None
+    if len(buffer) < PREAMBLE.size:
+        return None
+    (
+        magic,
+        version,
+        byte_order,
+        source_size,
+        source_mtime,
+        source_crc,
+        payload_crc,
+        metadata_size,
+        metadata_crc,
+    ) = PREAMBLE.unpack_from(buffer)
+    if magic != MAGIC or version != FORMAT_VERSION or byte_order != _byte_order():
+        return None
+    view = memoryview(buffer)
+    metadata_bytes = view[PREAMBLE.size : PREAMBLE.size + metadata_size]
+    if len(metadata_bytes) != metadata_size:
+        return None
+    if zlib.crc32(metadata_bytes, zlib.crc32(view[:CHECKED_PREAMBLE_SIZE])) != metadata_crc:
+        return None
+    if not os.path.exists(path) or not is_fresh(path, source_size, source_mtime, source_crc):
+        return None
+    if verify and zlib.crc32(view[PREAMBLE.size :]) != payload_crc:
+        return None
+
+    try:
+        metadata = json.loads(bytes(metadata_bytes))
+        data_start = _align(PREAMBLE.size + metadata_size)
+        columns = []
+        for name, typecode in COLUMNS:
+            offset, count = metadata["columns"][name]
+            start = data_start + offset
+            end = start + count * struct.calcsize(typecode)
+            if offset < 0 or count < 0 or end > len(buffer):
+                return None
+            columns.append(view[start:end].cast(typecode))
+        header = TransducerHeader(io.BytesIO(bytes.fromhex(metadata["header"])))
+        alphabet = TransducerAlphabet(None, header.get_symbol_count(), metadata["symbols"])
+    except (ValueError, KeyError, TypeError, IndexError, struct.error):
+        return None
+    index_table = CompiledIndexTable(columns[0], columns[1])
+    transition_table = CompiledTransitionTable(
+        columns[2], columns[3], columns[4], columns[5], is_weighted=header.is_weighted()
+    )
+    return Transducer(
+        None,
+        header,
+        alphabet,
+        is_weighted=header.is_weighted(),
+        index_table=index_table,
+        transition_table=transition_table,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compile HFST optimized-lookup transducers for fast loading with pyhfst."
+    )
+    parser.add_argument("transducers", nargs="+", help="the .hfstol files to compile")
+    args = parser.parse_args()
+    for path in args.transducers:
+        print(compile_transducer(path))
+
+
+if __name__ == "__main__":
+    main()
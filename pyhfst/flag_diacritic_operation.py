@@ -14,11 +14,20 @@ class FlagDiacriticOperator(Enum):
     U = 5
 
 
+# opcodes of pre-decoded flag diacritics, see compile_flag
+FLAG_SET = 0
+FLAG_REQUIRE = 1
+FLAG_DISALLOW = 2
+FLAG_UNIFY = 3
+
+
 class FlagDiacriticOperation:
     """
     Class representing a flag diacritic operation.
     """
 
+    __slots__ = ("op", "feature", "value")
+
     def __init__(self, operation: Optional[FlagDiacriticOperator] = None, feat: Optional[int] = None, val: Optional[int] = None):
         """
         Initializes the FlagDiacriticOperation instance.
@@ -44,3 +53,25 @@ class FlagDiacriticOperation:
         :return: True if the operation is a flag diacritic operation, False otherwise.
         """
         return self.feature != NO_SYMBOL_NUMBER
+
+
+def compile_flag(flag: FlagDiacriticOperation) -> Tuple[int, int, int]:
+    """
+    Pre-decodes a flag diacritic operation into an (opcode, feature, value)
+    tuple of ints. Positive set, negative set and clear all become FLAG_SET,
+    with the negated value for a negative set and 0 for a clear.
+
+    :param flag: The flag diacritic operation.
+    :return: The opcode, the feature index and the value of the operation.
+    """
+    if flag.op == FlagDiacriticOperator.P:
+        return FLAG_SET, flag.feature, flag.value
+    elif flag.op == FlagDiacriticOperator.N:
+        return FLAG_SET, flag.feature, -1 * flag.value
+    elif flag.op == FlagDiacriticOperator.R:
+        return FLAG_REQUIRE, flag.feature, flag.value
+    elif flag.op == FlagDiacriticOperator.D:
+        return FLAG_DISALLOW, flag.feature, flag.value
+    elif flag.op == FlagDiacriticOperator.C:
+        return FLAG_SET, flag.feature, 0
+    return FLAG_UNIFY, flag.feature, flag.value
@@ -0,0 +1,139 @@
+import multiprocessing
+import os
+from collections import deque
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from . import Analyses, Hfst, HfstInputStream, LookupCache, PersistentCache
+
+# the transducer of a worker process, set once by the pool initializer
+_worker_hfst: Optional[Hfst] = None
+
+
+def _init_worker(
+    source: Union[Hfst, str, Path], cache: Union[bool, LookupCache, PersistentCache], memory_map: bool
+) -> None:
+    global _worker_hfst
+    if isinstance(source, Hfst):
+        # inherited from the parent through fork, nothing was pickled
+        _worker_hfst = source
+    else:
+        _worker_hfst = HfstInputStream(source, cache=cache, memory_map=memory_map).read()
+
+
+def _lookup_chunk(tokens: List[str]) -> List[List[Tuple[str, float]]]:
+    return _worker_hfst.lookup_many(tokens)
+
+
+class ParallelHfst(object):
+    """
+    Looks up tokens in a pool of worker processes.
+
+    Where the platform supports forking, the transducer is loaded once in the
+    parent and inherited by the workers, so its tables are shared
+    copy-on-write (and share the page cache outright when memory-mapped).
+    Elsewhere each worker memory-maps the transducer file itself.
+    """
+
+    def __init__(
+        self,
+        source: Union[Hfst, str, Path],
+        workers: Optional[int] = None,
+        chunk_size: int = 1000,
+        cache: Union[bool, LookupCache, PersistentCache] = True,
+        memory_map: bool = True,
+    ) -> None:
+        """
+        Initialize a ParallelHfst object and start its worker processes.
+
+        :param source: The path to the transducer file, or an already loaded Hfst object.
+        :param workers: The number of worker processes. Defaults to the number of CPUs.
+        :param chunk_size: The number of tokens sent to a worker at a time.
+        :param cache: Whether the workers cache their results, or the cache to use.
+            A PersistentCache is shared by all workers, anything else is copied into each of them.
+        :param memory_map: Whether to memory-map the transducer file when loading it from a path.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+            if not isinstance(source, Hfst):
+                source = HfstInputStream(source, cache=cache, memory_map=memory_map).read()
+            self.hfst = source
+        elif isinstance(source, Hfst):
+            raise ValueError(
+                "Sharing a loaded Hfst object requires the fork start method, pass the transducer path instead"
+            )
+        else:
+            context = multiprocessing.get_context()
+            self.hfst = HfstInputStream(source, cache=cache, memory_map=memory_map).read()
+        self.pool = context.Pool(
+            self.workers, initializer=_init_worker, initargs=(source, cache, memory_map)
+        )
+
+    def __enter__(self) -> "ParallelHfst":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stop the worker processes.
+        """
+        self.pool.close()
+        self.pool.join()
+
+    def lookup(self, string: str) -> List[Tuple[str, float]]:
+        """
+        Perform lookup on a single input string in the calling process.
+
+        :param string: The input string to analyze.
+        :return: The analyses of the string, as returned by Hfst.lookup.
+        """
+        return self.hfst.lookup(string)
+
+    def lookup_many(self, tokens: Iterable[str]) -> List[List[Tuple[str, float]]]:
+        """
+        Perform lookup on a batch of input strings in the worker processes.
+
+        The batch is deduplicated and split into chunks of chunk_size tokens.
+
+        :param tokens: The input strings to analyze.
+        :return: The analyses of every token, in the same order as the input.
+        """
+        tokens = list(tokens)
+        unique = list(dict.fromkeys(tokens))
+        chunks = [unique[i : i + self.chunk_size] for i in range(0, len(unique), self.chunk_size)]
+        results: Dict[str, Analyses] = {}
+        for chunk, chunk_results in zip(chunks, self.pool.map(_lookup_chunk, chunks)):
+            results.update(zip(chunk, chunk_results))
+        return [Analyses.from_pairs(results[token], results[token].truncated) for token in tokens]
+
+    def lookup_many_iter(
+        self, tokens: Iterable[str], max_pending: Optional[int] = None
+    ) -> Iterator[Tuple[str, List[Tuple[str, float]]]]:
+        """
+        Perform lookup on a stream of input strings in the worker processes.
+
+        The input is consumed lazily and at most max_pending chunks are in
+        flight at a time, so memory use stays bounded on arbitrarily long streams.
+
+        :param tokens: The input strings to analyze.
+        :param max_pending: The maximum number of chunks submitted but not yet yielded. Defaults to twice the number of workers.
+        :return: An iterator of (token, analyses) pairs in the same order as the input.
+        """
+        max_pending = max_pending or 2 * self.workers
+        tokens = iter(tokens)
+        pending = deque()
+        while True:
+            while len(pending) < max_pending:
+                chunk = list(islice(tokens, self.chunk_size))
+                if not chunk:
+                    break
+                pending.append((chunk, self.pool.apply_async(_lookup_chunk, (chunk,))))
+            if not pending:
+                return
+            chunk, async_result = pending.popleft()
+            yield from zip(chunk, async_result.get())
@@ -0,0 +1,364 @@
+"""
+A lookup cache that outlives the process.
+
+Results are stored in an SQLite database, keyed by a checksum of the
+transducer file and the input string, so any number of processes can share
+one cache file and a changed transducer never serves old results. The cache
+can be filled ahead of time from a frequency list:
+
+    pyhfst-warm-cache analyser.hfstol cache.sqlite frequencies.txt --limit 100000
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Hashable, Iterable, Iterator, Optional, Tuple, Union
+
+from .cache import FormattedResult, LookupCache
+
+FREQUENCY_LIST_ORDERS = ("count-first", "token-first", "tokens")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transducers (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    checksum TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS analyses (
+    checksum TEXT NOT NULL,
+    input TEXT NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (checksum, input)
+) WITHOUT ROWID;
+"""
+
+
+def file_checksum(path: Union[str, Path]) -> str:
+    """
+    Computes the checksum that identifies a transducer file in the cache.
+
+    :param path: The path to the transducer file.
+    :return: The hexadecimal BLAKE2b digest of the file contents.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode(value: FormattedResult) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _decode(value: str) -> FormattedResult:
+    return tuple((analysis, weight) for analysis, weight in json.loads(value))
+
+
+class PersistentCache:
+    """
+    A cache of formatted lookup results stored in an SQLite database.
+
+    The database is opened in write-ahead logging mode, so readers in other
+    threads and processes are never blocked by a writer. Each thread and
+    each process uses its own connection, processes forked after the cache
+    was opened reconnect on first use. Entries are never evicted, the cache
+    holds whatever was looked up or warmed.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        transducer_path: Union[str, Path],
+        memory: Optional[LookupCache] = None,
+        timeout: float = 30.0,
+    ) -> None:
+        """
+        Initialize a PersistentCache object, creating the database if needed.
+
+        Entries stored for an earlier version of the transducer file are
+        deleted when the file is found to have changed.
+
+        :param path: The path to the database file.
+        :param transducer_path: The path to the transducer file whose results are cached.
+        :param memory: An in-memory cache consulted before the database, or None to always read the database.
+        :param timeout: How long to wait for a lock held by a writer in another process, in seconds.
+        """
+        self.path = str(path)
+        self.transducer_path = os.path.abspath(transducer_path)
+        self.memory = memory
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        self.checksum = self._register_transducer(connection)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_lock"], state["_local"]
+        if self.memory is not None:
+            state["memory"] = LookupCache(self.memory.max_entries, self.memory.max_bytes, self.memory.policy)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __len__(self) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM analyses WHERE checksum = ?", (self.checksum,)
+        ).fetchone()[0]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return (
+            self._connection().execute(
+                "SELECT 1 FROM analyses WHERE checksum = ? AND input = ?", (self.checksum, key)
+            ).fetchone()
+            is not None
+        )
+
+    # mapping access, as on the dict that Hfst.mem used to be; reads count
+    # as hits and misses like get
+    def __getitem__(self, key: Hashable) -> FormattedResult:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: FormattedResult) -> None:
+        self.put(key, value)
+
+    def __delitem__(self, key: Hashable) -> None:
+        if self.memory is not None:
+            try:
+                del self.memory[key]
+            except KeyError:
+                pass
+        cursor = self._connection().execute(
+            "DELETE FROM analyses WHERE checksum = ? AND input = ?", (self.checksum, key)
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        rows = self._connection().execute("SELECT input FROM analyses WHERE checksum = ?", (self.checksum,))
+        return (row[0] for row in rows.fetchall())
+
+    def _connection(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False
+            )
+            local.connection.execute("PRAGMA synchronous=NORMAL")
+            local.pid = os.getpid()
+        return local.connection
+
+    def _register_transducer(self, connection: sqlite3.Connection) -> str:
+        stat = os.stat(self.transducer_path)
+        row = connection.execute(
+            "SELECT size, mtime_ns, checksum FROM transducers WHERE path = ?", (self.transducer_path,)
+        ).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        checksum = file_checksum(self.transducer_path)
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO transducers VALUES (?, ?, ?, ?)",
+                (self.transducer_path, stat.st_size, stat.st_mtime_ns, checksum),
+            )
+            if row is not None and row[2] != checksum:
+                # the file changed: drop the results of the old version,
+                # unless another registered path still has that content
+                connection.execute(
+                    "DELETE FROM analyses WHERE checksum = ? "
+                    "AND NOT EXISTS (SELECT 1 FROM transducers WHERE checksum = ?)",
+                    (row[2], row[2]),
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return checksum
+
+    def get(self, key: Hashable) -> Optional[FormattedResult]:
+        """
+        Returns the cached results for the given key and records a hit or a miss.
+
+        :param key: The input string to look up.
+        :return: The cached results, or None if the key is not cached.
+        """
+        if self.memory is not None:
+            value = self.memory.get(key)
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                return value
+        row = self._connection().execute(
+            "SELECT result FROM analyses WHERE checksum = ? AND input = ?", (self.checksum, key)
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        value = _decode(row[0])
+        if self.memory is not None:
+            self.memory.put(key, value)
+        return value
+
+    def put(self, key: Hashable, value: FormattedResult) -> None:
+        """
+        Caches the results for the given key.
+
+        :param key: The input string to cache the results under.
+        :param value: The formatted results.
+        """
+        if self.memory is not None:
+            self.memory.put(key, value)
+        self._connection().execute(
+            "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?)", (self.checksum, key, _encode(value))
+        )
+
+    def put_many(self, items: Iterable[Tuple[Hashable, FormattedResult]]) -> None:
+        """
+        Caches the results of many keys in a single transaction.
+
+        :param items: The (input string, formatted results) pairs to cache.
+        """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?)",
+                ((self.checksum, key, _encode(value)) for key, value in items),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def clear(self) -> None:
+        """
+        Removes all entries of this transducer from the cache. The counters are kept.
+        """
+        if self.memory is not None:
+            self.memory.clear()
+        self._connection().execute("DELETE FROM analyses WHERE checksum = ?", (self.checksum,))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the cache counters.
+
+        :return: A dictionary with the hits and misses of this process and the number of entries in the database.
+        """
+        with self._lock:
+            stats = {"hits": self.hits, "misses": self.misses}
+        stats["entries"] = len(self)
+        return stats
+
+
+def read_frequency_list(
+    path: Union[str, Path], limit: Optional[int] = None, order: str = "count-first"
+) -> Iterator[str]:
+    """
+    Reads the tokens of a frequency list, most frequent first.
+
+    Each line holds a count and a token separated by whitespace, as written
+    by `sort | uniq -c | sort -rn`, or the other way around, as written by
+    most word counting tools, or the token alone. The order is given rather
+    than guessed from each line, so tokens that are numbers are read as
+    tokens. The lines are expected to be sorted.
+
+    :param path: The path to the frequency list.
+    :param limit: The number of tokens to read, or None to read them all.
+    :param order: One of FREQUENCY_LIST_ORDERS: "count-first", "token-first" or "tokens" for lines
+        without a count.
+    :return: An iterator of tokens.
+    """
+    if order not in FREQUENCY_LIST_ORDERS:
+        raise ValueError(f"Unknown frequency list order {order!r}, expected one of {FREQUENCY_LIST_ORDERS}")
+
+    def tokens(f: Iterable[str]) -> Iterator[str]:
+        for number, line in enumerate(f, 1):
+            fields = line.split()
+            if not fields:
+                continue
+            if order == "tokens":
+                valid = len(fields) == 1
+            else:
+                count = fields[0] if order == "count-first" else fields[-1]
+                valid = len(fields) == 2 and count.isdigit()
+            if not valid:
+                raise ValueError(f"{path}: line {number} of the frequency list does not match the order {order!r}")
+            yield fields[-1] if order == "count-first" else fields[0]
+
+    with open(path, encoding="utf-8") as f:
+        yield from islice(tokens(f), limit)
+
+
+def warm(cache: PersistentCache, hfst: Any, tokens: Iterable[str], batch_size: int = 1000) -> int:
+    """
+    Looks up the tokens that are not cached yet and stores their results.
+    Tokens whose analysis stopped at one of the limits of the Hfst object
+    are left out, as lookup does not cache them either.
+
+    :param cache: The cache to fill.
+    :param hfst: The Hfst object to analyse the tokens with.
+    :param tokens: The tokens to cache.
+    :param batch_size: The number of tokens stored per transaction.
+    :return: The number of tokens added to the cache.
+    """
+    added = 0
+    tokens = iter(tokens)
+    while True:
+        batch = list(islice(tokens, batch_size))
+        if not batch:
+            return added
+        results = []
+        for token in dict.fromkeys(batch):
+            if token not in cache:
+                result, truncated = hfst.analyze_within_limits(token)
+                if not truncated:
+                    results.append((token, result))
+        cache.put_many(results)
+        added += len(results)
+
+
+def main() -> None:
+    from . import HfstInputStream
+
+    parser = argparse.ArgumentParser(
+        description="Fill a persistent pyhfst lookup cache with the analyses of the most frequent tokens."
+    )
+    parser.add_argument("transducer", help="the .hfstol file")
+    parser.add_argument("cache", help="the cache database, created if it does not exist")
+    parser.add_argument("frequency_list", help="a frequency list, one token per line, most frequent first")
+    parser.add_argument("--limit", type=int, default=None, help="the number of tokens to cache")
+    parser.add_argument(
+        "--order",
+        choices=FREQUENCY_LIST_ORDERS,
+        default="count-first",
+        help="the order of the columns of the frequency list, or tokens for a list without counts",
+    )
+    args = parser.parse_args()
+
+    hfst = HfstInputStream(args.transducer, cache=False).read()
+    cache = PersistentCache(args.cache, args.transducer)
+    added = warm(cache, hfst, read_frequency_list(args.frequency_list, args.limit, args.order))
+    print(f"added {added} tokens, {len(cache)} cached")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""
+Precomputed analyses of frequent tokens.
+
+Most tokens of running text are a few thousand frequent word forms. Their
+analyses can be computed once, offline, and shipped next to the transducer
+as a static table that is memory-mapped at load time:
+
+    pyhfst-precompute analyser.hfstol frequencies.txt --limit 100000
+
+writes analyser.hfstol.pyhfstp, which HfstInputStream picks up whenever it
+is up to date with the transducer. Hfst.lookup serves the tokens in the
+table from it without walking the transducer or filling the cache.
+
+The file is a sorted string table: a fixed preamble, a JSON metadata block
+and native arrays aligned to ALIGNMENT bytes. The tokens are stored in
+UTF-8 byte order with the range of their analyses, the analyses as UTF-8
+strings with their weights, and an open-addressing hash table of CRC-32
+hashes finds a token in one or two probes. Tokens without analyses are
+stored too, so they are answered from the table as well.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .cache import FormattedResult
+from .compiled import _align, _byte_order, _file_crc32, is_fresh
+from .persistent_cache import FREQUENCY_LIST_ORDERS, read_frequency_list
+
+FORMAT_VERSION = 2
+MAGIC = b"PYHFSTP\x00"
+SUFFIX = ".pyhfstp"
+# magic, format version, byte order (0 little, 1 big), source size, source
+# modification time in nanoseconds, source crc32, payload crc32, metadata size,
+# and the crc32 of all the fields before it and of the metadata
+PREAMBLE = struct.Struct("<8sIB3xQQIIQI4x")
+CHECKED_PREAMBLE_SIZE = PREAMBLE.size - 8
+COLUMNS: List[Tuple[str, str]] = [
+    ("weights", "d"),
+    ("token_offsets", "I"),
+    ("analysis_ranges", "I"),
+    ("analysis_offsets", "I"),
+    ("slots", "I"),
+    ("tokens", "B"),
+    ("analyses", "B"),
+]
+
+
+def precomputed_path(path: Union[str, Path]) -> Path:
+    """
+    Returns the path of the precomputed analyses of a transducer.
+
+    :param path: The path to the transducer file.
+    :return: The path of its precomputed analyses.
+    """
+    return Path(str(path) + SUFFIX)
+
+
+def _slot_count(count: int) -> int:
+    # a power of two, at most two thirds full
+    slots = 1
+    while slots * 2 < count * 3:
+        slots *= 2
+    return slots
+
+
+def write_precomputed(
+    analyses: Iterable[Tuple[str, FormattedResult]],
+    output: Union[str, Path],
+    source: Optional[Union[str, Path]] = None,
+) -> Path:
+    """
+    Writes a table of precomputed analyses.
+
+    The file is written under a temporary name and renamed into place, so
+    processes loading it concurrently never see a partial file.
+
+    :param analyses: The (token, analyses) pairs to store. Repeated tokens are stored once.
+    :param output: The path of the file to write.
+    :param source: The transducer the analyses come from. The table is only used with that transducer file,
+        read_precomputed treats a table written without one as stale.
+    :return: The path of the file.
+    """
+    output = Path(output)
+    entries = sorted(
+        {token.encode("utf-8"): result for token, result in analyses}.items()
+    )
+    weights = array("d")
+    token_offsets = array("I", [0])
+    analysis_ranges = array("I", [0])
+    analysis_offsets = array("I", [0])
+    tokens = bytearray()
+    strings = bytearray()
+    for token, result in entries:
+        tokens += token
+        token_offsets.append(len(tokens))
+        for analysis, weight in result:
+            strings += analysis.encode("utf-8")
+            analysis_offsets.append(len(strings))
+            weights.append(weight)
+        analysis_ranges.append(len(weights))
+    slots = array("I", bytes(4 * _slot_count(len(entries))))
+    mask = len(slots) - 1
+    for i, (token, _) in enumerate(entries):
+        slot = zlib.crc32(token) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = i + 1
+    arrays = [weights, token_offsets, analysis_ranges, analysis_offsets, slots, tokens, strings]
+
+    columns: Dict[str, Tuple[int, int]] = {}
+    offset = 0
+    for (name, typecode), column in zip(COLUMNS, arrays):
+        offset = _align(offset)
+        columns[name] = (offset, len(column))
+        offset += len(column) * struct.calcsize(typecode)
+    metadata = json.dumps({"count": len(entries), "columns": columns}).encode("utf-8")
+
+    payload = bytearray(metadata)
+    payload += bytes(_align(PREAMBLE.size + len(payload)) - PREAMBLE.size - len(payload))
+    data_start = len(payload)
+    for (name, _), column in zip(COLUMNS, arrays):
+        payload += bytes(data_start + columns[name][0] - len(payload))
+        payload += column if isinstance(column, bytearray) else column.tobytes()
+
+    if source is not None:
+        stat = os.stat(source)
+        source_info = (stat.st_size, stat.st_mtime_ns, _file_crc32(source))
+    else:
+        source_info = (0, 0, 0)
+    fields = (MAGIC, FORMAT_VERSION, _byte_order(), *source_info, zlib.crc32(payload), len(metadata))
+    checked = PREAMBLE.pack(*fields, 0)[:CHECKED_PREAMBLE_SIZE]
+    preamble = PREAMBLE.pack(*fields, zlib.crc32(metadata, zlib.crc32(checked)))
+    temporary = output.with_name(f"{output.name}.{os.getpid()}.tmp")
+    with open(temporary, "wb") as f:
+        f.write(preamble)
+        f.write(payload)
+    os.replace(temporary, output)
+    return output
+
+
+class PrecomputedAnalyses(object):
+    """
+    A read-only table of precomputed analyses, usually memory-mapped from a file.
+    """
+
+    def __init__(self, buffer: Any, verify: bool = False) -> None:
+        """
+        Initialize a PrecomputedAnalyses object.
+
+        The preamble and the metadata are always checked against their
+        checksum and the columns against the length of the buffer. The
+        checksum of the columns is not checked by default, for the same
+        reason as in read_compiled: it reads every page of a memory mapping.
+
+        :param buffer: The contents of a file written by write_precomputed, e.g. a memory mapping of it.
+        :param verify: Whether to also check the checksum of the columns.
+        """
+        if len(buffer) < PREAMBLE.size:
+            raise ValueError("Not a table of precomputed analyses")
+        magic, version, byte_order, _, _, _, payload_crc, metadata_size, metadata_crc = PREAMBLE.unpack_from(buffer)
+        if magic != MAGIC or version != FORMAT_VERSION or byte_order != _byte_order():
+            raise ValueError("Not a table of precomputed analyses of this format version and byte order")
+        view = memoryview(buffer)
+        metadata_bytes = view[PREAMBLE.size : PREAMBLE.size + metadata_size]
+        if len(metadata_bytes) != metadata_size:
+            raise ValueError("The table of precomputed analyses is truncated")
+        if zlib.crc32(metadata_bytes, zlib.crc32(view[:CHECKED_PREAMBLE_SIZE])) != metadata_crc:
+            raise ValueError("The table of precomputed analyses is corrupt")
+        if verify and zlib.crc32(view[PREAMBLE.size :]) != payload_crc:
+            raise ValueError("The table of precomputed analyses is corrupt")
+        try:
+            metadata = json.loads(bytes(metadata_bytes))
+            data_start = _align(PREAMBLE.size + metadata_size)
+            columns = {}
+            for name, typecode in COLUMNS:
+                offset, count = metadata["columns"][name]
+                start = data_start + offset
+                end = start + count * struct.calcsize(typecode)
+                if offset < 0 or count < 0 or end > len(buffer):
+                    raise ValueError("The table of precomputed analyses is truncated")
+                # byte strings are sliced from the buffer itself, which returns bytes for mmap and bytes objects
+                columns[name] = (start, end) if typecode == "B" else view[start:end].cast(typecode)
+            count = metadata["count"]
+        except (KeyError, TypeError) as e:
+            raise ValueError("The table of precomputed analyses is corrupt") from e
+        if len(columns["token_offsets"]) != count + 1 or len(columns["analysis_ranges"]) != count + 1:
+            raise ValueError("The table of precomputed analyses is corrupt")
+        self.buffer = buffer
+        self.count = count
+        self.weights = columns["weights"]
+        self.token_offsets = columns["token_offsets"]
+        self.analysis_ranges = columns["analysis_ranges"]
+        self.analysis_offsets = columns["analysis_offsets"]
+        self.slots = columns["slots"]
+        self.mask = len(self.slots) - 1
+        self.tokens_start = columns["tokens"][0]
+        self.analyses_start = columns["analyses"][0]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, token: str) -> bool:
+        return self.find(token.encode("utf-8")) >= 0
+
+    def find(self, token: bytes) -> int:
+        """
+        Finds the position of a token in the table.
+
+        :param token: The token, encoded in UTF-8.
+        :return: Its position, or -1 if it is not in the table.
+        """
+        buffer, slots, mask = self.buffer, self.slots, self.mask
+        offsets, start = self.token_offsets, self.tokens_start
+        slot = zlib.crc32(token) & mask
+        while True:
+            i = slots[slot]
+            if not i:
+                return -1
+            i -= 1
+            if buffer[start + offsets[i] : start + offsets[i + 1]] == token:
+                return i
+            slot = (slot + 1) & mask
+
+    def get(self, token: str) -> Optional[FormattedResult]:
+        """
+        Returns the precomputed analyses of a token.
+
+        :param token: The input string.
+        :return: A tuple of (analysis, weight) pairs, or None if the token is not in the table.
+        """
+        i = self.find(token.encode("utf-8"))
+        if i < 0:
+            return None
+        buffer, offsets, weights, start = self.buffer, self.analysis_offsets, self.weights, self.analyses_start
+        return tuple(
+            (str(buffer[start + offsets[j] : start + offsets[j + 1]], "utf-8"), weights[j])
+            for j in range(self.analysis_ranges[i], self.analysis_ranges[i + 1])
+        )
+
+    def items(self) -> Iterator[Tuple[str, FormattedResult]]:
+        """
+        Iterates over the table in UTF-8 byte order of the tokens.
+
+        :return: An iterator of (token, analyses) pairs.
+        """
+        buffer, offsets, start = self.buffer, self.token_offsets, self.tokens_start
+        for i in range(self.count):
+            token = str(buffer[start + offsets[i] : start + offsets[i + 1]], "utf-8")
+            yield token, self.get(token)
+
+
+def read_precomputed(
+    path: Union[str, Path], transducer: Union[str, Path], verify: bool = False
+) -> Optional[PrecomputedAnalyses]:
+    """
+    Memory-maps a table of precomputed analyses.
+
+    As with compiled files, a table is only used next to the transducer it
+    was built from: when the transducer file is missing or the table does
+    not record one, it is treated as stale. See PrecomputedAnalyses for what
+    is checked without verify.
+
+    :param path: The path of the table.
+    :param transducer: The path to the transducer file it is used with.
+    :param verify: Whether to also check the checksum of the columns of the table.
+    :return: The table, or None if it is missing, empty, truncated, corrupt, was written by another format
+        version or on a machine of another byte order, or is stale with respect to the transducer.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return None
+    try:
+        table = PrecomputedAnalyses(buffer, verify=verify)
+    except ValueError:
+        return None
+    _, _, _, source_size, source_mtime, source_crc, _, _, _ = PREAMBLE.unpack_from(buffer)
+    if (
+        not source_size
+        or not os.path.exists(transducer)
+        or not is_fresh(transducer, source_size, source_mtime, source_crc)
+    ):
+        return None
+    return table
+
+
+def precompute(
+    path: Union[str, Path],
+    tokens: Iterable[str],
+    output: Optional[Union[str, Path]] = None,
+) -> Path:
+    """
+    Analyses tokens with a transducer and writes their analyses next to it.
+
+    :param path: The path to the transducer file.
+    :param tokens: The tokens to store, usually the most frequent ones.
+    :param output: The path of the table. Defaults to the transducer path with SUFFIX appended.
+    :return: The path of the table.
+    """
+    from . import HfstInputStream
+
+    hfst = HfstInputStream(path, cache=False, precomputed=False).read()
+
+    def analyses() -> Iterator[Tuple[str, FormattedResult]]:
+        for token in tokens:
+            result, truncated = hfst.analyze_within_limits(token)
+            if not truncated:
+                yield token, result
+
+    return write_precomputed(analyses(), output if output is not None else precomputed_path(path), source=path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Precompute the analyses of the most frequent tokens into a table shipped with the transducer."
+    )
+    parser.add_argument("transducer", help="the .hfstol file")
+    parser.add_argument("frequency_list", help="a frequency list, one token per line, most frequent first")
+    parser.add_argument("--limit", type=int, default=None, help="the number of tokens to precompute")
+    parser.add_argument("--output", default=None, help="the table to write, next to the transducer by default")
+    parser.add_argument(
+        "--order",
+        choices=FREQUENCY_LIST_ORDERS,
+        default="count-first",
+        help="the order of the columns of the frequency list, or tokens for a list without counts",
+    )
+    args = parser.parse_args()
+
+    output = precompute(args.transducer, read_frequency_list(args.frequency_list, args.limit, args.order), args.output)
+    print(f"{output}: {len(read_precomputed(output, args.transducer))} tokens")
+
+
+if __name__ == "__main__":
+    main()
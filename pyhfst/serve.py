@@ -0,0 +1,517 @@
+"""
+An analysis server for processes that should not each load the transducer.
+
+The server loads the transducer once, memory-mapped, and forks a number of
+worker processes that share its tables copy-on-write and accept connections
+on the same socket. Results are cached in a PersistentCache that all workers
+share. It listens on localhost or on a Unix socket:
+
+    python -m pyhfst.serve analyser.hfstol --port 8765 --workers 4
+    python -m pyhfst.serve analyser.hfstol --unix /run/pyhfst.sock --cache cache.sqlite
+
+Endpoints:
+
+    POST /lookup    {"tokens": ["voi", "kissa"]}  ->  {"analyses": [[["voi+N", 0.0]], ...], "truncated": [false, ...]}
+    GET  /lookup?token=voi                         ->  {"analyses": [[["voi+N", 0.0]]], "truncated": [false]}
+    GET  /metrics   counters of all workers, in the Prometheus text format
+    GET  /health
+
+HfstClient talks to a server with the same lookup methods as Hfst.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import stat
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from socketserver import ThreadingMixIn
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+from . import Analyses, Hfst, HfstInputStream, LookupCache, PersistentCache
+
+MAX_REQUEST_SIZE = 16 << 20
+BACKLOG = 128
+
+
+class Metrics(object):
+    """
+    Request counters in memory shared by all workers, one row per worker.
+    """
+
+    FIELDS = ("requests", "tokens", "errors", "seconds", "hits", "misses", "rejected", "truncated")
+
+    def __init__(self, workers: int) -> None:
+        """
+        Initialize a Metrics object. It has to be created before the workers are forked.
+
+        :param workers: The number of workers.
+        """
+        self.workers = workers
+        self.values = multiprocessing.RawArray("d", workers * len(self.FIELDS))
+        self.started = time.time()
+        # the row of the current worker and the cache counters of its Hfst object when they were last
+        # added to it, written under the lock by its threads only
+        self.row = 0
+        self.counters = (0, 0, 0, 0)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _counters(hfst: Hfst) -> Tuple[int, int, int, int]:
+        return hfst.mem.hits, hfst.mem.misses, hfst.rejected, hfst.truncated
+
+    def bind(self, row: int, hfst: Hfst) -> None:
+        """
+        Makes the current process the worker of a row. The counters the Hfst
+        object already holds, inherited from the parent, are not added to it.
+
+        :param row: The row of the worker.
+        :param hfst: The Hfst object of the worker.
+        """
+        with self.lock:
+            self.row = row
+            self.counters = self._counters(hfst)
+
+    def record(self, hfst: Hfst, tokens: int, seconds: float, error: bool = False) -> None:
+        """
+        Records a request served by the current worker.
+
+        The cache counters of the Hfst object are added to the row of the
+        worker as the change since the last request, so a replacement worker
+        adds to the counts of the worker it replaces. Only the counters are
+        read, not Hfst.stats(), which counts the entries of the cache: a whole
+        table scan for a PersistentCache. The entries are counted when
+        /metrics is served.
+
+        :param hfst: The Hfst object of the worker, whose cache counters are added.
+        :param tokens: The number of tokens looked up.
+        :param seconds: The time the lookup took.
+        :param error: Whether the request failed.
+        """
+        base = self.row * len(self.FIELDS)
+        with self.lock:
+            counters = self._counters(hfst)
+            self.values[base] += 1
+            self.values[base + 1] += tokens
+            self.values[base + 2] += error
+            self.values[base + 3] += seconds
+            for i, (current, last) in enumerate(zip(counters, self.counters)):
+                self.values[base + 4 + i] += current - last
+            self.counters = counters
+
+    def totals(self) -> Dict[str, float]:
+        """
+        Returns the counters summed over all workers.
+
+        :return: A dictionary of the counters in FIELDS.
+        """
+        n = len(self.FIELDS)
+        return {
+            field: sum(self.values[row * n + i] for row in range(self.workers))
+            for i, field in enumerate(self.FIELDS)
+        }
+
+    def render(self, cache_entries: Optional[int] = None) -> str:
+        """
+        Formats the counters in the Prometheus text format.
+
+        :param cache_entries: The number of entries in the shared cache, if there is one.
+        :return: The formatted counters.
+        """
+        totals = self.totals()
+        lines = [
+            f"pyhfst_workers {self.workers}",
+            f"pyhfst_uptime_seconds {time.time() - self.started:.3f}",
+            f"pyhfst_requests_total {totals['requests']:.0f}",
+            f"pyhfst_request_errors_total {totals['errors']:.0f}",
+            f"pyhfst_tokens_total {totals['tokens']:.0f}",
+            f"pyhfst_lookup_seconds_total {totals['seconds']:.6f}",
+            f"pyhfst_cache_hits_total {totals['hits']:.0f}",
+            f"pyhfst_cache_misses_total {totals['misses']:.0f}",
+            f"pyhfst_rejected_total {totals['rejected']:.0f}",
+            f"pyhfst_truncated_total {totals['truncated']:.0f}",
+        ]
+        if cache_entries is not None:
+            lines.append(f"pyhfst_cache_entries {cache_entries}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "AnalysisServer"
+
+    def setup(self) -> None:
+        # the headers and the body are written separately, don't let the body wait for an ACK
+        self.disable_nagle_algorithm = self.server.address_family != socket.AF_UNIX
+        super().setup()
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def send(self, status: int, body: Union[bytes, str, dict], content_type: str = "application/json") -> None:
+        if isinstance(body, dict):
+            body = json.dumps(body, ensure_ascii=False)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def lookup(self, tokens: List[str]) -> None:
+        if not isinstance(tokens, list) or not all(isinstance(token, str) for token in tokens):
+            self.send(400, {"error": "tokens must be a list of strings"})
+            return
+        hfst, metrics = self.server.hfst, self.server.metrics
+        start = time.perf_counter()
+        try:
+            analyses = hfst.lookup_many(tokens)
+        except Exception as e:
+            metrics.record(hfst, len(tokens), time.perf_counter() - start, error=True)
+            self.send(500, {"error": str(e)})
+            return
+        metrics.record(hfst, len(tokens), time.perf_counter() - start)
+        self.send(200, {"analyses": analyses, "truncated": [result.truncated for result in analyses]})
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == "/lookup":
+            tokens = parse_qs(url.query).get("token")
+            if tokens is None:
+                self.send(400, {"error": "missing token parameter"})
+                return
+            self.lookup(tokens)
+        elif url.path == "/metrics":
+            cache = self.server.hfst.mem
+            entries = len(cache) if isinstance(cache, PersistentCache) else None
+            self.send(200, self.server.metrics.render(entries), "text/plain; version=0.0.4")
+        elif url.path == "/health":
+            self.send(200, "ok\n", "text/plain")
+        else:
+            self.send(404, {"error": f"unknown path {url.path}"})
+
+    def do_POST(self) -> None:
+        if urlsplit(self.path).path != "/lookup":
+            self.send(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            # the end of the body is unknown, so is the start of the next request
+            self.close_connection = True
+            self.send(400, {"error": "invalid Content-Length"})
+            return
+        if length > MAX_REQUEST_SIZE:
+            self.close_connection = True
+            self.send(413, {"error": f"requests are limited to {MAX_REQUEST_SIZE} bytes"})
+            return
+        try:
+            tokens = json.loads(self.rfile.read(length))["tokens"]
+        except (ValueError, KeyError, TypeError):
+            self.send(400, {"error": 'expected a JSON object {"tokens": [...]}'})
+            return
+        self.lookup(tokens)
+
+
+class AnalysisServer(ThreadingMixIn, HTTPServer):
+    """
+    The HTTP server of a worker process, accepting connections on a socket inherited from the parent.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, listener: socket.socket, hfst: Hfst, metrics: Metrics) -> None:
+        """
+        Initialize an AnalysisServer object.
+
+        :param listener: The listening socket shared by all workers.
+        :param hfst: The Hfst object to look tokens up with.
+        :param metrics: The shared counters.
+        """
+        self.address_family = listener.family
+        HTTPServer.__init__(self, listener.getsockname(), RequestHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = listener
+        self.hfst = hfst
+        self.metrics = metrics
+
+
+def listen(host: str = "127.0.0.1", port: int = 8765, unix: Optional[Union[str, Path]] = None) -> socket.socket:
+    """
+    Creates the listening socket of the server.
+
+    :param host: The address to listen on.
+    :param port: The TCP port to listen on.
+    :param unix: The path of a Unix socket to listen on instead. A stale socket file is replaced.
+    :return: The listening socket.
+    """
+    if unix is None:
+        return socket.create_server((host, port), backlog=BACKLOG)
+    unix = str(unix)
+    if os.path.exists(unix) and stat.S_ISSOCK(os.stat(unix).st_mode):
+        os.unlink(unix)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(unix)
+    listener.listen(BACKLOG)
+    return listener
+
+
+def _run_worker(listener: socket.socket, hfst: Hfst, metrics: Metrics, row: int) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    metrics.bind(row, hfst)
+    AnalysisServer(listener, hfst, metrics).serve_forever()
+
+
+def serve(
+    transducer: Union[str, Path],
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    unix: Optional[Union[str, Path]] = None,
+    workers: Optional[int] = None,
+    cache: Optional[Union[str, Path]] = None,
+    cache_size: int = 100000,
+    max_results: Optional[int] = None,
+    max_steps: Optional[int] = None,
+    max_epsilon_depth: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> None:
+    """
+    Runs an analysis server until it receives SIGINT or SIGTERM.
+
+    Workers that die are replaced.
+
+    :param transducer: The path to the transducer file.
+    :param host: The address to listen on.
+    :param port: The TCP port to listen on.
+    :param unix: The path of a Unix socket to listen on instead, removed on exit.
+    :param workers: The number of worker processes. Defaults to the number of CPUs.
+    :param cache: The path of the PersistentCache database shared by the workers. Defaults to a temporary
+        database removed on exit.
+    :param cache_size: The number of entries of the in-memory cache each worker keeps in front of the
+        database, 0 for none.
+    :param max_results: The limit of the same name of the Hfst object, see Hfst.
+    :param max_steps: The limit of the same name of the Hfst object, see Hfst.
+    :param max_epsilon_depth: The limit of the same name of the Hfst object, see Hfst.
+    :param timeout: The limit of the same name of the Hfst object, see Hfst. Results cut off by a limit
+        are marked as truncated in the responses.
+    """
+    workers = workers or os.cpu_count() or 1
+    temporary = None
+    if cache is None:
+        temporary = tempfile.TemporaryDirectory(prefix="pyhfst-")
+        cache = os.path.join(temporary.name, "cache.sqlite")
+    memory = LookupCache(max_entries=cache_size) if cache_size > 0 else None
+    hfst = HfstInputStream(
+        transducer, cache=PersistentCache(cache, transducer, memory=memory), memory_map=True
+    ).read()
+    hfst.max_results = max_results
+    hfst.max_steps = max_steps
+    hfst.max_epsilon_depth = max_epsilon_depth
+    hfst.timeout = timeout
+    metrics = Metrics(workers)
+    listener = listen(host, port, unix)
+
+    children: Dict[int, int] = {}
+
+    def fork(row: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(listener, hfst, metrics, row)
+            finally:
+                os._exit(1)
+        children[pid] = row
+
+    stopping = False
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    previous = {sig: signal.signal(sig, stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        for row in range(workers):
+            fork(row)
+        while children:
+            try:
+                pid, _ = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            row = children.pop(pid, None)
+            if row is not None and not stopping:
+                fork(row)
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+        listener.close()
+        if unix is not None and os.path.exists(unix):
+            os.unlink(unix)
+        if temporary is not None:
+            temporary.cleanup()
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class HfstClient(object):
+    """
+    A client of an analysis server with the lookup methods of Hfst.
+
+    Each thread keeps its own connection open between requests.
+    """
+
+    def __init__(self, address: Union[str, Path], timeout: float = 30.0) -> None:
+        """
+        Initialize an HfstClient object.
+
+        :param address: "http://host:port" for a server listening on TCP, or the path of its Unix socket.
+        :param timeout: How long to wait for a response, in seconds.
+        """
+        address = str(address)
+        self.address = address
+        self.timeout = timeout
+        if address.startswith("http://"):
+            url = urlsplit(address)
+            self.host, self.port, self.unix = url.hostname, url.port or 80, None
+        else:
+            self.host, self.port, self.unix = None, None, address
+        self.local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            if self.unix is not None:
+                connection = UnixHTTPConnection(self.unix, self.timeout)
+            else:
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.local.connection = connection
+        return connection
+
+    def _request(self, method: str, path: str, body: Optional[bytes] = None) -> Tuple[int, bytes]:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        retry = True
+        while True:
+            connection = self._connection()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (ConnectionError, http.client.CannotSendRequest):
+                # the server may have closed an idle connection, reconnect once
+                connection.close()
+                self.local.connection = None
+                if not retry:
+                    raise
+                retry = False
+
+    def lookup(self, string: str) -> Analyses:
+        """
+        Perform lookup on the input string on the server.
+
+        :param string: The input string to analyze.
+        :return: The analyses of the string, as returned by Hfst.lookup, marked as truncated if the server
+            stopped at a limit.
+        """
+        return self.lookup_many([string])[0]
+
+    def lookup_many(self, tokens: Iterable[str]) -> List[Analyses]:
+        """
+        Perform lookup on a batch of input strings on the server.
+
+        :param tokens: The input strings to analyze.
+        :return: The analyses of every token, in the same order as the input, as returned by Hfst.lookup_many.
+        """
+        body = json.dumps({"tokens": list(tokens)}, ensure_ascii=False).encode("utf-8")
+        status, data = self._request("POST", "/lookup", body)
+        if status != 200:
+            raise RuntimeError(f"Analysis server returned {status}: {data.decode('utf-8', 'replace')}")
+        response = json.loads(data)
+        truncated = response.get("truncated") or [False] * len(response["analyses"])
+        return [Analyses.from_pairs(pairs, flag) for pairs, flag in zip(response["analyses"], truncated)]
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the counters of the server.
+
+        :return: The metrics of all workers, keyed by metric name without the pyhfst_ prefix.
+        """
+        status, data = self._request("GET", "/metrics")
+        if status != 200:
+            raise RuntimeError(f"Analysis server returned {status}: {data.decode('utf-8', 'replace')}")
+        stats = {}
+        for line in data.decode("utf-8").splitlines():
+            name, value = line.split()
+            stats[name[len("pyhfst_"):]] = float(value)
+        return stats
+
+    def close(self) -> None:
+        """
+        Close the connection of the calling thread.
+        """
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve lookups of an HFST optimized-lookup transducer.")
+    parser.add_argument("transducer", help="the .hfstol file")
+    parser.add_argument("--host", default="127.0.0.1", help="the address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="the TCP port to listen on")
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="the number of worker processes")
+    parser.add_argument("--cache", help="the shared cache database, a temporary one if not given")
+    parser.add_argument(
+        "--cache-size", type=int, default=100000, help="entries of the in-memory cache of each worker"
+    )
+    parser.add_argument("--max-results", type=int, default=None, help="the maximum number of analyses of a token")
+    parser.add_argument("--max-steps", type=int, default=None, help="the maximum number of states visited per token")
+    parser.add_argument(
+        "--max-epsilon-depth", type=int, default=None, help="the maximum number of epsilon transitions in a row"
+    )
+    parser.add_argument("--timeout", type=float, default=None, help="the maximum time spent on a token, in seconds")
+    args = parser.parse_args(argv)
+    serve(
+        args.transducer,
+        host=args.host,
+        port=args.port,
+        unix=args.unix,
+        workers=args.workers,
+        cache=args.cache,
+        cache_size=args.cache_size,
+        max_results=args.max_results,
+        max_steps=args.max_steps,
+        max_epsilon_depth=args.max_epsilon_depth,
+        timeout=args.timeout,
+    )
+
+
+if __name__ == "__main__":
+    main()
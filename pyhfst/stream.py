@@ -0,0 +1,192 @@
+"""
+Streaming analysis of large corpora.
+
+Tokens are read one per line, looked up batch by batch and written out in
+input order, either in the tab-separated format of hfst-lookup or as JSON
+lines. Every stage is a generator, so memory use does not depend on the
+size of the input:
+
+    cat tokens.txt | pyhfst-lookup analyser.hfstol > analyses.tsv
+    pyhfst-lookup analyser.hfstol corpus-*.txt --format jsonl --workers 8 > analyses.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+from . import Hfst, HfstInputStream, LookupCache, ParallelHfst
+
+FORMATS = ("tsv", "jsonl")
+AnalysisPairs = List[Tuple[str, float]]
+
+
+def read_tokens(files: Iterable[TextIO]) -> Iterator[str]:
+    """
+    Reads tokens, one per line, from a sequence of text files. Empty lines are skipped.
+
+    :param files: The files to read, in order.
+    :return: An iterator of tokens.
+    """
+    for f in files:
+        for line in f:
+            token = line.rstrip("\r\n")
+            if token:
+                yield token
+
+
+def analyse_tokens(
+    tokens: Iterable[str],
+    tr: Union[Hfst, ParallelHfst],
+    batch_size: int = 1000,
+) -> Iterator[Tuple[str, AnalysisPairs]]:
+    """
+    Looks up a stream of tokens in input order.
+
+    :param tokens: The tokens to look up, consumed lazily.
+    :param tr: The Hfst object to look them up with, or a ParallelHfst to spread them over worker processes.
+    :param batch_size: The number of tokens looked up at a time by an Hfst object.
+        A ParallelHfst uses its own chunk size.
+    :return: An iterator of (token, analyses) pairs.
+    """
+    if isinstance(tr, ParallelHfst):
+        return tr.lookup_many_iter(tokens)
+    return tr.lookup_many_iter(tokens, batch_size=batch_size)
+
+
+def format_tsv(token: str, analyses: AnalysisPairs, weighted: bool = True) -> str:
+    """
+    Formats the analyses of a token like hfst-lookup: one line per analysis
+    with the input, the analysis and the weight separated by tabs, followed
+    by an empty line. A token without analyses gets the analysis "token+?"
+    with an infinite weight.
+
+    :param token: The token.
+    :param analyses: Its analyses.
+    :param weighted: Whether the weights are real, unweighted transducers get a weight of 0 as in hfst-lookup.
+    :return: The formatted lines.
+    """
+    if not analyses:
+        return f"{token}\t{token}+?\tinf\n\n"
+    return "".join(
+        f"{token}\t{analysis}\t{weight if weighted else 0.0:f}\n" for analysis, weight in analyses
+    ) + "\n"
+
+
+def format_jsonl(token: str, analyses: AnalysisPairs, weighted: bool = True) -> str:
+    """
+    Formats the analyses of a token as a line of JSON.
+
+    :param token: The token.
+    :param analyses: Its analyses, as returned by Hfst.lookup.
+    :param weighted: Whether the weights are real, unweighted transducers get a weight of 0 as in format_tsv.
+    :return: The formatted line.
+    """
+    if not weighted:
+        analyses = [(analysis, 0.0) for analysis, _ in analyses]
+    return json.dumps({"input": token, "analyses": analyses}, ensure_ascii=False) + "\n"
+
+
+def write_analyses(
+    results: Iterable[Tuple[str, AnalysisPairs]],
+    output: TextIO,
+    format: str = "tsv",
+    weighted: bool = True,
+) -> int:
+    """
+    Writes a stream of analyses.
+
+    :param results: The (token, analyses) pairs to write.
+    :param output: The file to write to.
+    :param format: "tsv" for the hfst-lookup format, "jsonl" for JSON lines.
+    :param weighted: Whether the transducer is weighted, see format_tsv and format_jsonl.
+    :return: The number of tokens written.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown output format {format!r}, expected one of {FORMATS}")
+    count = 0
+    for token, analyses in results:
+        if format == "tsv":
+            output.write(format_tsv(token, analyses, weighted))
+        else:
+            output.write(format_jsonl(token, analyses, weighted))
+        count += 1
+    return count
+
+
+def run(
+    tr: Union[Hfst, ParallelHfst],
+    inputs: Iterable[TextIO],
+    output: TextIO,
+    format: str = "tsv",
+    batch_size: int = 1000,
+) -> Tuple[int, float]:
+    """
+    Analyses every token of the input files and writes the results.
+
+    :param tr: The Hfst object to look the tokens up with, or a ParallelHfst.
+    :param inputs: The files to read tokens from, one token per line.
+    :param output: The file to write the analyses to.
+    :param format: "tsv" for the hfst-lookup format, "jsonl" for JSON lines.
+    :param batch_size: The number of tokens looked up at a time.
+    :return: The number of tokens analysed and the time it took in seconds.
+    """
+    weighted = (tr.hfst if isinstance(tr, ParallelHfst) else tr).tr.is_weighted
+    start = time.perf_counter()
+    results = analyse_tokens(read_tokens(inputs), tr, batch_size=batch_size)
+    count = write_analyses(results, output, format=format, weighted=weighted)
+    output.flush()
+    return count, time.perf_counter() - start
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Analyse tokens, one per line, with an HFST optimized-lookup transducer."
+    )
+    parser.add_argument("transducer", help="the .hfstol file")
+    parser.add_argument("inputs", nargs="*", help="files to read tokens from, standard input if none")
+    parser.add_argument("--format", choices=FORMATS, default="tsv", help="hfst-lookup TSV or JSON lines")
+    parser.add_argument("--workers", type=int, default=1, help="the number of worker processes")
+    parser.add_argument("--batch-size", type=int, default=1000, help="tokens looked up at a time")
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=100000,
+        help="the number of distinct tokens kept in the result cache of each process, 0 to disable it",
+    )
+    parser.add_argument("--quiet", action="store_true", help="do not report throughput on standard error")
+    args = parser.parse_args(argv)
+
+    cache = LookupCache(max_entries=args.cache_size) if args.cache_size > 0 else False
+    sys.stdout.reconfigure(encoding="utf-8")
+    inputs = [open(path, encoding="utf-8") for path in args.inputs]
+    if not inputs:
+        sys.stdin.reconfigure(encoding="utf-8")
+        inputs = [sys.stdin]
+    try:
+        if args.workers > 1:
+            with ParallelHfst(
+                args.transducer, workers=args.workers, chunk_size=args.batch_size, cache=cache
+            ) as tr:
+                count, seconds = run(tr, inputs, sys.stdout, format=args.format)
+        else:
+            hfst = HfstInputStream(args.transducer, cache=cache).read()
+            count, seconds = run(hfst, inputs, sys.stdout, format=args.format, batch_size=args.batch_size)
+    except BrokenPipeError:
+        # the reader went away, e.g. `pyhfst-lookup ... | head`
+        sys.stdout = open(os.devnull, "w")
+        return
+    finally:
+        for f in inputs:
+            if f is not sys.stdin:
+                f.close()
+    if not args.quiet:
+        print(
+            f"{count} tokens in {seconds:.1f} s, {count / seconds if seconds else 0:.0f} tokens/s",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,22 @@
 import io
-from typing import List, Dict
-from .flag_diacritic_operation import FlagDiacriticOperator
-
-
-class FlagDiacriticOperation:
-
-    def __init__(self, operation, feat, val):
-        self.op = operation
-        self.feature = feat
-        self.value = val
+from typing import List, Dict, Optional
+from .flag_diacritic_operation import FlagDiacriticOperation, FlagDiacriticOperator
 
 
 class TransducerAlphabet:
-    def __init__(self, charstream: io.BytesIO, number_of_symbols: int) -> None:
+    def __init__(
+        self, charstream: io.BytesIO, number_of_symbols: int, symbols: Optional[List[str]] = None
+    ) -> None:
         """
         Initializes the TransducerAlphabet instance.
 
         :param charstream: A byte stream containing the alphabet data.
         :param number_of_symbols: The number of symbols in the alphabet.
+        :param symbols: The symbol strings if they are already decoded, the stream is not read then.
         """
         self.keyTable: List[str] = []
+        # the symbol strings as stored in the transducer, flag diacritics included
+        self.symbols: List[str] = []
         self.operations: Dict[int, FlagDiacriticOperation] = {}
         feature_bucket: Dict[str, int] = {}
         value_bucket: Dict[str, int] = {}
@@ -28,19 +25,23 @@ class TransducerAlphabet:
         value_bucket[""] = 0  # neutral value
 
         chars = bytearray()
-        for _ in range(number_of_symbols):
-            charindex = 0
-            if len(chars) == charindex:
-                chars.append(charstream.read(1)[0])
+        for index in range(number_of_symbols):
+            if symbols is not None:
+                ustring = symbols[index]
             else:
-                chars[charindex] = charstream.read(1)[0]
-            while chars[charindex] != 0:
-                charindex += 1
+                charindex = 0
                 if len(chars) == charindex:
                     chars.append(charstream.read(1)[0])
                 else:
                     chars[charindex] = charstream.read(1)[0]
-            ustring = chars[:charindex].decode("utf-8")
+                while chars[charindex] != 0:
+                    charindex += 1
+                    if len(chars) == charindex:
+                        chars.append(charstream.read(1)[0])
+                    else:
+                        chars[charindex] = charstream.read(1)[0]
+                ustring = chars[:charindex].decode("utf-8")
+            self.symbols.append(ustring)
 
             if (
                 len(ustring) > 5
@@ -89,7 +89,15 @@ setup_args = {
     # To provide executable scripts, use entry points in preference to the
     # "scripts" keyword. Entry points provide cross-platform support and allow
     # pip to create the appropriate form of executable for the target platform.
-    "entry_points": {},
+    "entry_points": {
+        "console_scripts": [
+            "pyhfst-compile=pyhfst.compiled:main",
+            "pyhfst-warm-cache=pyhfst.persistent_cache:main",
+            "pyhfst-lookup=pyhfst.stream:main",
+            "pyhfst-serve=pyhfst.serve:main",
+            "pyhfst-precompute=pyhfst.precomputed:main",
+        ],
+    },
     "project_urls": {  # Optional
         "Bug Reports": "https://github.com/Rootroo-ltd/pyhfst/issues",
         "Developer": "https://rootroo.com/",
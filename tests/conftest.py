@@ -0,0 +1,73 @@
+"""
+Fixtures that write small transducers for the tests, with the writer of
+the benchmarks. Run the tests from a source checkout:
+
+    python -m pytest
+"""
+from pathlib import Path
+from typing import Callable, Iterable, List, Tuple
+
+import pytest
+
+import pyhfst
+from benchmarks.synthetic import SyntheticTransducer, generate
+
+Arcs = Iterable[Tuple[int, str, str, int, float]]
+Finals = Iterable[Tuple[int, float]]
+
+
+def read(path: Path, **kwargs) -> pyhfst.Hfst:
+    """
+    Loads a transducer without the cache, the compiled file or the precomputed table unless asked for.
+
+    :param path: The path to the transducer file.
+    :param kwargs: Arguments of HfstInputStream that override the defaults.
+    :return: The Hfst object.
+    """
+    options = {"cache": False, "compiled": False, "precomputed": False}
+    options.update(kwargs)
+    return pyhfst.HfstInputStream(path, **options).read()
+
+
+def analyses_of(result: Iterable[Tuple[str, float]]) -> List[str]:
+    """
+    Returns the analysis strings of a lookup result, sorted, for comparisons that ignore the order and the weights.
+    """
+    return sorted(analysis for analysis, _ in result)
+
+
+@pytest.fixture
+def build(tmp_path: Path) -> Callable[..., Path]:
+    """
+    Returns a function that writes a transducer from its arcs and final
+    states. An arc is a (source, input, output, target, weight) tuple, with
+    "" for epsilon, and state 0 is the start state.
+    """
+
+    def build(arcs: Arcs, finals: Finals, weighted: bool = False, name: str = "test.hfstol") -> Path:
+        arcs = [(*arc, 0.0) if len(arc) == 4 else arc for arc in arcs]
+        fst = SyntheticTransducer(weighted=weighted)
+        states = max(max(source, target) for source, _, _, target, _ in arcs)
+        for _ in range(states):
+            fst.add_state()
+        for arc in arcs:
+            fst.add_arc(*arc)
+        for state, weight in finals:
+            fst.set_final(state, weight)
+        path = tmp_path / name
+        fst.write(path)
+        return path
+
+    return build
+
+
+@pytest.fixture
+def lexicon(tmp_path: Path) -> Tuple[Path, List[str]]:
+    """
+    Writes a weighted lexicon of a few hundred words with flag diacritics and epsilon branches.
+
+    :return: The path to the transducer and its surface forms.
+    """
+    path = tmp_path / "lexicon.hfstol"
+    words = generate(path, words=300, weighted=True, flags=True, epsilon_branches=1)
+    return path, words
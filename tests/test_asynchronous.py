@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from pyhfst import AsyncHfst, ParallelHfst
+
+from .conftest import read
+from .test_lookup_many import tokens_of
+
+
+def test_lookup_matches_lookup(lexicon):
+    path, words = lexicon
+    tr = read(path)
+    tokens = tokens_of(words)
+
+    async def main():
+        async with AsyncHfst(read(path), max_batch_size=8) as async_tr:
+            results = await asyncio.gather(*(async_tr.lookup(token) for token in tokens))
+            many = await async_tr.lookup_many(tokens)
+        return results, many, async_tr.stats()
+
+    results, many, stats = asyncio.run(main())
+    expected = [tr.lookup(token) for token in tokens]
+    assert results == many == expected
+    assert [result.truncated for result in results] == [result.truncated for result in expected]
+    assert stats["lookups"] == 2 * len(tokens)
+    assert stats["deduplicated"] >= 2
+    assert stats["pending"] == 0
+
+
+def test_callers_of_one_word_share_a_batch(lexicon):
+    path, words = lexicon
+
+    async def main():
+        async with AsyncHfst(read(path), max_delay=0.05) as async_tr:
+            first, second, third = await asyncio.gather(*(async_tr.lookup(words[0]) for _ in range(3)))
+        return first, second, third, async_tr.stats()
+
+    first, second, third, stats = asyncio.run(main())
+    assert first == second == third
+    assert first is not second and second is not third
+    assert stats["batches"] == 1 and stats["deduplicated"] == 2
+
+
+def test_full_batch_is_sent_off_at_once(lexicon):
+    path, words = lexicon
+
+    async def main():
+        async with AsyncHfst(read(path), max_batch_size=3, max_delay=60) as async_tr:
+            return await asyncio.wait_for(async_tr.lookup_many(words[:3]), timeout=10)
+
+    assert asyncio.run(main()) == [read(path).lookup(word) for word in words[:3]]
+
+
+def test_max_pending(lexicon):
+    path, words = lexicon
+
+    async def main():
+        async with AsyncHfst(read(path), max_batch_size=4, max_pending=2) as async_tr:
+            results = await asyncio.gather(*(async_tr.lookup(word) for word in words[:20]))
+            assert async_tr.stats()["pending"] == 0
+        return results
+
+    assert asyncio.run(main()) == [read(path).lookup(word) for word in words[:20]]
+
+
+def test_errors_reach_every_caller(lexicon):
+    path, words = lexicon
+    tr = read(path)
+
+    def lookup_many(tokens):
+        raise RuntimeError("broken")
+
+    tr.lookup_many = lookup_many
+
+    async def main():
+        async with AsyncHfst(tr) as async_tr:
+            return await asyncio.gather(*(async_tr.lookup(word) for word in words[:3]), return_exceptions=True)
+
+    assert [str(result) for result in asyncio.run(main())] == ["broken"] * 3
+
+
+def test_bound_to_one_event_loop(lexicon):
+    path, words = lexicon
+    async_tr = AsyncHfst(read(path))
+    asyncio.run(async_tr.lookup(words[0]))
+    with pytest.raises(RuntimeError):
+        asyncio.run(async_tr.lookup(words[0]))
+
+
+def test_parallel_source(lexicon):
+    path, words = lexicon
+
+    async def main():
+        with ParallelHfst(path, workers=2, cache=False) as parallel:
+            async with AsyncHfst(parallel, max_batch_size=5) as async_tr:
+                assert async_tr.max_batches == 2
+                return await async_tr.lookup_many(words[:20])
+
+    assert asyncio.run(main()) == [read(path).lookup(word) for word in words[:20]]
@@ -0,0 +1,91 @@
+import pytest
+
+from pyhfst import LookupCache
+from pyhfst.cache import entry_size
+
+from .conftest import read
+
+
+def analyses(n: int):
+    return tuple((f"word+N+Sg+{i}", 0.0) for i in range(n))
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LookupCache(max_entries=2)
+    cache.put("a", analyses(1))
+    cache.put("b", analyses(1))
+    assert cache.get("a") is not None
+    cache.put("c", analyses(1))
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lfu_evicts_least_frequently_used():
+    cache = LookupCache(max_entries=2, policy="lfu")
+    cache.put("a", analyses(1))
+    cache.put("b", analyses(1))
+    cache.get("b")
+    cache.get("b")
+    cache.get("a")
+    cache.put("c", analyses(1))
+    assert "b" in cache and "c" in cache
+    assert "a" not in cache
+    # a new entry is the least frequently used one
+    cache.put("d", analyses(1))
+    assert "c" not in cache
+
+
+def test_byte_limit():
+    size = entry_size("a", analyses(2))
+    cache = LookupCache(max_bytes=2 * size)
+    cache.put("a", analyses(2))
+    cache.put("b", analyses(2))
+    assert len(cache) == 2 and cache.stats()["bytes"] == 2 * size
+    cache.put("c", analyses(2))
+    assert len(cache) == 2 and "a" not in cache
+    assert cache.stats()["bytes"] <= 2 * size
+
+
+def test_entry_over_byte_limit_is_not_stored():
+    cache = LookupCache(max_bytes=entry_size("a", analyses(1)))
+    cache.put("a", analyses(1))
+    cache.put("b", analyses(50))
+    assert "a" in cache and "b" not in cache
+    assert cache.stats()["evictions"] == 0
+
+
+def test_replacing_an_entry_updates_its_size():
+    cache = LookupCache()
+    cache.put("a", analyses(10))
+    cache.put("a", analyses(1))
+    assert cache.stats()["bytes"] == entry_size("a", analyses(1))
+
+
+def test_counters():
+    cache = LookupCache()
+    cache.put("a", analyses(1))
+    cache.get("a")
+    cache.get("b")
+    cache.clear()
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "entries": 0, "bytes": 0}
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        LookupCache(policy="fifo")
+
+
+def test_lookup_through_bounded_cache(lexicon):
+    path, words = lexicon
+    cache = LookupCache(max_entries=10)
+    uncached = read(path)
+    tr = read(path, cache=cache)
+    for word in words[:50]:
+        assert tr.lookup(word) == uncached.lookup(word)
+    for word in words[40:50]:
+        assert tr.lookup(word) == uncached.lookup(word)
+    stats = tr.stats()
+    assert stats["entries"] == 10
+    assert stats["evictions"] == 40
+    assert stats["hits"] == 10
@@ -0,0 +1,49 @@
+from array import array
+
+import pytest
+
+from benchmarks.synthetic import generate
+from pyhfst import LookupCache, PersistentCache
+from pyhfst.common import NO_SYMBOL_NUMBER
+from pyhfst.compact import EMPTY, CompactAnalyses, symbol_numbers
+
+from .conftest import read
+from .test_lookup_many import tokens_of
+
+
+@pytest.mark.parametrize("weighted, flags", [(False, False), (True, False), (True, True)])
+def test_compact_lookup_matches_lookup(tmp_path, weighted, flags):
+    path = tmp_path / "lexicon.hfstol"
+    words = generate(path, words=300, weighted=weighted, flags=flags, epsilon_branches=2)
+    tokens = tokens_of(words)
+    formatted = read(path, cache=LookupCache())
+    compact = read(path, cache=LookupCache(), compact=True)
+    for _ in range(2):  # analysed, then served from the cache
+        for token in tokens:
+            assert compact.lookup(token) == formatted.lookup(token)
+            assert compact.lookup(token, n_best=2) == formatted.lookup(token, n_best=2)
+            assert compact.is_known(token) == formatted.is_known(token)
+        assert compact.lookup_many(tokens) == formatted.lookup_many(tokens)
+        assert compact.lookup_many(sorted(tokens), shared_prefixes=True) == formatted.lookup_many(sorted(tokens))
+    assert isinstance(compact.mem[words[0]], CompactAnalyses)
+    assert compact.mem["zzzz"] is EMPTY
+    assert compact.stats()["hits"] > 0
+
+
+def test_compact_analyses():
+    key_table = ["", "a", "b", "+N", "@P.FEAT.X@", "a"]
+    assert symbol_numbers(key_table) == {"a": 1, "b": 2, "+N": 3, "@P.FEAT.X@": 4}
+    symbols = array("H", [1, 2, 3, NO_SYMBOL_NUMBER, NO_SYMBOL_NUMBER, 2, NO_SYMBOL_NUMBER])
+    weights = array("d", [0.5, 1.5, 2.5])
+    analyses = CompactAnalyses(symbols.tobytes(), weights.tobytes())
+    assert len(analyses) == 3
+    assert list(analyses.decode(key_table)) == [("ab+N", 0.5), ("", 1.5), ("b", 2.5)]
+    unweighted = CompactAnalyses(symbols.tobytes(), None)
+    assert list(unweighted.decode(key_table)) == [("ab+N", 1.0), ("", 1.0), ("b", 1.0)]
+    assert len(EMPTY) == 0 and list(EMPTY.decode(key_table)) == []
+
+
+def test_compact_mode_needs_an_in_memory_cache(lexicon, tmp_path):
+    path, _ = lexicon
+    with pytest.raises(ValueError):
+        read(path, cache=PersistentCache(tmp_path / "cache.sqlite", path), compact=True)
@@ -0,0 +1,103 @@
+import os
+import shutil
+
+from pyhfst import compile_transducer
+from pyhfst.compiled import CHECKED_PREAMBLE_SIZE, PREAMBLE, compiled_path, read_compiled
+from benchmarks.synthetic import generate
+
+from .conftest import read
+
+
+def test_round_trip(lexicon):
+    path, words = lexicon
+    assert compile_transducer(path) == compiled_path(path)
+    assert read_compiled(path, verify=True) is not None
+    decoded = read(path)
+    compiled = read(path, compiled=True)
+    for word in words + ["zzzz", "a-b", ""]:
+        assert compiled.lookup(word) == decoded.lookup(word)
+        assert compiled.lookup(word, n_best=2) == decoded.lookup(word, n_best=2)
+
+
+def test_stale_after_the_transducer_changes(lexicon):
+    path, words = lexicon
+    compile_transducer(path)
+    generate(path, words=100, weighted=True, seed=1)
+    assert read_compiled(path) is None
+    # the transducer itself is loaded instead
+    assert read(path, compiled=True).lookup(words[0]) == read(path).lookup(words[0])
+
+
+def test_fresh_after_copying(lexicon, tmp_path):
+    path, _ = lexicon
+    compile_transducer(path)
+    copy = tmp_path / "copy.hfstol"
+    shutil.copy(path, copy)
+    shutil.copy(compiled_path(path), compiled_path(copy))
+    os.utime(copy, ns=(0, 0))
+    assert read_compiled(copy) is not None
+
+
+def test_stale_without_the_transducer(lexicon):
+    path, _ = lexicon
+    compile_transducer(path)
+    os.remove(path)
+    assert read_compiled(path) is None
+
+
+def test_corrupt(lexicon):
+    path, _ = lexicon
+    compile_transducer(path)
+    with open(compiled_path(path), "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+    assert read_compiled(path, verify=True) is None
+
+
+def test_truncated(lexicon):
+    path, words = lexicon
+    compile_transducer(path)
+    cache_path = compiled_path(path)
+    size = os.path.getsize(cache_path)
+    for length in (0, 10, 100, size // 2, size - 1):
+        with open(cache_path, "r+b") as f:
+            f.truncate(length)
+        assert read_compiled(path) is None
+        assert read(path, compiled=True).lookup(words[0]) == read(path).lookup(words[0])
+
+
+def test_corrupt_metadata(lexicon):
+    path, _ = lexicon
+    compile_transducer(path)
+    with open(compiled_path(path), "r+b") as f:
+        f.seek(PREAMBLE.size + 2)
+        f.write(b"\xff")
+    assert read_compiled(path) is None
+
+
+def test_corrupt_preamble(lexicon):
+    path, _ = lexicon
+    compile_transducer(path)
+    with open(compiled_path(path), "r+b") as f:
+        # the metadata size
+        f.seek(CHECKED_PREAMBLE_SIZE - 8)
+        f.write((1 << 40).to_bytes(8, "little"))
+    assert read_compiled(path) is None
+
+
+def test_flags(build):
+    path = build(
+        [
+            (0, "@P.FEAT.X@", "@P.FEAT.X@", 1),
+            (0, "@P.FEAT.Y@", "@P.FEAT.Y@", 1),
+            (1, "a", "a", 2),
+            (2, "@R.FEAT.X@", "@R.FEAT.X@", 3),
+        ],
+        [(3, 0.0)],
+    )
+    compile_transducer(path)
+    compiled = read(path, compiled=True)
+    assert type(compiled.tr.index_table).__name__ == "CompiledIndexTable"
+    assert compiled.lookup("a") == read(path).lookup("a") != []
@@ -0,0 +1,63 @@
+import pytest
+
+from benchmarks.synthetic import generate
+
+from .conftest import read
+
+
+def pair(path, **kwargs):
+    # the same transducer with and without memoized epsilon closures
+    memoized = read(path, **kwargs)
+    unmemoized = read(path, **kwargs)
+    unmemoized.tr.epsilon_closure_cache_size = 0
+    return memoized, unmemoized
+
+
+@pytest.mark.parametrize("flags", [False, True])
+@pytest.mark.parametrize("max_epsilon_depth", [None, 2])
+def test_memoized_closures_give_the_same_analyses(tmp_path, flags, max_epsilon_depth):
+    path = tmp_path / "lexicon.hfstol"
+    words = generate(path, words=300, weighted=True, flags=flags, epsilon_branches=2)
+    memoized, unmemoized = pair(path)
+    memoized.max_epsilon_depth = unmemoized.max_epsilon_depth = max_epsilon_depth
+    tokens = words + [words[0] + "-" + words[1], words[1] + "-" + words[2], "zzzz"]
+    for token in tokens:
+        expected = unmemoized.lookup(token)
+        result = memoized.lookup(token)
+        assert result == expected
+        assert result.truncated == expected.truncated
+        assert list(memoized.lookup_iter(token)) == [tuple(analysis) for analysis in expected]
+    assert memoized.lookup_many(tokens, shared_prefixes=True) == unmemoized.lookup_many(tokens, shared_prefixes=True)
+    assert memoized.tr.epsilon_closures
+    assert not unmemoized.tr.epsilon_closures
+
+
+def test_closures_with_flags_on_the_path(build):
+    # the closure of state 1 depends on the flag set before reaching it
+    path = build(
+        [
+            (0, "@P.FEAT.X@", "@P.FEAT.X@", 1),
+            (0, "@P.FEAT.Y@", "@P.FEAT.Y@", 1),
+            (1, "", "+e", 2),
+            (2, "@R.FEAT.X@", "@R.FEAT.X@", 3),
+            (2, "@R.FEAT.Y@", "@R.FEAT.Y@", 4),
+            (3, "a", "x", 5),
+            (4, "a", "y", 5),
+            (5, "", "+f", 6),
+            (5, "", "+g", 6),
+        ],
+        [(6, 0.0)],
+    )
+    memoized, unmemoized = pair(path)
+    for _ in range(2):
+        assert memoized.lookup("a") == unmemoized.lookup("a")
+    assert len(memoized.lookup("a")) == 4
+
+
+def test_epsilon_cycle(build):
+    path = build([(0, "a", "a", 1), (1, "", "x", 2), (2, "", "y", 1), (1, "", "z", 3)], [(1, 0.0), (3, 0.0)])
+    memoized, unmemoized = pair(path)
+    for depth in (0, 1, 4, 9):
+        expected = unmemoized.lookup("a", max_epsilon_depth=depth)
+        result = memoized.lookup("a", max_epsilon_depth=depth)
+        assert result == expected and result.truncated == expected.truncated
@@ -0,0 +1,93 @@
+import pytest
+
+from pyhfst.flag_diacritic_operation import (
+    FLAG_DISALLOW,
+    FLAG_REQUIRE,
+    FLAG_SET,
+    FLAG_UNIFY,
+    FlagDiacriticOperation,
+    FlagDiacriticOperator,
+    compile_flag,
+)
+
+from .conftest import analyses_of, read
+
+
+@pytest.mark.parametrize(
+    "operator, value, expected",
+    [
+        (FlagDiacriticOperator.P, 2, (FLAG_SET, 1, 2)),
+        (FlagDiacriticOperator.N, 2, (FLAG_SET, 1, -2)),
+        (FlagDiacriticOperator.C, 0, (FLAG_SET, 1, 0)),
+        (FlagDiacriticOperator.R, 2, (FLAG_REQUIRE, 1, 2)),
+        (FlagDiacriticOperator.D, 0, (FLAG_DISALLOW, 1, 0)),
+        (FlagDiacriticOperator.U, 2, (FLAG_UNIFY, 1, 2)),
+    ],
+)
+def test_compile_flag(operator, value, expected):
+    assert compile_flag(FlagDiacriticOperation(operator, 1, value)) == expected
+
+
+@pytest.mark.parametrize(
+    "flags, accepted",
+    [
+        (["@P.FEAT.X@", "@R.FEAT.X@"], True),
+        (["@P.FEAT.X@", "@R.FEAT.Y@"], False),
+        (["@R.FEAT.X@"], False),
+        (["@R.FEAT@"], False),
+        (["@P.FEAT.X@", "@R.FEAT@"], True),
+        (["@D.FEAT@"], True),
+        (["@P.FEAT.X@", "@D.FEAT@"], False),
+        (["@P.FEAT.X@", "@D.FEAT.X@"], False),
+        (["@P.FEAT.X@", "@D.FEAT.Y@"], True),
+        (["@P.FEAT.X@", "@P.FEAT.Y@", "@R.FEAT.Y@"], True),
+        (["@N.FEAT.X@", "@R.FEAT.X@"], False),
+        (["@N.FEAT.X@", "@D.FEAT.X@"], True),
+        (["@N.FEAT.X@", "@R.FEAT@"], True),
+        (["@P.FEAT.X@", "@C.FEAT@", "@D.FEAT@"], True),
+        (["@P.FEAT.X@", "@C.FEAT@", "@R.FEAT.X@"], False),
+        (["@U.FEAT.X@", "@R.FEAT.X@"], True),
+        (["@P.FEAT.X@", "@U.FEAT.X@"], True),
+        (["@P.FEAT.X@", "@U.FEAT.Y@"], False),
+        (["@N.FEAT.X@", "@U.FEAT.Y@", "@R.FEAT.Y@"], True),
+        (["@P.FEAT.X@", "@R.GEN@"], False),
+        (["@P.GEN.X@", "@P.FEAT.Y@", "@R.GEN.X@", "@R.FEAT.Y@"], True),
+    ],
+)
+def test_flag_semantics(build, flags, accepted):
+    arcs = [(state, flag, flag, state + 1) for state, flag in enumerate(flags)]
+    arcs.append((len(flags), "a", "A", len(flags) + 1))
+    path = build(arcs, [(len(flags) + 1, 0.0)])
+    expected = ["A"] if accepted else []
+    tr = read(path)
+    assert analyses_of(tr.lookup("a")) == expected
+    assert tr.is_known("a") == accepted
+    assert analyses_of(tr.lookup("a", n_best=1)) == expected
+
+
+def test_flags_on_epsilon_paths(build):
+    # a flag set on one branch is seen at the end of that branch only
+    path = build(
+        [
+            (0, "@P.FEAT.X@", "@P.FEAT.X@", 1),
+            (0, "@P.FEAT.Y@", "@P.FEAT.Y@", 2),
+            (1, "", "x", 3),
+            (2, "", "y", 3),
+            (3, "a", "a", 4),
+            (4, "@R.FEAT.X@", "@R.FEAT.X@", 5),
+        ],
+        [(5, 0.0)],
+    )
+    assert analyses_of(read(path).lookup("a")) == ["xa"]
+
+
+def test_apply_flag(build):
+    analyzer = read(build([(0, "a", "a", 1)], [(1, 0.0)])).get_analyzer("a")
+    assert analyzer.apply_flag((FLAG_SET, 0, 2), (0, 0)) == (2, 0)
+    assert analyzer.apply_flag((FLAG_SET, 0, -2), (2, 0)) == (-2, 0)
+    assert analyzer.apply_flag((FLAG_REQUIRE, 1, 0), (2, 0)) is None
+    assert analyzer.apply_flag((FLAG_REQUIRE, 0, 2), (2, 0)) == (2, 0)
+    assert analyzer.apply_flag((FLAG_DISALLOW, 0, 2), (-2, 0)) == (-2, 0)
+    assert analyzer.apply_flag((FLAG_DISALLOW, 0, 0), (-2, 0)) is None
+    assert analyzer.apply_flag((FLAG_UNIFY, 0, 3), (2, 0)) is None
+    assert analyzer.apply_flag((FLAG_UNIFY, 0, 3), (-2, 0)) == (3, 0)
@@ -0,0 +1,79 @@
+import pytest
+
+from pyhfst import LookupCache, precompute
+
+from .conftest import analyses_of, read
+
+
+@pytest.fixture
+def epsilon_cycle(build):
+    # "a" followed by any number of epsilon:x transitions
+    return build([(0, "a", "a", 1), (1, "", "x", 1)], [(1, 0.0)])
+
+
+def test_max_epsilon_depth(epsilon_cycle):
+    tr = read(epsilon_cycle)
+    result = tr.lookup("a", max_epsilon_depth=3)
+    assert analyses_of(result) == ["a", "ax", "axx", "axxx"]
+    assert result.truncated
+    assert tr.stats()["truncated"] == 1
+
+
+def test_max_results(epsilon_cycle):
+    tr = read(epsilon_cycle, cache=True)
+    tr.max_epsilon_depth = 10
+    result = tr.lookup("a", max_results=2)
+    assert len(result) == 2 and result.truncated
+    assert len(list(tr.lookup_iter("a", max_results=2))) == 2
+    # truncated analyses are not cached
+    assert "a" not in tr.mem
+    assert tr.stats()["truncated"] == 2
+
+
+def test_max_steps_and_timeout(epsilon_cycle):
+    tr = read(epsilon_cycle)
+    tr.max_steps = 100
+    # the epsilon loop is followed before the final state is reached, so
+    # nothing is found within the limit
+    assert tr.lookup("a") == []
+    assert tr.lookup("a").truncated
+    tr.max_steps = None
+    assert tr.lookup("a", timeout=0.01).truncated
+    assert tr.lookup_many(["a"], max_epsilon_depth=5)[0].truncated
+
+
+def test_untruncated(lexicon):
+    path, words = lexicon
+    tr = read(path, cache=True)
+    tr.max_steps = 100000
+    tr.max_epsilon_depth = 20
+    result = tr.lookup(words[0])
+    assert result and not result.truncated
+    assert words[0] in tr.mem
+    assert tr.stats()["truncated"] == 0
+
+
+def test_max_results_cuts_cached_analyses(build):
+    path = build([(0, "a", "a", 1), (1, "", "x", 2), (1, "", "y", 2), (1, "", "z", 2)], [(2, 0.0)])
+    tr = read(path, cache=LookupCache())
+    full = tr.lookup("a")
+    assert len(full) == 3 and not full.truncated
+    result = tr.lookup("a", max_results=1)
+    assert result == full[:1] and result.truncated
+    tr.max_results = 2
+    result = tr.lookup_many(["a"])[0]
+    assert result == full[:2] and result.truncated
+    assert tr.stats()["truncated"] == 2
+    # the cached entry is kept whole
+    tr.max_results = None
+    assert tr.lookup("a") == full
+
+
+def test_max_results_cuts_precomputed_analyses(build):
+    path = build([(0, "a", "a", 1), (1, "", "x", 2), (1, "", "y", 2), (1, "", "z", 2)], [(2, 0.0)])
+    precompute(path, ["a"])
+    tr = read(path, precomputed=True)
+    full = tr.lookup("a")
+    assert len(full) == 3 and tr.precomputed is not None
+    result = tr.lookup("a", max_results=2)
+    assert result == full[:2] and result.truncated
@@ -0,0 +1,94 @@
+from itertools import islice
+
+import pytest
+
+import pyhfst
+from benchmarks.synthetic import generate
+
+from .conftest import read
+from .test_lookup_many import tokens_of
+
+
+@pytest.fixture
+def branches(build):
+    # "a" with five analyses, found in the order of the arcs
+    return build([(0, "a", "a", 1)] + [(1, "", f"+{i}", 2) for i in range(5)], [(2, 0.0)])
+
+
+@pytest.fixture
+def counting(monkeypatch):
+    # counts the calls of next_analyses of every Analyzer lookup_iter creates
+    calls = []
+    analyzer_class = pyhfst.Analyzer
+
+    class CountingAnalyzer(object):
+        def __init__(self, tr, string):
+            object.__setattr__(self, "analyzer", analyzer_class(tr, string))
+            calls.append(0)
+
+        def __getattr__(self, name):
+            return getattr(self.analyzer, name)
+
+        def __setattr__(self, name, value):
+            setattr(self.analyzer, name, value)
+
+        def next_analyses(self, n):
+            calls[-1] += 1
+            return self.analyzer.next_analyses(n)
+
+    monkeypatch.setattr(pyhfst, "Analyzer", CountingAnalyzer)
+    return calls
+
+
+@pytest.mark.parametrize("flags", [False, True])
+def test_lookup_iter_matches_lookup(tmp_path, flags):
+    path = tmp_path / "lexicon.hfstol"
+    words = generate(path, words=300, weighted=True, flags=flags, epsilon_branches=2)
+    tr = read(path)
+    for token in tokens_of(words) + [words[0] + "-" + words[1]]:
+        assert list(tr.lookup_iter(token)) == [tuple(analysis) for analysis in tr.lookup(token)]
+
+
+def test_traversal_pauses_between_analyses(branches, counting):
+    tr = read(branches)
+    expected = [tuple(analysis) for analysis in tr.lookup("a")]
+    assert len(expected) == 5
+    counting.clear()
+    analyses = tr.lookup_iter("a")
+    assert next(analyses) == expected[0]
+    assert counting == [1]
+    assert list(islice(analyses, 2)) == expected[1:3]
+    assert counting == [3]
+    assert list(analyses) == expected[3:]
+    # and once more to find that there are no more
+    assert counting == [6]
+
+
+def test_iterators_side_by_side(branches):
+    tr = read(branches)
+    expected = [tuple(analysis) for analysis in tr.lookup("a")]
+    first, second = tr.lookup_iter("a"), tr.lookup_iter("a")
+    interleaved = list(zip(first, second))
+    assert [a for a, _ in interleaved] == [b for _, b in interleaved] == expected
+
+
+def test_only_finished_iterators_are_cached(branches, counting):
+    tr = read(branches, cache=True)
+    analyses = tr.lookup_iter("a")
+    next(analyses)
+    analyses.close()
+    assert "a" not in tr.mem
+    expected = list(tr.lookup_iter("a"))
+    assert "a" in tr.mem and len(counting) == 2
+    assert list(tr.lookup_iter("a")) == expected
+    assert len(counting) == 2 and tr.stats()["hits"] == 1
+    assert list(tr.lookup_iter("a", max_results=2)) == expected[:2]
+
+
+def test_limits(branches):
+    tr = read(branches, cache=True)
+    assert len(list(tr.lookup_iter("a", max_results=2))) == 2
+    assert "a" not in tr.mem
+    assert tr.stats()["truncated"] == 1
+    assert list(tr.lookup_iter("b")) == []
+    assert tr.stats()["rejected"] == 1
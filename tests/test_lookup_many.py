@@ -0,0 +1,47 @@
+from itertools import islice
+
+from .conftest import read
+
+
+def tokens_of(words):
+    # known words, repeats, unknown words and rejected inputs, unsorted
+    return [words[5], words[0], words[5], "zzzz", words[1] + "7", words[0], "", words[2][:-1]] + words[10:40]
+
+
+def test_lookup_many_matches_lookup(lexicon):
+    path, words = lexicon
+    tokens = tokens_of(words)
+    expected = [read(path).lookup(token) for token in tokens]
+    assert read(path).lookup_many(tokens) == expected
+    assert read(path, cache=True).lookup_many(iter(tokens)) == expected
+    assert read(path).lookup_many([]) == []
+
+
+def test_repeated_tokens_are_analysed_once(lexicon):
+    path, words = lexicon
+    tr = read(path, cache=True)
+    result = tr.lookup_many([words[0], words[0], words[1], words[0]])
+    assert result[0] == result[1] == result[3]
+    assert result[0] is not result[1]
+    stats = tr.stats()
+    assert stats["misses"] == 2 and stats["hits"] == 0 and stats["entries"] == 2
+    tr.lookup_many([words[1], words[0]])
+    assert tr.stats()["hits"] == 2
+
+
+def test_lookup_many_iter_reads_lazily(lexicon):
+    path, words = lexicon
+    tr = read(path)
+    consumed = []
+
+    def tokens():
+        for token in tokens_of(words):
+            consumed.append(token)
+            yield token
+
+    pairs = tr.lookup_many_iter(tokens(), batch_size=4)
+    assert list(islice(pairs, 3)) == [(token, tr.lookup(token)) for token in tokens_of(words)[:3]]
+    assert len(consumed) == 4
+    rest = list(pairs)
+    assert [token for token, _ in rest] == tokens_of(words)[3:]
+    assert all(analyses == tr.lookup(token) for token, analyses in rest)
@@ -0,0 +1,57 @@
+import sys
+
+import pytest
+
+from benchmarks.synthetic import generate
+
+from .conftest import read
+
+pytestmark = pytest.mark.skipif(sys.byteorder != "little", reason="tables are only memory-mapped on little-endian machines")
+
+
+@pytest.fixture(params=[(False, False), (True, False), (True, True)], ids=["unweighted", "weighted", "flags"])
+def transducer(request, tmp_path):
+    weighted, flags = request.param
+    path = tmp_path / "lexicon.hfstol"
+    words = generate(path, words=300, weighted=weighted, flags=flags, epsilon_branches=1)
+    return path, words
+
+
+def test_tables_are_mapped(transducer):
+    path, _ = transducer
+    tr = read(path, memory_map=True).tr
+    assert type(tr.index_table).__name__ == "MappedIndexTable"
+    assert type(tr.transition_table).__name__ == "MappedTransitionTable"
+    tr = read(path).tr
+    assert type(tr.index_table).__name__ == "IndexTable"
+    assert type(tr.transition_table).__name__ == "TransitionTable"
+
+
+def test_mapped_entries_match_decoded_ones(transducer):
+    path, _ = transducer
+    mapped = read(path, memory_map=True).tr
+    decoded = read(path).tr
+    for i in range(decoded.header.get_index_table_size()):
+        assert mapped.index_table.get_input(i) == decoded.index_table.get_input(i)
+        assert mapped.index_table.get_target(i) == decoded.index_table.get_target(i)
+        assert mapped.index_table.is_final(i) == decoded.index_table.is_final(i)
+    for i in range(decoded.transition_table.size()):
+        assert mapped.transition_table.get_input(i) == decoded.transition_table.get_input(i)
+        assert mapped.transition_table.get_output(i) == decoded.transition_table.get_output(i)
+        assert mapped.transition_table.get_target(i) == decoded.transition_table.get_target(i)
+        assert mapped.transition_table.is_final(i) == decoded.transition_table.is_final(i)
+        if decoded.is_weighted:
+            assert mapped.transition_table.get_weight(i) == decoded.transition_table.get_weight(i)
+
+
+def test_mapped_lookup_matches_decoded_lookup(transducer):
+    path, words = transducer
+    mapped = read(path, memory_map=True)
+    decoded = read(path)
+    tokens = words + [word[:-1] for word in words[:50]] + [words[0] + "-" + words[1], "zzzz", ""]
+    for token in tokens:
+        assert mapped.lookup(token) == decoded.lookup(token)
+        assert mapped.lookup(token, n_best=2) == decoded.lookup(token, n_best=2)
+        assert mapped.is_known(token) == decoded.is_known(token)
+    assert mapped.lookup_many(tokens) == decoded.lookup_many(tokens)
+
@@ -0,0 +1,44 @@
+import pytest
+
+from .conftest import read
+
+
+@pytest.fixture
+def weighted(build):
+    # a:a followed by one of five tags with different weights
+    tags = [("+E", 5.0), ("+B", 2.0), ("+D", 4.0), ("+A", 1.0), ("+C", 3.0)]
+    arcs = [(0, "a", "a", 1, 0.5)] + [(1, "", tag, 2 + i, weight) for i, (tag, weight) in enumerate(tags)]
+    finals = [(2 + i, 0.25) for i in range(len(tags))]
+    return build(arcs, finals, weighted=True)
+
+
+def test_n_best_order(weighted):
+    tr = read(weighted)
+    result = tr.lookup("a", n_best=3)
+    assert result == [["a+A", 1.75], ["a+B", 2.75], ["a+C", 3.75]]
+    assert tr.lookup("a", n_best=10) == sorted(tr.lookup("a"), key=lambda pair: pair[1])
+
+
+def test_max_weight_and_beam(weighted):
+    tr = read(weighted)
+    assert tr.lookup("a", max_weight=3.0) == [["a+A", 1.75], ["a+B", 2.75]]
+    assert tr.lookup("a", beam=2.0) == [["a+A", 1.75], ["a+B", 2.75], ["a+C", 3.75]]
+    assert tr.lookup("a", n_best=1, beam=10.0) == [["a+A", 1.75]]
+    assert tr.lookup("a", max_weight=1.0) == []
+
+
+def test_n_best_on_lexicon(lexicon):
+    path, words = lexicon
+    tr = read(path)
+    for word in words[:100]:
+        weights = sorted(weight for _, weight in tr.lookup(word))
+        result = tr.lookup(word, n_best=2)
+        assert [weight for _, weight in result] == weights[:2]
+        assert all(pair in tr.lookup(word) for pair in result)
+
+
+def test_pruned_analyses_are_not_cached(weighted):
+    tr = read(weighted, cache=True)
+    assert len(tr.lookup("a", n_best=1)) == 1
+    assert "a" not in tr.mem
+    assert len(tr.lookup("a")) == 5
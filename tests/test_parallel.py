@@ -0,0 +1,36 @@
+import pytest
+
+from pyhfst import ParallelHfst, PersistentCache
+
+from .conftest import read
+from .test_lookup_many import tokens_of
+
+
+@pytest.mark.parametrize("memory_map", [False, True])
+def test_parallel_lookup_matches_lookup(lexicon, memory_map):
+    path, words = lexicon
+    tokens = tokens_of(words) * 3
+    tr = read(path)
+    with ParallelHfst(path, workers=2, chunk_size=7, cache=False, memory_map=memory_map) as parallel:
+        assert parallel.lookup(words[0]) == tr.lookup(words[0])
+        assert parallel.lookup_many(tokens) == [tr.lookup(token) for token in tokens]
+        pairs = list(parallel.lookup_many_iter(iter(tokens), max_pending=1))
+        assert pairs == [(token, tr.lookup(token)) for token in tokens]
+
+
+def test_loaded_hfst_keeps_its_limits(build):
+    path = build([(0, "a", "a", 1), (1, "", "x", 1)], [(1, 0.0)])
+    tr = read(path)
+    tr.max_epsilon_depth = 2
+    with ParallelHfst(tr, workers=2) as parallel:
+        result = parallel.lookup_many(["a", "b", "a"])
+    assert result[0] == result[2] == tr.lookup("a")
+    assert result[0].truncated and not result[1].truncated
+
+
+def test_workers_share_a_persistent_cache(lexicon, tmp_path):
+    path, words = lexicon
+    db = tmp_path / "cache.sqlite"
+    with ParallelHfst(path, workers=2, chunk_size=5, cache=PersistentCache(db, path)) as parallel:
+        parallel.lookup_many(words[:20])
+    assert len(PersistentCache(db, path)) == 20
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from pyhfst import LookupCache, PersistentCache
+from pyhfst.persistent_cache import read_frequency_list, warm
+
+from .conftest import analyses_of, read
+
+
+def test_results_survive_reopening(lexicon, tmp_path):
+    path, words = lexicon
+    db = tmp_path / "cache.sqlite"
+    tr = read(path, cache=PersistentCache(db, path))
+    expected = [tr.lookup(word) for word in words[:20]]
+    cache = PersistentCache(db, path, memory=LookupCache(max_entries=5))
+    assert len(cache) == 20
+    tr = read(path, cache=cache)
+    assert [tr.lookup(word) for word in words[:20]] == expected
+    assert cache.stats()["hits"] == 20
+
+
+def test_entries_dropped_when_the_checksum_changes(build, tmp_path):
+    path = build([(0, "a", "x", 1)], [(1, 0.0)])
+    db = tmp_path / "cache.sqlite"
+    tr = read(path, cache=PersistentCache(db, path))
+    assert analyses_of(tr.lookup("a")) == ["x"]
+
+    build([(0, "a", "y", 1)], [(1, 0.0)])
+    os.utime(path, ns=(0, 0))  # the same size, the time alone tells that the file changed
+    cache = PersistentCache(db, path)
+    assert len(cache) == 0
+    tr = read(path, cache=cache)
+    assert analyses_of(tr.lookup("a")) == ["y"]
+
+
+def test_entries_kept_when_only_the_time_changes(build, tmp_path):
+    path = build([(0, "a", "x", 1)], [(1, 0.0)])
+    db = tmp_path / "cache.sqlite"
+    read(path, cache=PersistentCache(db, path)).lookup("a")
+    os.utime(path, ns=(0, 0))
+    assert len(PersistentCache(db, path)) == 1
+
+
+@pytest.mark.parametrize(
+    "order, lines",
+    [
+        ("count-first", ["  12 kissa", "7 2024", "", "3 talo"]),
+        ("token-first", ["kissa\t12", "2024 7", "", "talo 3"]),
+        ("tokens", ["kissa", "2024", "", "talo"]),
+    ],
+)
+def test_read_frequency_list(tmp_path, order, lines):
+    path = tmp_path / "frequencies.txt"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    assert list(read_frequency_list(path, order=order)) == ["kissa", "2024", "talo"]
+    assert list(read_frequency_list(path, limit=2, order=order)) == ["kissa", "2024"]
+
+
+def test_frequency_list_of_another_order(tmp_path):
+    path = tmp_path / "frequencies.txt"
+    path.write_text("kissa 12\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="line 1"):
+        list(read_frequency_list(path))
+    with pytest.raises(ValueError):
+        list(read_frequency_list(path, order="tokens"))
+    with pytest.raises(ValueError):
+        list(read_frequency_list(path, order="count-last"))
+
+
+def test_warm(lexicon, tmp_path):
+    path, words = lexicon
+    cache = PersistentCache(tmp_path / "cache.sqlite", path)
+    assert warm(cache, read(path), words[:10] + ["zzzz"], batch_size=3) == 11
+    assert warm(cache, read(path), words[:12]) == 2
+    tr = read(path, cache=cache)
+    assert tr.lookup(words[0]) == read(path).lookup(words[0])
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,87 @@
+import os
+import shutil
+import sys
+
+from benchmarks.synthetic import generate
+from pyhfst import LookupCache, precompute, precomputed_path, read_precomputed
+from pyhfst.precomputed import PREAMBLE, main, write_precomputed
+
+from .conftest import read
+from .test_lookup_many import tokens_of
+
+
+def test_round_trip(lexicon):
+    path, words = lexicon
+    tokens = tokens_of(words)
+    assert precompute(path, tokens) == precomputed_path(path)
+    table = read_precomputed(precomputed_path(path), path, verify=True)
+    assert len(table) == len(set(tokens))
+    assert "zzzz" in table and words[100] not in table
+    assert [token.encode("utf-8") for token, _ in table.items()] == sorted(t.encode("utf-8") for t in set(tokens))
+
+    tr = read(path)
+    precomputed = read(path, cache=LookupCache(), precomputed=True)
+    for token in tokens + words[40:60]:
+        assert precomputed.lookup(token) == tr.lookup(token)
+        assert precomputed.lookup(token, n_best=1) == tr.lookup(token, n_best=1)
+    assert precomputed.lookup_many(tokens) == tr.lookup_many(tokens)
+    # only the tokens missing from the table reached the cache
+    assert len(precomputed.mem) == 20
+
+
+def test_stale_after_the_transducer_changes(lexicon):
+    path, words = lexicon
+    precompute(path, words[:10])
+    generate(path, words=100, weighted=True, seed=1)
+    assert read_precomputed(precomputed_path(path), path) is None
+    assert read(path, precomputed=True).precomputed is None
+
+
+def test_fresh_after_copying(lexicon, tmp_path):
+    path, words = lexicon
+    precompute(path, words[:10])
+    copy = tmp_path / "copy.hfstol"
+    shutil.copy(path, copy)
+    shutil.copy(precomputed_path(path), precomputed_path(copy))
+    os.utime(copy, ns=(0, 0))
+    assert len(read_precomputed(precomputed_path(copy), copy)) == 10
+
+
+def test_stale_without_the_transducer(lexicon, tmp_path):
+    path, words = lexicon
+    precompute(path, words[:10])
+    assert read_precomputed(precomputed_path(path), tmp_path / "missing.hfstol") is None
+    table = tmp_path / "table.pyhfstp"
+    write_precomputed([(words[0], (("x", 0.0),))], table)
+    assert read_precomputed(table, path) is None
+
+
+def test_truncated_and_corrupt(lexicon):
+    path, words = lexicon
+    table = precompute(path, words[:50])
+    data = table.read_bytes()
+    for length in (0, 10, 100, len(data) // 2, len(data) - 1):
+        table.write_bytes(data[:length])
+        assert read_precomputed(table, path) is None
+    # the metadata is always checked
+    corrupt = bytearray(data)
+    corrupt[PREAMBLE.size + 2] ^= 0xFF
+    table.write_bytes(corrupt)
+    assert read_precomputed(table, path) is None
+    # the columns only with verify
+    corrupt = bytearray(data)
+    corrupt[-1] ^= 0xFF
+    table.write_bytes(corrupt)
+    assert read_precomputed(table, path) is not None
+    assert read_precomputed(table, path, verify=True) is None
+
+
+def test_main(lexicon, tmp_path, monkeypatch, capsys):
+    path, words = lexicon
+    frequencies = tmp_path / "frequencies.txt"
+    frequencies.write_text("".join(f"{word}\t{100 - i}\n" for i, word in enumerate(words[:20])), encoding="utf-8")
+    argv = ["pyhfst-precompute", str(path), str(frequencies), "--limit", "5", "--order", "token-first"]
+    monkeypatch.setattr(sys, "argv", argv)
+    main()
+    assert capsys.readouterr().out == f"{precomputed_path(path)}: 5 tokens\n"
+    assert sorted(token for token, _ in read_precomputed(precomputed_path(path), path).items()) == sorted(words[:5])
@@ -0,0 +1,23 @@
+from .conftest import read
+
+
+def test_unknown_symbol_is_rejected(lexicon):
+    path, words = lexicon
+    tr = read(path, cache=True)
+    assert tr.lookup(words[0] + "7") == []
+    assert tr.lookup("😀") == []
+    assert not tr.is_known(words[0] + "7")
+    assert list(tr.lookup_iter("7" + words[0])) == []
+    assert tr.lookup_many([words[0], "7"])[1] == []
+    # is_known was served from the cache
+    assert tr.stats()["rejected"] == 4
+    assert tr.lookup(words[0]) != []
+    assert tr.stats()["rejected"] == 4
+
+
+def test_unknown_symbol_in_shared_prefixes(lexicon):
+    path, words = lexicon
+    tr = read(path)
+    tokens = sorted(words[:20] + [word + "7" for word in words[:5]])
+    assert tr.lookup_many(tokens, shared_prefixes=True) == [tr.lookup(token) for token in tokens]
+    assert tr.stats()["rejected"] == 10
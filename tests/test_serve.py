@@ -0,0 +1,124 @@
+import json
+import multiprocessing
+import os
+import socket
+import time
+from types import SimpleNamespace
+from urllib.parse import quote
+
+import pytest
+
+from pyhfst.serve import HfstClient, Metrics, serve
+
+from .conftest import read
+from .test_lookup_many import tokens_of
+
+
+def counters(hits, misses, rejected=0, truncated=0):
+    return SimpleNamespace(mem=SimpleNamespace(hits=hits, misses=misses), rejected=rejected, truncated=truncated)
+
+
+def test_metrics_add_the_changes_of_each_request():
+    metrics = Metrics(2)
+    metrics.bind(0, counters(5, 5))
+    metrics.record(counters(7, 6, 1), tokens=3, seconds=0.5)
+    metrics.record(counters(9, 6, 1, 1), tokens=2, seconds=0.25, error=True)
+    metrics.bind(1, counters(0, 0))
+    metrics.record(counters(1, 1), tokens=2, seconds=0.25)
+    totals = metrics.totals()
+    assert totals == {
+        "requests": 3,
+        "tokens": 7,
+        "errors": 1,
+        "seconds": 1.0,
+        "hits": 5,
+        "misses": 2,
+        "rejected": 1,
+        "truncated": 1,
+    }
+    # a replacement worker starts again from the counters of the parent
+    metrics.bind(0, counters(5, 5))
+    metrics.record(counters(6, 5), tokens=1, seconds=0.0)
+    assert metrics.totals()["hits"] == 6
+    assert "pyhfst_cache_hits_total 6\n" in metrics.render(cache_entries=4)
+    assert metrics.render(cache_entries=4).endswith("pyhfst_cache_entries 4\n")
+
+
+@pytest.fixture
+def server(lexicon, tmp_path):
+    path, words = lexicon
+    unix = str(tmp_path / "pyhfst.sock")
+    process = multiprocessing.get_context("fork").Process(
+        target=serve, args=(path,), kwargs={"unix": unix, "workers": 2, "cache": tmp_path / "cache.sqlite"}
+    )
+    process.start()
+    deadline = time.monotonic() + 30
+    while not os.path.exists(unix):
+        assert time.monotonic() < deadline and process.is_alive()
+        time.sleep(0.01)
+    yield path, words, unix
+    process.terminate()
+    process.join(30)
+    assert not os.path.exists(unix)
+
+
+def raw_request(unix, request):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(30)
+        sock.connect(unix)
+        sock.sendall(request)
+        response = b""
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                return response
+            response += data
+
+
+def test_client_matches_lookup(server):
+    path, words, unix = server
+    tr = read(path)
+    client = HfstClient(unix)
+    tokens = tokens_of(words)
+    results = client.lookup_many(tokens)
+    assert results == [tr.lookup(token) for token in tokens]
+    assert client.lookup(words[0]) == tr.lookup(words[0])
+    assert client.lookup_many([]) == []
+    stats = client.stats()
+    assert stats["requests_total"] == 3
+    assert stats["tokens_total"] == len(tokens) + 1
+    assert stats["workers"] == 2
+    client.close()
+
+
+def test_get_endpoints(server):
+    path, words, unix = server
+    client = HfstClient(unix)
+    status, data = client._request("GET", "/lookup?token=" + quote(words[0]))
+    assert status == 200
+    assert json.loads(data) == {"analyses": [[list(a) for a in read(path).lookup(words[0])]], "truncated": [False]}
+    assert client._request("GET", "/lookup")[0] == 400
+    assert client._request("GET", "/health") == (200, b"ok\n")
+    assert client._request("GET", "/nowhere")[0] == 404
+    assert client._request("POST", "/lookup", b'{"words": []}')[0] == 400
+    assert client._request("POST", "/lookup", b'{"tokens": [1]}')[0] == 400
+
+
+@pytest.mark.parametrize("length", ["abc", "-5"])
+def test_invalid_content_length(server, length):
+    _, _, unix = server
+    response = raw_request(
+        unix, f"POST /lookup HTTP/1.1\r\nHost: localhost\r\nContent-Length: {length}\r\n\r\n".encode("ascii")
+    )
+    # the connection is closed after the response
+    assert response.startswith(b"HTTP/1.1 400 ")
+    assert b"invalid Content-Length" in response
+
+
+def test_client_errors(server):
+    _, _, unix = server
+    client = HfstClient(unix)
+    with pytest.raises(RuntimeError, match="400"):
+        client.lookup_many([1])
+    # the connection is still usable
+    assert client.lookup_many(["zzzz"]) == [[]]
@@ -0,0 +1,40 @@
+import pytest
+
+from .conftest import read
+
+
+@pytest.mark.parametrize("limits", [{}, {"max_results": 1}, {"max_epsilon_depth": 2}, {"max_steps": 50}])
+def test_shared_prefixes_match_lookup(lexicon, limits):
+    path, words = lexicon
+    tokens = sorted(words + [word[:-1] for word in words[:50]] + [words[0] + "7", words[0] + "-" + words[1]])
+    tr = read(path)
+    expected = [tr.lookup(token, **limits) for token in tokens]
+    result = read(path).lookup_many(tokens, shared_prefixes=True, **limits)
+    assert result == expected
+    # the walk cannot always tell that the paths left on its stack hold no
+    # more analyses of a token, but it never passes a cut token as complete
+    for analyses, alone in zip(result, expected):
+        assert analyses.truncated or not alone.truncated
+    if not limits:
+        assert not any(analyses.truncated for analyses in result)
+
+
+def test_shared_prefixes_cache_and_count(lexicon):
+    path, words = lexicon
+    tokens = sorted(words[:30]) + [words[0] + "7"]
+    tr = read(path, cache=True)
+    first = tr.lookup_many(tokens, shared_prefixes=True)
+    assert tr.stats()["entries"] == len(tokens)
+    assert tr.stats()["rejected"] == 1
+    assert tr.lookup_many(tokens, shared_prefixes=True) == first
+    assert tr.stats()["hits"] == len(tokens)
+
+
+def test_epsilon_cycle_truncates_each_token(build):
+    path = build([(0, "a", "a", 1), (1, "", "x", 1), (1, "b", "b", 2)], [(1, 0.0), (2, 0.0)])
+    tr = read(path)
+    tr.max_epsilon_depth = 3
+    result = tr.lookup_many(["a", "ab", "b"], shared_prefixes=True)
+    assert [len(analyses) for analyses in result] == [4, 4, 0]
+    assert [analyses.truncated for analyses in result] == [True, True, False]
+    assert result == [tr.lookup(token) for token in ["a", "ab", "b"]]
@@ -0,0 +1,60 @@
+import io
+import json
+
+import pytest
+
+from pyhfst import ParallelHfst
+from pyhfst.stream import format_jsonl, format_tsv, main, run, write_analyses
+
+from .conftest import read
+
+
+def test_format_tsv():
+    assert format_tsv("kissa", [("kissa+N", 1.5), ("kissa+V", 2.0)]) == (
+        "kissa\tkissa+N\t1.500000\nkissa\tkissa+V\t2.000000\n\n"
+    )
+    assert format_tsv("kissa", [("kissa+N", 1.0)], weighted=False) == "kissa\tkissa+N\t0.000000\n\n"
+    assert format_tsv("zzzz", []) == "zzzz\tzzzz+?\tinf\n\n"
+
+
+def test_format_jsonl():
+    line = format_jsonl("kissä", [("kissä+N", 1.5)])
+    assert line.endswith("\n") and "kissä" in line
+    assert json.loads(line) == {"input": "kissä", "analyses": [["kissä+N", 1.5]]}
+    assert json.loads(format_jsonl("kissa", [("kissa+N", 1.0)], weighted=False))["analyses"] == [["kissa+N", 0.0]]
+    with pytest.raises(ValueError):
+        write_analyses([], io.StringIO(), format="xml")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_keeps_the_input_order(lexicon, workers):
+    path, words = lexicon
+    tr = read(path)
+    tokens = words[:30] + ["zzzz"] + words[:5]
+    inputs = [io.StringIO("\n".join(tokens[:10]) + "\n\n"), io.StringIO("\r\n".join(tokens[10:]))]
+    output = io.StringIO()
+    if workers == 1:
+        count, _ = run(tr, inputs, output, format="jsonl", batch_size=7)
+    else:
+        with ParallelHfst(path, workers=workers, chunk_size=7, cache=False) as parallel:
+            count, _ = run(parallel, inputs, output, format="jsonl")
+    assert count == len(tokens)
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [line["input"] for line in lines] == tokens
+    assert [line["analyses"] for line in lines] == [[list(a) for a in tr.lookup(token)] for token in tokens]
+
+
+def test_main(lexicon, tmp_path, capsys):
+    path, words = lexicon
+    corpus = tmp_path / "corpus.txt"
+    corpus.write_text("\n".join(words[:3] + ["zzzz"]) + "\n", encoding="utf-8")
+    main([str(path), str(corpus), "--quiet"])
+    tr = read(path)
+    expected = "".join(format_tsv(token, tr.lookup(token)) for token in words[:3] + ["zzzz"])
+    captured = capsys.readouterr()
+    assert captured.out == expected
+    assert captured.err == ""
+    main([str(path), str(corpus), "--format", "jsonl", "--workers", "2", "--cache-size", "0"])
+    captured = capsys.readouterr()
+    assert len(captured.out.splitlines()) == 4
+    assert "4 tokens" in captured.err
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+import pyhfst
+from benchmarks.synthetic import generate
+
+from .conftest import read
+from .test_lookup_many import tokens_of
+
+
+@pytest.mark.parametrize("threads", [1, 2, 4, 64])
+def test_threaded_lookup_matches_lookup(lexicon, threads):
+    path, words = lexicon
+    tokens = tokens_of(words) + words[100:200]
+    tr = read(path, cache=True)
+    expected = [read(path).lookup(token) for token in tokens]
+    assert tr.lookup_many(tokens, threads=threads) == expected
+    assert all(token in tr.mem for token in tokens)
+    pairs = list(read(path).lookup_many_iter(iter(tokens), batch_size=30, threads=threads))
+    assert pairs == list(zip(tokens, expected))
+
+
+def test_threaded_limits(build):
+    path = build([(0, "a", "a", 1), (1, "", "x", 1), (0, "b", "b", 2)], [(1, 0.0), (2, 0.0)])
+    tr = read(path)
+    result = tr.lookup_many(["a", "b", "c"], max_epsilon_depth=2, threads=3)
+    assert result == [tr.lookup("a", max_epsilon_depth=2), tr.lookup("b"), []]
+    assert result[0].truncated and not result[1].truncated
+
+
+def test_threads_must_be_positive(lexicon):
+    path, words = lexicon
+    with pytest.raises(ValueError):
+        read(path).lookup_many(words[:3], threads=0)
+
+
+def test_pool_grows_while_in_use(lexicon):
+    path, words = lexicon
+    tr = read(path)
+    tokens = words[:120]
+    expected = [tr.lookup(token) for token in tokens]
+    errors = []
+
+    def run(threads):
+        try:
+            for i in range(10):
+                assert tr.lookup_many(tokens, threads=threads + i) == expected
+        except Exception as e:
+            errors.append(e)
+
+    callers = [threading.Thread(target=run, args=(threads,)) for threads in (2, 3, 5, 8)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+    assert errors == []
+
+
+@pytest.mark.skipif(
+    not pyhfst.Analyzer.__module__.startswith("c_pyhfst"), reason="the nogil kernel is part of the Cython backend"
+)
+@pytest.mark.parametrize("flags", [False, True])
+def test_kernel_matches_traversal(tmp_path, flags):
+    # lookup walks the transducer in the nogil kernel, lookup_iter with the traversal of the Analyzer
+    path = tmp_path / "lexicon.hfstol"
+    words = generate(path, words=300, weighted=True, flags=flags, epsilon_branches=2)
+    tr = read(path)
+    tokens = tokens_of(words) + [words[0] + "-" + words[1]]
+    for limits in ({}, {"max_results": 1}, {"max_epsilon_depth": 1}, {"max_steps": 5}):
+        for token in tokens:
+            assert [tuple(analysis) for analysis in tr.lookup(token, **limits)] == list(
+                tr.lookup_iter(token, **limits)
+            )
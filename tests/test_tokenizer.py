@@ -0,0 +1,63 @@
+import pytest
+
+from benchmarks.synthetic import NO_SYMBOL_NUMBER
+
+from .conftest import analyses_of, read
+
+
+@pytest.fixture
+def multichar(build):
+    # input symbols a, b, c, d, abc and +Pl
+    path = build(
+        [
+            (0, "abc", "ABC", 1),
+            (0, "a", "A", 2),
+            (2, "b", "B", 3),
+            (3, "d", "D", 1),
+            (1, "+Pl", "S", 4),
+            (1, "c", "C", 4),
+        ],
+        [(1, 0.0), (4, 0.0)],
+    )
+    return read(path)
+
+
+def numbers(tr, *symbols):
+    key_table = tr.tr.alphabet.keyTable
+    return tuple(key_table.index(symbol) for symbol in symbols) + (NO_SYMBOL_NUMBER,)
+
+
+def test_longest_match(multichar):
+    tokenize = multichar.tr.tokenize
+    assert tokenize("abc") == numbers(multichar, "abc")
+    assert tokenize("abcc") == numbers(multichar, "abc", "c")
+    assert tokenize("abd") == numbers(multichar, "a", "b", "d")
+    assert tokenize("ab") == numbers(multichar, "a", "b")
+    assert tokenize("abc+Pl") == numbers(multichar, "abc", "+Pl")
+    assert tokenize("") == (NO_SYMBOL_NUMBER,)
+
+
+def test_unknown_characters(multichar):
+    tokenize = multichar.tr.tokenize
+    assert tokenize("a7b") == numbers(multichar, "a")[:-1] + (NO_SYMBOL_NUMBER,) + numbers(multichar, "b")
+    # a prefix of a multi-character symbol is not a symbol
+    assert tokenize("+P") == (NO_SYMBOL_NUMBER, NO_SYMBOL_NUMBER, NO_SYMBOL_NUMBER)
+
+
+def test_lookup_of_multichar_symbols(multichar):
+    assert analyses_of(multichar.lookup("abd")) == ["ABD"]
+    assert analyses_of(multichar.lookup("abc")) == ["ABC"]
+    assert analyses_of(multichar.lookup("abc+Pl")) == ["ABCS"]
+    assert analyses_of(multichar.lookup("abdc")) == ["ABDC"]
+    assert multichar.lookup("a+P") == []
+
+
+def test_tokenization_cache(multichar):
+    tr = multichar.tr
+    tr.tokenization_cache_size = 2
+    first = tr.tokenize("abc")
+    assert tr.tokenize("abc") is first
+    tr.tokenize("abd")
+    tr.tokenize("ab")
+    assert len(tr.tokenization_cache) <= 2
+    assert tr.tokenize("abc") == first